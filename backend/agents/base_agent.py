@@ -2,6 +2,7 @@
 Base Agent class for the agentic workflow system.
 """
 
+import asyncio
 from abc import ABC, abstractmethod
 from typing import Dict, Any, List, Optional
 from pydantic import BaseModel
@@ -67,6 +68,13 @@ class BaseAgent(ABC):
         """
         pass
 
+    async def aprocess_query(self, query: str, context: Dict[str, Any] = None) -> AgentResponse:
+        """
+        Async process_query. Agents without a native async path run process_query
+        on a worker thread, off the event loop.
+        """
+        return await asyncio.to_thread(self.process_query, query, context)
+
     def _invoke_llm(self, prompt: str, **kwargs) -> str:
         """Helper method to invoke the LLM with error handling."""
         if not self.llm_available or not self.llm:
@@ -79,6 +87,18 @@ class BaseAgent(ABC):
             print(f"{self.agent_name} - LLM invocation error: {e}")
             return f"I encountered an error while processing your request with {self.agent_name}. Please try again."
 
+    async def _ainvoke_llm(self, prompt: str, **kwargs) -> str:
+        """Async _invoke_llm: awaits the LLM's async client instead of blocking a thread."""
+        if not self.llm_available or not self.llm:
+            return f"I apologize, but the AI service is currently unavailable for {self.agent_name}."
+
+        try:
+            response = await self.llm.ainvoke(prompt)
+            return response.content if hasattr(response, 'content') else str(response)
+        except Exception as e:
+            print(f"{self.agent_name} - LLM invocation error: {e}")
+            return f"I encountered an error while processing your request with {self.agent_name}. Please try again."
+
     def _create_prompt(self, template: ChatPromptTemplate, **variables) -> str:
         """Helper method to create formatted prompt from template."""
         try:
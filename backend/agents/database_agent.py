@@ -2,7 +2,9 @@
 Database Agent - Handles queries requiring SQL database operations.
 """
 
+import asyncio
 import json
+import re
 from typing import Dict, Any, List, Optional
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.tools import Tool
@@ -78,8 +80,38 @@ Begin by inspecting the database schema.
         Determine if this query requires database operations.
         Returns confidence score based on query analysis.
         """
+        # Keywords that suggest aggregation or reporting over structured data
+        data_keywords = [
+            'how many', 'count', 'average', 'total', 'sum of', 'maximum', 'minimum',
+            'highest', 'lowest', 'top ', 'list all', 'show all', 'per ', 'statistics', 'report'
+        ]
 
-        return 0.2
+        query_lower = query.lower()
+        keyword_matches = sum(1 for keyword in data_keywords if keyword in query_lower)
+
+        # Table and column names from the schema the workflow puts in the context
+        mentions_table = False
+        mentions_column = False
+        db_tables = (context or {}).get('db_tables')
+        if isinstance(db_tables, dict):
+            words = set(re.findall(r'[a-z0-9_]+', query_lower))
+            for table, columns in db_tables.items():
+                table = table.lower()
+                if table in words or (table[:-1] if table.endswith('s') else table) in words:
+                    mentions_table = True
+                if any(column['column_name'].lower() in words for column in columns):
+                    mentions_column = True
+
+        if mentions_table and keyword_matches >= 1:
+            return 0.9
+        elif mentions_table:
+            return 0.75
+        elif mentions_column and keyword_matches >= 1:
+            return 0.7
+        elif keyword_matches >= 1:
+            return 0.5
+        else:
+            return 0.2
 
     def _inspect_database_schema(self) -> str:
         """Inspect database schema and return table/column information."""
@@ -221,7 +253,44 @@ Begin by inspecting the database schema.
             schema_info = self._inspect_database_schema()
 
             # Step 2: Generate SQL query using LLM
-            sql_generation_prompt = f"""
+            sql_query = self._clean_sql(self._invoke_llm(self._sql_generation_prompt(schema_info, query)))
+
+            # Step 3: Execute the query
+            query_results = self._execute_sql_query(sql_query)
+
+            # Step 4: Generate natural language response
+            natural_response = self._invoke_llm(self._response_prompt(query, sql_query, query_results))
+
+            return self._database_agent_response(sql_query, query_results, schema_info, natural_response)
+
+        except Exception as e:
+            return self._error_response(e)
+
+    async def aprocess_query(self, query: str, context: Dict[str, Any] = None) -> AgentResponse:
+        """
+        Async process_query: the LLM calls are awaited, while the schema
+        inspection and the SQL query (psycopg2, which blocks) run on worker threads.
+        """
+        try:
+            if not self.llm_available:
+                return AgentResponse(
+                    agent_name=self.agent_name,
+                    content="Database Agent is currently unavailable due to LLM service issues.",
+                    confidence=0.0
+                )
+
+            schema_info = await asyncio.to_thread(self._inspect_database_schema)
+            sql_query = self._clean_sql(await self._ainvoke_llm(self._sql_generation_prompt(schema_info, query)))
+            query_results = await asyncio.to_thread(self._execute_sql_query, sql_query)
+            natural_response = await self._ainvoke_llm(self._response_prompt(query, sql_query, query_results))
+
+            return self._database_agent_response(sql_query, query_results, schema_info, natural_response)
+
+        except Exception as e:
+            return self._error_response(e)
+
+    def _sql_generation_prompt(self, schema_info: str, query: str) -> str:
+        return f"""
 Based on the database schema below, generate a SQL query to answer the user's question.
 
 Database Schema:
@@ -271,19 +340,18 @@ Consider using SIMILAR TO or regex patterns for complex matching requirements
 Generate only the SQL query, no explanations:
 """
 
-            sql_query = self._invoke_llm(sql_generation_prompt).strip()
+    def _clean_sql(self, sql_query: str) -> str:
+        sql_query = sql_query.strip()
 
-            print("sql_query ",sql_query)
+        print("sql_query ",sql_query)
 
-            # Clean up the SQL query (remove markdown formatting if present)
-            if sql_query.startswith('```sql'):
-                sql_query = sql_query.replace('```sql', '').replace('```', '').strip()
+        # Clean up the SQL query (remove markdown formatting if present)
+        if sql_query.startswith('```sql'):
+            sql_query = sql_query.replace('```sql', '').replace('```', '').strip()
+        return sql_query
 
-            # Step 3: Execute the query
-            query_results = self._execute_sql_query(sql_query)
-
-            # Step 4: Generate natural language response
-            response_prompt = f"""
+    def _response_prompt(self, query: str, sql_query: str, query_results: str) -> str:
+        return f"""
 The user asked: "{query}"
 
 The SQL query generated was: {sql_query}
@@ -295,23 +363,22 @@ If there was an error, explain it clearly. If the results are empty, explain tha
 Format any data in a readable way.
 """
 
-            natural_response = self._invoke_llm(response_prompt)
-
-            return AgentResponse(
-                agent_name=self.agent_name,
-                content=natural_response,
-                metadata={
-                    "sql_query": sql_query,
-                    "raw_results": query_results,
-                    "schema_used": schema_info[:500] + "..." if len(schema_info) > 500 else schema_info
-                },
-                confidence=0.8
-            )
-
-        except Exception as e:
-            return AgentResponse(
-                agent_name=self.agent_name,
-                content=f"I encountered an error while processing your database query: {str(e)}",
-                metadata={"error": str(e)},
-                confidence=0.0
-            )
+    def _database_agent_response(self, sql_query: str, query_results: str, schema_info: str, natural_response: str) -> AgentResponse:
+        return AgentResponse(
+            agent_name=self.agent_name,
+            content=natural_response,
+            metadata={
+                "sql_query": sql_query,
+                "raw_results": query_results,
+                "schema_used": schema_info[:500] + "..." if len(schema_info) > 500 else schema_info
+            },
+            confidence=0.8
+        )
+
+    def _error_response(self, e: Exception) -> AgentResponse:
+        return AgentResponse(
+            agent_name=self.agent_name,
+            content=f"I encountered an error while processing your database query: {str(e)}",
+            metadata={"error": str(e)},
+            confidence=0.0
+        )
@@ -2,7 +2,8 @@
 General Agent - Handles casual conversation and non-contextual queries.
 """
 
-from typing import Dict, Any
+import re
+from typing import Dict, Any, Optional
 from langchain_core.prompts import ChatPromptTemplate
 from .base_agent import BaseAgent, AgentResponse
 
@@ -13,6 +14,20 @@ class GeneralAgent(BaseAgent):
     that don't require database or document search.
     """
 
+    # Common greeting and casual conversation patterns, matched as whole words
+    # only: 'hi' must not match "this" or "which", nor 'story' "history"
+    GENERAL_PATTERN = re.compile(r"\b(?:" + "|".join(re.escape(pattern) for pattern in [
+        'hello', 'hi', 'hey', 'good morning', 'good afternoon', 'good evening',
+        'how are you', 'what\'s up', 'greetings',
+        'thank you', 'thanks', 'goodbye', 'bye', 'see you',
+        'what can you do', 'help me', 'what are your capabilities',
+        'who are you', 'what are you', 'tell me about yourself',
+        'joke', 'story', 'weather', 'time', 'date'
+    ]) + r")\b")
+
+    # Questions about capabilities or general help
+    CAPABILITY_PATTERN = re.compile(r"\b(?:what can|how to|help with|capabilities)\b")
+
     def __init__(self):
         super().__init__("GeneralAgent")
 
@@ -58,29 +73,19 @@ Respond naturally and helpfully:
         Determine if this is a general/casual query.
         Returns confidence score based on query analysis.
         """
-        # Common greeting and casual conversation patterns
-        general_patterns = [
-            'hello', 'hi', 'hey', 'good morning', 'good afternoon', 'good evening',
-            'how are you', 'what\'s up', 'greetings',
-            'thank you', 'thanks', 'goodbye', 'bye', 'see you',
-            'what can you do', 'help me', 'what are your capabilities',
-            'who are you', 'what are you', 'tell me about yourself',
-            'joke', 'story', 'weather', 'time', 'date'
-        ]
-
         query_lower = query.lower().strip()
 
         # Exact matches for greetings
         if query_lower in ['hi', 'hello', 'hey', 'help', 'start']:
             return 0.95
 
-        # Check for general conversation patterns
-        for pattern in general_patterns:
-            if pattern in query_lower:
-                return 0.8
+        # Check for general conversation patterns. Whether the query is really
+        # about data is left to the workflow's schema routing.
+        if self.GENERAL_PATTERN.search(query_lower):
+            return 0.8
 
         # Questions about capabilities or general help
-        if any(word in query_lower for word in ['what can', 'how to', 'help with', 'capabilities']):
+        if self.CAPABILITY_PATTERN.search(query_lower):
             return 0.7
 
         # Very short queries are often general
@@ -90,56 +95,94 @@ Respond naturally and helpfully:
         # Default for anything else
         return 0.3
 
+    def _predefined_response(self, query: str) -> Optional[AgentResponse]:
+        """The canned answer to a common greeting, or None."""
+        # Handle common greetings with predefined responses for better performance
+        query_lower = query.lower().strip()
+
+        predefined_responses = {
+            'hi': "Hello! I'm your AI assistant. I can help you with data queries, document searches, and general questions. What would you like to know?",
+            'hello': "Hi there! I'm here to help you with your questions. I can search through your data, uploaded documents, or just have a conversation. How can I assist you today?",
+            'hey': "Hey! Nice to meet you. I'm an AI assistant that can help with database queries, document searches, and general assistance. What can I do for you?",
+            'help': "I'm here to help! I can assist you with:\n• Database queries and data analysis\n• Searching through uploaded documents\n• General questions and conversation\n\nWhat would you like to explore?",
+            'what can you do': "I have several capabilities:\n• **Database Agent**: Query and analyze structured data\n• **Document Search**: Find information in uploaded files\n• **General Assistant**: Help with various questions and conversations\n\nWhat type of assistance do you need?",
+            'capabilities': "My main capabilities include:\n1. **Data Analysis**: I can query databases and provide insights\n2. **Document Search**: I can search through uploaded files and documents\n3. **General Help**: I can answer questions and have conversations\n\nHow would you like me to help you today?"
+        }
+
+        if query_lower in predefined_responses:
+            return AgentResponse(
+                agent_name=self.agent_name,
+                content=predefined_responses[query_lower],
+                confidence=0.95
+            )
+        return None
+
+    def _unavailable_response(self, query: str) -> AgentResponse:
+        # Fallback response when LLM is unavailable
+        return AgentResponse(
+            agent_name=self.agent_name,
+            content=f"Thank you for your message: '{query}'. I'm here to help, though my AI capabilities are currently limited. I can still assist you with basic responses and information about the system's features.",
+            confidence=0.5
+        )
+
+    def _error_response(self, e: Exception) -> AgentResponse:
+        return AgentResponse(
+            agent_name=self.agent_name,
+            content="I apologize, but I encountered an error while processing your request. Please try again or rephrase your question.",
+            metadata={"error": str(e)},
+            confidence=0.0
+        )
+
     def process_query(self, query: str, context: Dict[str, Any] = None) -> AgentResponse:
         """
         Process general conversation queries.
         """
         try:
-            # Handle common greetings with predefined responses for better performance
-            query_lower = query.lower().strip()
-
-            predefined_responses = {
-                'hi': "Hello! I'm your AI assistant. I can help you with data queries, document searches, and general questions. What would you like to know?",
-                'hello': "Hi there! I'm here to help you with your questions. I can search through your data, uploaded documents, or just have a conversation. How can I assist you today?",
-                'hey': "Hey! Nice to meet you. I'm an AI assistant that can help with database queries, document searches, and general assistance. What can I do for you?",
-                'help': "I'm here to help! I can assist you with:\n• Database queries and data analysis\n• Searching through uploaded documents\n• General questions and conversation\n\nWhat would you like to explore?",
-                'what can you do': "I have several capabilities:\n• **Database Agent**: Query and analyze structured data\n• **Document Search**: Find information in uploaded files\n• **General Assistant**: Help with various questions and conversations\n\nWhat type of assistance do you need?",
-                'capabilities': "My main capabilities include:\n1. **Data Analysis**: I can query databases and provide insights\n2. **Document Search**: I can search through uploaded files and documents\n3. **General Help**: I can answer questions and have conversations\n\nHow would you like me to help you today?"
-            }
-
-            if query_lower in predefined_responses:
-                return AgentResponse(
-                    agent_name=self.agent_name,
-                    content=predefined_responses[query_lower],
-                    confidence=0.95
-                )
+            predefined = self._predefined_response(query)
+            if predefined:
+                return predefined
 
             # For other queries, use LLM if available
-            if self.llm_available:
-                prompt_template = self.get_prompt_template()
-                formatted_prompt = self._create_prompt(
-                    prompt_template,
-                    query=query,
-                    context=context or {}
-                )
-
-                response_content = self._invoke_llm(formatted_prompt)
-                confidence = 0.8
-            else:
-                # Fallback response when LLM is unavailable
-                response_content = f"Thank you for your message: '{query}'. I'm here to help, though my AI capabilities are currently limited. I can still assist you with basic responses and information about the system's features."
-                confidence = 0.5
+            if not self.llm_available:
+                return self._unavailable_response(query)
+
+            prompt_template = self.get_prompt_template()
+            formatted_prompt = self._create_prompt(
+                prompt_template,
+                query=query,
+                context=context or {}
+            )
 
             return AgentResponse(
                 agent_name=self.agent_name,
-                content=response_content,
-                confidence=confidence
+                content=self._invoke_llm(formatted_prompt),
+                confidence=0.8
             )
 
         except Exception as e:
+            return self._error_response(e)
+
+    async def aprocess_query(self, query: str, context: Dict[str, Any] = None) -> AgentResponse:
+        """Async process_query."""
+        try:
+            predefined = self._predefined_response(query)
+            if predefined:
+                return predefined
+
+            if not self.llm_available:
+                return self._unavailable_response(query)
+
+            formatted_prompt = self._create_prompt(
+                self.get_prompt_template(),
+                query=query,
+                context=context or {}
+            )
+
             return AgentResponse(
                 agent_name=self.agent_name,
-                content="I apologize, but I encountered an error while processing your request. Please try again or rephrase your question.",
-                metadata={"error": str(e)},
-                confidence=0.0
+                content=await self._ainvoke_llm(formatted_prompt),
+                confidence=0.8
             )
+
+        except Exception as e:
+            return self._error_response(e)
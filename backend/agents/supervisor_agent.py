@@ -63,11 +63,8 @@ Respond with ONLY the agent name: database, vector_db, or general
         """Supervisor always handles routing, so always returns 1.0."""
         return 1.0
 
-    def route_query(self, query: str, context: Dict[str, Any] = None) -> str:
-        """
-        Route the query to the appropriate agent.
-        Returns the name of the agent that should handle the query.
-        """
+    def _routing_prompt(self, query: str, context: Dict[str, Any] = None):
+        """The routing prompt for the query, and the number of vector search results it mentions."""
         if not context:
             context = {}
 
@@ -100,9 +97,9 @@ Respond with ONLY the agent name: database, vector_db, or general
             search_results_count=search_results_count,
             relevant_content_preview=relevant_content_preview
         )
+        return prompt, search_results_count
 
-        response = self._invoke_llm(prompt)
-
+    def _parse_routing(self, response: str, search_results_count: int) -> str:
         # Extract agent name from response
         agent_name = response.strip().lower()
 
@@ -114,13 +111,31 @@ Respond with ONLY the agent name: database, vector_db, or general
         print(f"Supervisor - Routing query to: {agent_name} (Vector results: {search_results_count})")
         return agent_name
 
+    def route_query(self, query: str, context: Dict[str, Any] = None) -> str:
+        """
+        Route the query to the appropriate agent.
+        Returns the name of the agent that should handle the query.
+        """
+        prompt, search_results_count = self._routing_prompt(query, context)
+        return self._parse_routing(self._invoke_llm(prompt), search_results_count)
+
+    async def aroute_query(self, query: str, context: Dict[str, Any] = None) -> str:
+        """Async route_query."""
+        prompt, search_results_count = self._routing_prompt(query, context)
+        return self._parse_routing(await self._ainvoke_llm(prompt), search_results_count)
+
     def process_query(self, query: str, context: Dict[str, Any] = None) -> AgentResponse:
         """
         Process query by routing to appropriate agent.
         This method is called by the workflow to get routing decision.
         """
-        routed_agent = self.route_query(query, context)
+        return self._routing_response(self.route_query(query, context))
+
+    async def aprocess_query(self, query: str, context: Dict[str, Any] = None) -> AgentResponse:
+        """Async process_query."""
+        return self._routing_response(await self.aroute_query(query, context))
 
+    def _routing_response(self, routed_agent: str) -> AgentResponse:
         return AgentResponse(
             agent_name=self.agent_name,
             content=routed_agent,
@@ -2,12 +2,14 @@
 Vector DB Agent - Handles queries requiring semantic search in vector database.
 """
 
+import asyncio
 import json
 from typing import Dict, Any, List, Optional
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.tools import Tool
 from .base_agent import BaseAgent, AgentResponse
-from services.vector_service import VectorService
+from config import Config
+from services.vector_service import get_vector_service
 
 
 class VectorDBAgent(BaseAgent):
@@ -18,7 +20,7 @@ class VectorDBAgent(BaseAgent):
 
     def __init__(self):
         super().__init__("VectorDBAgent")
-        self.vector_service = VectorService()
+        self.vector_service = get_vector_service()
         self._setup_tools()
 
     def _setup_tools(self):
@@ -142,13 +144,8 @@ Begin by checking the vector database status.
         except Exception as e:
             return f"Error getting vector database info: {str(e)}"
 
-    def _reformulate_query(self, query: str) -> str:
-        """Reformulate query for better semantic search results."""
-        try:
-            if not self.llm_available:
-                return query  # Return original query if LLM unavailable
-
-            reformulation_prompt = f"""
+    def _reformulation_prompt(self, query: str) -> str:
+        return f"""
 Reformulate the following user query to make it more effective for semantic search in a document database.
 
 Original query: "{query}"
@@ -163,18 +160,41 @@ Rules for reformulation:
 Reformulated query:
 """
 
-            reformulated = self._invoke_llm(reformulation_prompt).strip()
+    def _reformulate_query(self, query: str) -> str:
+        """Reformulate query for better semantic search results."""
+        try:
+            if not self.llm_available:
+                return query  # Return original query if LLM unavailable
+
+            reformulated = self._invoke_llm(self._reformulation_prompt(query)).strip()
             return reformulated if reformulated else query
 
         except Exception as e:
             print(f"Error reformulating query: {e}")
             return query
 
-    def _semantic_search(self, query: str, top_k: int = 5) -> str:
-        """Perform semantic search and return formatted results."""
+    async def _areformulate_query(self, query: str) -> str:
+        """Async _reformulate_query."""
+        try:
+            if not self.llm_available:
+                return query
+
+            reformulated = (await self._ainvoke_llm(self._reformulation_prompt(query))).strip()
+            return reformulated if reformulated else query
+
+        except Exception as e:
+            print(f"Error reformulating query: {e}")
+            return query
+
+    def _semantic_search(self, query: str, top_k: Optional[int] = None, info: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Perform semantic search and return formatted results.
+        Without top_k, returns the chunks above the retrieval threshold (see VectorService.search_relevant).
+        info is the caller's get_info() result, if it already has one.
+        """
         try:
             # Get vector database info first
-            info = self.vector_service.get_info()
+            info = info or self.vector_service.get_info()
             if not info.get('model_available', False):
                 return "Vector search model is not available"
 
@@ -182,77 +202,93 @@ Reformulated query:
                 return "No documents found in vector database"
 
             # Perform search
-            results = self.vector_service.search(query, top_k=top_k)
+            if top_k is None:
+                results = self.vector_service.search_relevant(query)
+            else:
+                results = self.vector_service.search(query, top_k=top_k)
 
             if not results:
                 return "No relevant documents found for the query"
 
-            # Format results
-            formatted_results = {
-                "query": query,
-                "results_count": len(results),
-                "results": []
-            }
-
-            for i, result in enumerate(results):
-                formatted_result = {
-                    "rank": i + 1,
-                    "content": result.get('content', 'No content'),
-                    "score": result.get('score', 0.0),
-                    "metadata": {
-                        "filename": result.get('filename', 'Unknown'),
-                        "chunk_id": result.get('chunk_id', 'Unknown')
-                    }
-                }
-                formatted_results["results"].append(formatted_result)
-
-            return json.dumps(formatted_results, indent=2)
+            return self._format_results(query, results)
 
         except Exception as e:
             return f"Error performing semantic search: {str(e)}"
 
-    def process_query(self, query: str, context: Dict[str, Any] = None) -> AgentResponse:
-        """
-        Process vector database query using semantic search and RAG.
-        """
-        try:
-            if not self.llm_available:
-                return AgentResponse(
-                    agent_name=self.agent_name,
-                    content="Vector DB Agent is currently unavailable due to LLM service issues.",
-                    confidence=0.0
-                )
-
-            # Step 1: Check vector database status
-            vector_info = self._get_vector_db_info()
-            vector_data = json.loads(vector_info)
-
-            if not vector_data.get('model_available', False):
-                return AgentResponse(
-                    agent_name=self.agent_name,
-                    content="The vector search model is not available. Please ensure the sentence transformer model is properly initialized.",
-                    confidence=0.0
-                )
+    def _format_results(self, query: str, results: List[Dict[str, Any]]) -> str:
+        """Format search results as the JSON passed to the RAG prompt."""
+        formatted_results = {
+            "query": query,
+            "results_count": len(results),
+            "results": []
+        }
+
+        for i, result in enumerate(results):
+            formatted_result = {
+                "rank": i + 1,
+                "content": result.get('content', 'No content'),
+                "score": result.get('score', 0.0),
+                "metadata": {
+                    "filename": result.get('filename', 'Unknown'),
+                    "chunk_id": result.get('chunk_id', 'Unknown')
+                }
+            }
+            formatted_results["results"].append(formatted_result)
 
-            if vector_data.get('total_documents', 0) == 0:
-                return AgentResponse(
-                    agent_name=self.agent_name,
-                    content="No documents have been uploaded to the vector database yet. Please upload some documents first.",
-                    confidence=0.0
-                )
+        return json.dumps(formatted_results, indent=2)
 
-            # Step 2: Reformulate query for better search
-            reformulated_query = self._reformulate_query(query)
+    def _prepared_results(self, context: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        The hits the workflow already retrieved for this query (context
+        "vector_search_results"), as search results, if they are strong enough to
+        answer from: the best must score at least Config.VECTOR_AGENT_REUSE_MIN_SCORE.
+        """
+        relevant_content = (context or {}).get('vector_search_results', {}).get('relevant_content', [])
+        results = [
+            {**item.get('metadata', {}), 'content': item.get('content', ''), 'score': item.get('similarity_score', 0.0)}
+            for item in relevant_content
+        ]
+        if not results or max(result['score'] for result in results) < Config.VECTOR_AGENT_REUSE_MIN_SCORE:
+            return []
+        return results
 
-            # Step 3: Perform semantic search
-            search_results = self._semantic_search(reformulated_query, top_k=3)
-            # search_results = [result for result in search_results if result.get('score', 0) >= 0.4]
+    def _prepared_retrieval(self, query: str, context: Dict[str, Any]):
+        """
+        (reformulated query, formatted search results, vector DB status) answered
+        from the prepared hits, or None when they aren't strong enough. The
+        query isn't reformulated on this path, so the reformulated query is None.
+        """
+        prepared_results = self._prepared_results(context)
+        if not prepared_results:
+            return None
+        return None, self._format_results(query, prepared_results), context.get('vector_db_status', '')
+
+    def _unusable_store_response(self, vector_data: Dict[str, Any]) -> Optional[AgentResponse]:
+        """The response to give when the vector store can't be searched, else None."""
+        if not vector_data.get('model_available', False):
+            return AgentResponse(
+                agent_name=self.agent_name,
+                content="The vector search model is not available. Please ensure the sentence transformer model is properly initialized.",
+                confidence=0.0
+            )
 
-            # Step 4: Generate RAG response
-            rag_prompt = f"""
+        if vector_data.get('total_documents', 0) == 0:
+            return AgentResponse(
+                agent_name=self.agent_name,
+                content="No documents have been uploaded to the vector database yet. Please upload some documents first.",
+                confidence=0.0
+            )
+        return None
+
+    def _rag_prompt(self, query: str, reformulated_query: Optional[str], search_results: str, vector_info: str) -> str:
+        searched_for = (
+            f'The reformulated search query was: "{reformulated_query}"' if reformulated_query
+            else "The documents were searched with the user's question as asked."
+        )
+        return f"""
 The user asked: "{query}"
 
-The reformulated search query was: "{reformulated_query}"
+{searched_for}
 
 Here are the relevant document chunks found:
 {search_results}
@@ -273,34 +309,113 @@ Instructions:
 Format your response naturally and helpfully.
 """
 
-            rag_response = self._invoke_llm(rag_prompt)
+    def _rag_agent_response(self, query: str, reformulated_query: Optional[str], retrieval: str,
+                            search_results: str, vector_info: str, rag_response: str) -> AgentResponse:
+        # Parse search results for metadata
+        try:
+            search_data = json.loads(search_results)
+            sources = [result['metadata']['filename'] for result in search_data.get('results', [])]
+            confidence = max([result['score'] for result in search_data.get('results', [])], default=0.0)
+        except:
+            sources = []
+            confidence = 0.5
+
+        return AgentResponse(
+            agent_name=self.agent_name,
+            content=rag_response,
+            metadata={
+                "original_query": query,
+                "reformulated_query": reformulated_query,
+                "retrieval": retrieval,
+                "sources": sources,
+                "search_results": search_results,
+                "vector_db_status": vector_info
+            },
+            confidence=min(confidence, 0.9)
+        )
+
+    def _error_response(self, e: Exception) -> AgentResponse:
+        return AgentResponse(
+            agent_name=self.agent_name,
+            content=f"I encountered an error while searching the document database: {str(e)}",
+            metadata={"error": str(e)},
+            confidence=0.0
+        )
 
-            # Parse search results for metadata
-            try:
-                search_data = json.loads(search_results)
-                sources = [result['metadata']['filename'] for result in search_data.get('results', [])]
-                confidence = max([result['score'] for result in search_data.get('results', [])], default=0.0)
-            except:
-                sources = []
-                confidence = 0.5
+    def process_query(self, query: str, context: Dict[str, Any] = None) -> AgentResponse:
+        """
+        Process vector database query using semantic search and RAG.
+        """
+        try:
+            if not self.llm_available:
+                return AgentResponse(
+                    agent_name=self.agent_name,
+                    content="Vector DB Agent is currently unavailable due to LLM service issues.",
+                    confidence=0.0
+                )
 
-            return AgentResponse(
-                agent_name=self.agent_name,
-                content=rag_response,
-                metadata={
-                    "original_query": query,
-                    "reformulated_query": reformulated_query,
-                    "sources": sources,
-                    "search_results": search_results,
-                    "vector_db_status": vector_info
-                },
-                confidence=min(confidence, 0.9)
-            )
+            prepared = self._prepared_retrieval(query, context)
+            if prepared:
+                # The workflow's search for this query already found strong matches:
+                # answer from them without reformulating and searching again
+                retrieval = "prepared_context"
+                reformulated_query, search_results, vector_info = prepared
+            else:
+                retrieval = "reformulated_search"
+
+                # Step 1: Check vector database status
+                vector_data = self.vector_service.get_info()
+                vector_info = json.dumps(vector_data, indent=2)
+                unusable = self._unusable_store_response(vector_data)
+                if unusable:
+                    return unusable
+
+                # Step 2: Reformulate query for better search
+                reformulated_query = self._reformulate_query(query)
+
+                # Step 3: Perform semantic search
+                search_results = self._semantic_search(reformulated_query, info=vector_data)
+
+            # Step 4: Generate RAG response
+            rag_response = self._invoke_llm(self._rag_prompt(query, reformulated_query, search_results, vector_info))
+
+            return self._rag_agent_response(query, reformulated_query, retrieval, search_results, vector_info, rag_response)
 
         except Exception as e:
-            return AgentResponse(
-                agent_name=self.agent_name,
-                content=f"I encountered an error while searching the document database: {str(e)}",
-                metadata={"error": str(e)},
-                confidence=0.0
-            )
+            return self._error_response(e)
+
+    async def aprocess_query(self, query: str, context: Dict[str, Any] = None) -> AgentResponse:
+        """
+        Async process_query: the LLM calls are awaited, while the vector store
+        status and search (FAISS and the embedding model) run on worker threads.
+        """
+        try:
+            if not self.llm_available:
+                return AgentResponse(
+                    agent_name=self.agent_name,
+                    content="Vector DB Agent is currently unavailable due to LLM service issues.",
+                    confidence=0.0
+                )
+
+            prepared = self._prepared_retrieval(query, context)
+            if prepared:
+                retrieval = "prepared_context"
+                reformulated_query, search_results, vector_info = prepared
+            else:
+                retrieval = "reformulated_search"
+
+                vector_data = await asyncio.to_thread(self.vector_service.get_info)
+                vector_info = json.dumps(vector_data, indent=2)
+                unusable = self._unusable_store_response(vector_data)
+                if unusable:
+                    return unusable
+
+                reformulated_query = await self._areformulate_query(query)
+                search_results = await asyncio.to_thread(self._semantic_search, reformulated_query, None, vector_data)
+
+            rag_response = await self._ainvoke_llm(self._rag_prompt(query, reformulated_query, search_results, vector_info))
+
+            return self._rag_agent_response(query, reformulated_query, retrieval, search_results, vector_info, rag_response)
+
+        except Exception as e:
+            return self._error_response(e)
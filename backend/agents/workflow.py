@@ -3,7 +3,11 @@ LangGraph Workflow for Agentic System.
 Orchestrates the flow between Supervisor and specialized agents.
 """
 
+import asyncio
 import json
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from typing import Dict, Any, List, Optional, TypedDict, Annotated
 from typing_extensions import TypedDict
 from langgraph.graph import StateGraph, END
@@ -16,7 +20,8 @@ from .vector_db_agent import VectorDBAgent
 from .general_agent import GeneralAgent
 from .base_agent import AgentResponse
 from models.database import db
-from services.vector_service import VectorService
+from config import Config
+from services.vector_service import get_vector_service
 
 
 class WorkflowState(TypedDict):
@@ -25,15 +30,176 @@ class WorkflowState(TypedDict):
     context: Dict[str, Any]
     supervisor_response: Optional[AgentResponse]
     routed_agent: Optional[str]
+    routing_path: Optional[str]
     final_response: Optional[AgentResponse]
     messages: Annotated[List[Dict[str, Any]], operator.add]
     error: Optional[str]
 
 
+class LazyContext(dict):
+    """
+    Agent context whose source fields (database schema, vector search) are
+    computed on first access and kept for the rest of the request, so a query
+    only pays for the sources its route actually reads.
+
+    Reading a source field runs its source on the context pool and waits for it
+    up to timeout seconds from when it starts running, so time spent queued
+    behind other requests' sources doesn't count against it. Waiting for a free
+    worker is bounded separately, by queue_timeout seconds from submission, so
+    sources hung on every worker can't stall later requests. A source that
+    misses either deadline (or fails) contributes its fallback fields instead,
+    is reported as "timed out" by resolved_sources(), and its late result is
+    discarded. prefetch() starts every pending source at once, for
+    consumers that read them all. Printing or serialising the context shows
+    only the fields computed so far.
+
+    On an event loop, await aload()/aprefetch() for the fields a step reads
+    before reading them, so waiting for a source doesn't block the loop.
+    """
+
+    def __init__(self, query: str, sources, executor, timeout: float, queue_timeout: float = None, **fields):
+        super().__init__(**fields)
+        self.query = query
+        self.executor = executor
+        self.timeout = timeout
+        self.queue_timeout = timeout if queue_timeout is None else queue_timeout
+        self._sources = {name: (source, fallback) for name, _, source, fallback in sources}
+        self._source_of = {field: name for name, source_fields, _, _ in sources for field in source_fields}
+        self._lock = threading.Lock()
+        self._started = {}  # source name -> (future, future of the time it started running, submit time)
+        self._resolved = {}  # source name -> "computed" | "timed out" | "failed"
+
+    def __missing__(self, key):
+        name = self._source_of.get(key)
+        if name is None or name in self._resolved:
+            raise KeyError(key)
+        self._resolve(name)
+        return super().__getitem__(key)
+
+    def __contains__(self, key):
+        return super().__contains__(key) or key in self._source_of
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def _start(self, name: str):
+        with self._lock:
+            if name not in self._started:
+                source, _ = self._sources[name]
+                started = Future()
+                future = self.executor.submit(self._run_source, source, started)
+                future.add_done_callback(lambda _: self._mark_started(started))
+                self._started[name] = (future, started, time.monotonic())
+            return self._started[name]
+
+    def _run_source(self, source, started: Future):
+        self._mark_started(started)
+        return source(self.query)
+
+    @staticmethod
+    def _mark_started(started: Future):
+        try:
+            started.set_result(time.monotonic())
+        except InvalidStateError:
+            pass  # Already started
+
+    @staticmethod
+    def _remaining(timeout: float, since: float) -> float:
+        return max(timeout - (time.monotonic() - since), 0)
+
+    def _resolve(self, name: str):
+        future, started, submit_time = self._start(name)
+        start_time = None
+        try:
+            start_time = started.result(timeout=self._remaining(self.queue_timeout, submit_time))
+            fields = future.result(timeout=self._remaining(self.timeout, start_time))
+        except Exception as e:
+            self._settle(name, start_time, future, error=e)
+        else:
+            self._settle(name, start_time, future, fields)
+
+    async def _aresolve(self, name: str):
+        future, started, submit_time = self._start(name)
+        start_time = None
+        try:
+            # Shielded: other readers of this context may be waiting on the same start
+            start_time = await asyncio.wait_for(
+                asyncio.shield(asyncio.wrap_future(started)), self._remaining(self.queue_timeout, submit_time)
+            )
+            fields = await asyncio.wait_for(asyncio.wrap_future(future), self._remaining(self.timeout, start_time))
+        except Exception as e:
+            self._settle(name, start_time, future, error=e)
+        else:
+            self._settle(name, start_time, future, fields)
+
+    def _settle(self, name: str, start_time: Optional[float], future: Future, fields: Dict[str, Any] = None, error: Exception = None):
+        """
+        Merge a source's fields, or its fallback fields if it timed out or failed.
+        start_time is None when the source never got a worker.
+        """
+        _, fallback = self._sources[name]
+        if error is None:
+            outcome = "computed"
+            print(f"Context source '{name}' computed in {time.monotonic() - start_time:.2f}s")
+        elif isinstance(error, (FutureTimeoutError, asyncio.TimeoutError)):
+            future.cancel()
+            if start_time is None:
+                print(f"Context source '{name}' waited {self.queue_timeout}s for a free context worker, continuing without it")
+            else:
+                print(f"Context source '{name}' missed its {self.timeout}s deadline, continuing without it")
+            fields, outcome = fallback(f"{name} timed out"), "timed out"
+        else:
+            print(f"Context source '{name}' failed: {error}")
+            fields, outcome = fallback(f"{name} error: {str(error)}"), "failed"
+
+        with self._lock:
+            if name not in self._resolved:
+                self.update(fields)
+                self._resolved[name] = outcome
+
+    def prefetch(self):
+        """Compute every pending source, concurrently."""
+        for name in self._sources:
+            self._start(name)
+        for name in self._sources:
+            if name not in self._resolved:
+                self._resolve(name)
+
+    async def aload(self, *fields: str):
+        """Compute the sources of fields, concurrently, without blocking the event loop."""
+        names = {self._source_of[field] for field in fields if field in self._source_of}
+        names = [name for name in names if name not in self._resolved]
+        for name in names:
+            self._start(name)
+        await asyncio.gather(*(self._aresolve(name) for name in names))
+
+    async def aprefetch(self):
+        """Async prefetch."""
+        await self.aload(*self._source_of)
+
+    def resolved_sources(self) -> Dict[str, str]:
+        """The sources this request computed, with how each one ended."""
+        with self._lock:
+            return dict(self._resolved)
+
+
 class AgenticWorkflow:
     """
     LangGraph-based workflow that orchestrates the agentic system.
     Routes queries through supervisor to appropriate specialized agents.
+
+    Context sources are lazy (see LazyContext), and routing is tried locally
+    first, cheapest evidence first: the query wording together with the
+    database schema, then the similarity search. The agent is picked as soon as
+    one is a clear winner; the supervisor LLM is only asked when the scores stay
+    ambiguous. The wording alone never decides, since it cannot tell that a
+    query names a table; the exception is a greeting the general agent answers
+    with a predefined response, which computes no context at all. Other small
+    talk and database queries are settled by the schema and never run a vector
+    search.
     """
 
     def __init__(self):
@@ -53,21 +219,64 @@ class AgenticWorkflow:
             "general": self.general_agent
         }
 
-        # Build the workflow graph
+        # Lazy context sources, computed on first access (see _prepare_context):
+        # (name, fields provided, source(query) -> context fields, fallback(status) -> context fields)
+        self.context_sources = [
+            ("database schema", ("db_tables",), self._database_context, self._database_fallback),
+            ("vector search", ("vector_db_status", "vector_search_results"), self._vector_context, self._vector_fallback)
+        ]
+        self._context_executor = ThreadPoolExecutor(
+            max_workers=Config.CONTEXT_MAX_WORKERS,
+            thread_name_prefix='context-source'
+        )
+
+        # Routing-path counters, see get_routing_stats
+        self._routing_lock = threading.Lock()
+        self._routing_stats = {
+            "total": 0,
+            "local": 0,
+            "llm": 0,
+            "fallback": 0,
+            "routed_to": {name: 0 for name in self.agents},
+            "seconds": {"local": 0.0, "llm": 0.0, "fallback": 0.0}
+        }
+
+        # Event loop shared by submit_query callers, started on first use
+        self._loop = None
+        self._loop_lock = threading.Lock()
+
+        # Build the workflow graphs: sync nodes for process_query, async ones for aprocess_query
         self.workflow = self._build_workflow()
+        self.async_workflow = self._build_workflow(asynchronous=True)
         print("Agentic Workflow initialized successfully!")
 
-    def _build_workflow(self) -> StateGraph:
-        """Build the LangGraph workflow."""
+    def _build_workflow(self, asynchronous: bool = False) -> StateGraph:
+        """Build the LangGraph workflow, with async agent nodes for ainvoke when asynchronous."""
 
         # Create the state graph
         workflow = StateGraph(WorkflowState)
 
         # Add nodes
-        workflow.add_node("supervisor", self._supervisor_node)
-        workflow.add_node("database_agent", self._database_agent_node)
-        workflow.add_node("vector_db_agent", self._vector_db_agent_node)
-        workflow.add_node("general_agent", self._general_agent_node)
+        if asynchronous:
+            workflow.add_node("supervisor", self._asupervisor_node)
+            workflow.add_node("database_agent", self._async_agent_node(
+                "database", "DatabaseAgent", "Database query processed",
+                "I encountered an error while processing your database query"
+            ))
+            workflow.add_node("vector_db_agent", self._async_agent_node(
+                "vector_db", "VectorDBAgent", "Vector search completed",
+                "I encountered an error while searching documents",
+                context_fields=("vector_db_status", "vector_search_results")
+            ))
+            workflow.add_node("general_agent", self._async_agent_node(
+                "general", "GeneralAgent", "General response generated",
+                "I apologize, but I encountered an error"
+            ))
+        else:
+            workflow.add_node("supervisor", self._supervisor_node)
+            workflow.add_node("database_agent", self._database_agent_node)
+            workflow.add_node("vector_db_agent", self._vector_db_agent_node)
+            workflow.add_node("general_agent", self._general_agent_node)
         workflow.add_node("finalize", self._finalize_node)
 
         # Define the routing logic
@@ -109,12 +318,29 @@ class AgenticWorkflow:
         # Compile the workflow
         return workflow.compile()
 
-    def _prepare_context(self, query: str) -> Dict[str, Any]:
-        """Prepare context information for agents."""
-        context = {
-            "timestamp": "current",
-            "user_query": query
-        }
+    def _prepare_context(self, query: str) -> LazyContext:
+        """
+        Prepare context information for agents.
+
+        Nothing is computed here: each context source runs on the context pool
+        when a node first reads one of its fields, with a deadline of
+        Config.CONTEXT_SOURCE_TIMEOUT seconds once running (and
+        Config.CONTEXT_QUEUE_TIMEOUT to get a worker), and is reused for the
+        rest of the request.
+        """
+        return LazyContext(
+            query,
+            self.context_sources,
+            self._context_executor,
+            Config.CONTEXT_SOURCE_TIMEOUT,
+            Config.CONTEXT_QUEUE_TIMEOUT,
+            timestamp="current",
+            user_query=query
+        )
+
+    def _database_context(self, query: str) -> Dict[str, Any]:
+        """Context source: tables and columns of the connected database."""
+        context = {}
 
         # Get database information
         try:
@@ -155,20 +381,23 @@ class AgenticWorkflow:
         except Exception as e:
             context["db_tables"] = f"Database error: {str(e)}"
 
+        return context
+
+    def _vector_context(self, query: str) -> Dict[str, Any]:
+        """Context source: vector database status and the chunks relevant to the query."""
+        context = {}
+
         # Get vector database information with similarity search
         try:
-            vector_service = VectorService()
+            vector_service = get_vector_service()
             vector_info = vector_service.get_info()
             print("vector_info ",vector_info)
 
             if vector_info.get('model_available', False) and vector_info.get('total_documents', 0) > 0:
-                # Perform similarity search with user query
-                search_results = vector_service.search(query, top_k=3)
-
-                print("search_results ",search_results)
+                # Range search: every chunk above the similarity threshold, cut at the first large score drop
+                filtered_results = vector_service.search_relevant(query)
 
-                # Filter results with similarity threshold of 0.7
-                filtered_results = [result for result in search_results if result.get('score', 0) >= 0.4]
+                print("search_results ",filtered_results)
 
                 if filtered_results:
                     # Prepare vector context with similarity search results
@@ -188,7 +417,7 @@ class AgenticWorkflow:
                     context["vector_db_status"] = f"{vector_info.get('total_documents', 0)} documents available, {len(filtered_results)} relevant documents found"
                     context["vector_search_results"] = vector_context
                 else:
-                    context["vector_db_status"] = f"{vector_info.get('total_documents', 0)} documents available, no documents meet similarity threshold (0.7)"
+                    context["vector_db_status"] = f"{vector_info.get('total_documents', 0)} documents available, no documents meet similarity threshold ({Config.RETRIEVAL_MIN_SCORE})"
                     context["vector_search_results"] = {
                         "total_documents": vector_info.get('total_documents', 0),
                         "search_results_count": 0,
@@ -212,8 +441,135 @@ class AgenticWorkflow:
 
         return context
 
+    @staticmethod
+    def _database_fallback(status: str) -> Dict[str, Any]:
+        return {"db_tables": f"Database schema unavailable ({status})"}
+
+    @staticmethod
+    def _vector_fallback(status: str) -> Dict[str, Any]:
+        return {
+            "vector_db_status": f"Vector DB unavailable ({status})",
+            "vector_search_results": {
+                "total_documents": 0,
+                "search_results_count": 0,
+                "relevant_content": []
+            }
+        }
+
+    def _score_agents(self, query: str, context: Dict[str, Any]) -> Dict[str, float]:
+        """
+        Local routing scores: each agent's can_handle_query heuristic, with the
+        vector agent's adjusted by the similarity search run for the context.
+        """
+        scores = {name: float(agent.can_handle_query(query, context)) for name, agent in self.agents.items()}
+
+        relevant_content = context.get("vector_search_results", {}).get("relevant_content", [])
+        top_similarity = max((result.get("similarity_score", 0.0) for result in relevant_content), default=0.0)
+        if top_similarity >= Config.ROUTER_VECTOR_EVIDENCE_SCORE:
+            # A closely matching chunk is strong evidence the documents can answer this
+            scores["vector_db"] = max(scores["vector_db"], 0.9)
+        elif not relevant_content:
+            # Nothing in the documents is relevant; document-style wording alone shouldn't win
+            scores["vector_db"] = min(scores["vector_db"], 0.5)
+
+        return scores
+
+    def _route_locally(self, query: str, context: Dict[str, Any]):
+        """
+        Pick the agent from the local scores when one clearly wins, reading the
+        lazy context sources only as far as needed to decide.
+        Returns (agent name, or None when the scores are ambiguous, scores).
+        """
+        # A predefined greeting ("hi", "help") is answered without reading any context
+        scores = self._wording_scores(query)
+        if self.general_agent._predefined_response(query):
+            return "general", scores
+
+        # Table and column mentions need the database schema, but not the vector search.
+        # Otherwise the wording alone is no verdict: "orders by date" reads as small
+        # talk until the schema shows it names a table.
+        best_agent, scores = self._route_on_schema(query, context, scores)
+        if best_agent:
+            return best_agent, scores
+
+        # The documents are in contention: weigh in the similarity search
+        scores = self._score_agents(query, context)
+        return self._clear_winner(scores), scores
+
+    async def _aroute_locally(self, query: str, context: Dict[str, Any]):
+        """Async _route_locally: each stage's context sources are loaded off the event loop."""
+        scores = await asyncio.to_thread(self._wording_scores, query)
+        if self.general_agent._predefined_response(query):
+            return "general", scores
+
+        await self._aload_context(context, "db_tables")
+        best_agent, scores = self._route_on_schema(query, context, scores)
+        if best_agent:
+            return best_agent, scores
+
+        await self._aload_context(context, "vector_search_results")
+        scores = await asyncio.to_thread(self._score_agents, query, context)
+        return self._clear_winner(scores), scores
+
+    def _wording_scores(self, query: str) -> Dict[str, float]:
+        return {name: float(agent.can_handle_query(query, {})) for name, agent in self.agents.items()}
+
+    def _route_on_schema(self, query: str, context: Dict[str, Any], scores: Dict[str, float]):
+        """
+        Add the database agent's table/column mentions to the wording scores and
+        pick the general or database agent if either now clearly wins.
+        Without document wording the vector agent's score only reflects a generic
+        question, which the search has yet to back up, so it counts as if nothing matched.
+        """
+        scores = {**scores, "database": float(self.database_agent.can_handle_query(query, context))}
+        if scores["vector_db"] < Config.ROUTER_MIN_CONFIDENCE:
+            scores["vector_db"] = min(scores["vector_db"], 0.5)
+        best_agent = self._clear_winner(scores)
+        return (best_agent if best_agent in ("general", "database") else None), scores
+
+    @staticmethod
+    async def _aload_context(context: Dict[str, Any], *fields: str):
+        if isinstance(context, LazyContext):
+            await context.aload(*fields)
+
+    @staticmethod
+    def _clear_winner(scores: Dict[str, float]) -> Optional[str]:
+        """The top-scoring agent if it is confident enough and far enough ahead, else None."""
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        (best_agent, best_score), (_, runner_up_score) = ranked[0], ranked[1]
+
+        if best_score >= Config.ROUTER_MIN_CONFIDENCE and best_score - runner_up_score >= Config.ROUTER_MIN_MARGIN:
+            return best_agent
+        return None
+
+    def _record_routing(self, path: str, routed_agent: str, seconds: float):
+        with self._routing_lock:
+            self._routing_stats["total"] += 1
+            self._routing_stats[path] += 1
+            self._routing_stats["seconds"][path] += seconds
+            if routed_agent in self._routing_stats["routed_to"]:
+                self._routing_stats["routed_to"][routed_agent] += 1
+
+    def get_routing_stats(self) -> Dict[str, Any]:
+        """
+        How queries were routed since startup: locally ("local"), by the supervisor
+        LLM ("llm"), or to the general agent after a routing error ("fallback"),
+        with the share that bypassed the LLM and average routing time per path.
+        """
+        with self._routing_lock:
+            stats = json.loads(json.dumps(self._routing_stats))
+
+        total = stats["total"]
+        stats["llm_bypass_rate"] = round(stats["local"] / total, 3) if total else 0.0
+        stats["avg_routing_ms"] = {
+            path: round(1000 * seconds / stats[path], 1) if stats[path] else 0.0
+            for path, seconds in stats.pop("seconds").items()
+        }
+        return stats
+
     def _supervisor_node(self, state: WorkflowState) -> WorkflowState:
-        """Supervisor node that routes the query."""
+        """Supervisor node that routes the query, locally when the agent scores are clear."""
+        start_time = time.perf_counter()
         try:
             query = state["query"]
             context = state["context"]
@@ -221,27 +577,96 @@ class AgenticWorkflow:
 
             print(f"Supervisor processing query: {query}")
 
-            # Get routing decision from supervisor
-            supervisor_response = self.supervisor.process_query(query, context)
-            routed_agent = supervisor_response.metadata.get("routed_to", "general")
+            routed_agent, scores = None, None
+            if Config.ROUTER_LOCAL_ENABLED:
+                try:
+                    routed_agent, scores = self._route_locally(query, context)
+                except Exception as e:
+                    print(f"Local routing error, asking the supervisor: {e}")
 
-            print(f"Supervisor routed to: {routed_agent}")
+            if routed_agent:
+                routing_path = "local"
+                supervisor_response = self._local_routing_response(routed_agent, scores)
+            else:
+                # Scores are ambiguous: get routing decision from supervisor, which reads every source
+                routing_path = "llm"
+                if isinstance(context, LazyContext):
+                    context.prefetch()
+                supervisor_response = self.supervisor.process_query(query, context)
+                routed_agent = supervisor_response.metadata.get("routed_to", "general")
 
-            return {
-                **state,
-                "supervisor_response": supervisor_response,
-                "routed_agent": routed_agent,
-                "messages": [{"role": "supervisor", "content": f"Routing to {routed_agent} agent"}]
-            }
+            return self._routed_state(state, supervisor_response, routed_agent, routing_path, scores, start_time)
 
         except Exception as e:
-            print(f"Supervisor node error: {e}")
-            return {
-                **state,
-                "routed_agent": "general",
-                "error": f"Supervisor error: {str(e)}",
-                "messages": [{"role": "supervisor", "content": f"Error in routing, defaulting to general agent: {str(e)}"}]
-            }
+            return self._routing_failed_state(state, e, start_time)
+
+    async def _asupervisor_node(self, state: WorkflowState) -> WorkflowState:
+        """Async _supervisor_node."""
+        start_time = time.perf_counter()
+        try:
+            query = state["query"]
+            context = state["context"]
+
+            print(f"Supervisor processing query: {query}")
+
+            routed_agent, scores = None, None
+            if Config.ROUTER_LOCAL_ENABLED:
+                try:
+                    routed_agent, scores = await self._aroute_locally(query, context)
+                except Exception as e:
+                    print(f"Local routing error, asking the supervisor: {e}")
+
+            if routed_agent:
+                routing_path = "local"
+                supervisor_response = self._local_routing_response(routed_agent, scores)
+            else:
+                routing_path = "llm"
+                if isinstance(context, LazyContext):
+                    await context.aprefetch()
+                supervisor_response = await self.supervisor.aprocess_query(query, context)
+                routed_agent = supervisor_response.metadata.get("routed_to", "general")
+
+            return self._routed_state(state, supervisor_response, routed_agent, routing_path, scores, start_time)
+
+        except Exception as e:
+            return self._routing_failed_state(state, e, start_time)
+
+    def _local_routing_response(self, routed_agent: str, scores: Dict[str, float]) -> AgentResponse:
+        return AgentResponse(
+            agent_name=self.supervisor.agent_name,
+            content=routed_agent,
+            metadata={
+                "routed_to": routed_agent,
+                "routing_confidence": scores[routed_agent],
+                "routing_scores": scores
+            },
+            confidence=scores[routed_agent],
+            requires_followup=True
+        )
+
+    def _routed_state(self, state: WorkflowState, supervisor_response: AgentResponse, routed_agent: str,
+                      routing_path: str, scores: Optional[Dict[str, float]], start_time: float) -> WorkflowState:
+        self._record_routing(routing_path, routed_agent, time.perf_counter() - start_time)
+        print(f"Supervisor routed to: {routed_agent} ({routing_path}, scores: {scores})")
+
+        return {
+            **state,
+            "supervisor_response": supervisor_response,
+            "routed_agent": routed_agent,
+            "routing_path": routing_path,
+            "messages": [{"role": "supervisor", "content": f"Routing to {routed_agent} agent"}]
+        }
+
+    def _routing_failed_state(self, state: WorkflowState, e: Exception, start_time: float) -> WorkflowState:
+        print(f"Supervisor node error: {e}")
+        self._record_routing("fallback", "general", time.perf_counter() - start_time)
+        return {
+            **state,
+            "routed_agent": "general",
+            "routing_path": "fallback",
+            "error": f"Supervisor error: {str(e)}",
+            "messages": [{"role": "supervisor", "content": f"Error in routing, defaulting to general agent: {str(e)}"}]
+        }
 
     def _database_agent_node(self, state: WorkflowState) -> WorkflowState:
         """Database agent node."""
@@ -333,6 +758,47 @@ class AgenticWorkflow:
                 "messages": state["messages"] + [{"role": "general_agent", "content": f"Error: {str(e)}"}]
             }
 
+    def _async_agent_node(self, agent_key: str, agent_name: str, done_message: str, error_message: str,
+                          context_fields=()):
+        """
+        Async counterpart of the agent nodes above, for the async graph: loads the
+        context fields the agent reads, then awaits its aprocess_query.
+        """
+        agent = self.agents[agent_key]
+        role = f"{agent_key}_agent"
+
+        async def agent_node(state: WorkflowState) -> WorkflowState:
+            try:
+                query = state["query"]
+                context = state["context"]
+
+                print(f"{agent_name} processing query")
+
+                await self._aload_context(context, *context_fields)
+                response = await agent.aprocess_query(query, context)
+
+                return {
+                    **state,
+                    "final_response": response,
+                    "messages": state["messages"] + [{"role": role, "content": done_message}]
+                }
+
+            except Exception as e:
+                print(f"{agent_name} error: {e}")
+                error_response = AgentResponse(
+                    agent_name=agent_name,
+                    content=f"{error_message}: {str(e)}",
+                    confidence=0.0
+                )
+                return {
+                    **state,
+                    "final_response": error_response,
+                    "error": str(e),
+                    "messages": state["messages"] + [{"role": role, "content": f"Error: {str(e)}"}]
+                }
+
+        return agent_node
+
     def _finalize_node(self, state: WorkflowState) -> WorkflowState:
         """Finalize the response."""
         print("Finalizing workflow response")
@@ -368,56 +834,100 @@ class AgenticWorkflow:
             # Prepare context
             context = self._prepare_context(query)
 
-            # Initial state
-            initial_state = WorkflowState(
-                query=query,
-                context=context,
-                supervisor_response=None,
-                routed_agent=None,
-                final_response=None,
-                messages=[],
-                error=None
-            )
-
             # Run the workflow
-            final_state = self.workflow.invoke(initial_state)
-
-            # Extract results
-            final_response = final_state.get("final_response")
-
-            if final_response:
-                result = {
-                    "success": True,
-                    "response": final_response.content,
-                    "agent": final_response.agent_name,
-                    "confidence": final_response.confidence,
-                    "metadata": final_response.metadata,
-                    "routed_to": final_state.get("routed_agent"),
-                    "workflow_messages": final_state.get("messages", [])
-                }
-            else:
-                result = {
-                    "success": False,
-                    "response": "I apologize, but I couldn't process your request.",
-                    "agent": "WorkflowError",
-                    "confidence": 0.0,
-                    "error": final_state.get("error"),
-                    "workflow_messages": final_state.get("messages", [])
-                }
+            final_state = self.workflow.invoke(self._initial_state(query, context))
 
-            print(f"Workflow completed. Agent: {result.get('agent')}, Success: {result.get('success')}")
-            return result
+            return self._workflow_result(final_state, context)
 
         except Exception as e:
-            print(f"Workflow error: {e}")
-            return {
+            return self._workflow_error(e)
+
+    async def aprocess_query(self, query: str) -> Dict[str, Any]:
+        """
+        Async process_query, through the async graph: LLM calls are awaited and
+        blocking work (context sources, FAISS, the embedding model, psycopg2) runs
+        on worker threads, so a query holds no thread while it waits on the LLM
+        and one event loop can carry many queries at once.
+        """
+        try:
+            print(f"Starting async workflow for query: {query}")
+
+            context = self._prepare_context(query)
+            final_state = await self.async_workflow.ainvoke(self._initial_state(query, context))
+
+            return self._workflow_result(final_state, context)
+
+        except Exception as e:
+            return self._workflow_error(e)
+
+    def submit_query(self, query: str) -> Future:
+        """
+        Schedule aprocess_query on the workflow's event loop and return a
+        concurrent.futures.Future for its result. Every caller (e.g. each
+        request handler thread) shares the one loop, and with it the LLM
+        clients' async connections, which are bound to the loop they were
+        first used on.
+        """
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name='workflow-event-loop', daemon=True).start()
+        return asyncio.run_coroutine_threadsafe(self.aprocess_query(query), self._loop)
+
+    @staticmethod
+    def _initial_state(query: str, context: Dict[str, Any]) -> WorkflowState:
+        return WorkflowState(
+            query=query,
+            context=context,
+            supervisor_response=None,
+            routed_agent=None,
+            routing_path=None,
+            final_response=None,
+            messages=[],
+            error=None
+        )
+
+    @staticmethod
+    def _workflow_result(final_state: WorkflowState, context: LazyContext) -> Dict[str, Any]:
+        # Extract results
+        final_response = final_state.get("final_response")
+
+        if final_response:
+            result = {
+                "success": True,
+                "response": final_response.content,
+                "agent": final_response.agent_name,
+                "confidence": final_response.confidence,
+                "metadata": final_response.metadata,
+                "routed_to": final_state.get("routed_agent"),
+                "routing_path": final_state.get("routing_path"),
+                "context_sources": context.resolved_sources(),
+                "workflow_messages": final_state.get("messages", [])
+            }
+        else:
+            result = {
                 "success": False,
-                "response": f"I encountered an error while processing your request: {str(e)}",
+                "response": "I apologize, but I couldn't process your request.",
                 "agent": "WorkflowError",
                 "confidence": 0.0,
-                "error": str(e)
+                "error": final_state.get("error"),
+                "workflow_messages": final_state.get("messages", [])
             }
 
+        print(f"Workflow completed. Agent: {result.get('agent')}, Success: {result.get('success')}")
+        return result
+
+    @staticmethod
+    def _workflow_error(e: Exception) -> Dict[str, Any]:
+        print(f"Workflow error: {e}")
+        return {
+            "success": False,
+            "response": f"I encountered an error while processing your request: {str(e)}",
+            "agent": "WorkflowError",
+            "confidence": 0.0,
+            "error": str(e)
+        }
+
 
 # Global workflow instance
 _workflow_instance = None
@@ -9,14 +9,14 @@ from routes.auth import auth_bp
 from routes.admin import admin_bp
 from routes.user import user_bp
 from config import Config
-from services.vector_service import VectorService
+from services.vector_service import get_vector_service
 from dotenv import load_dotenv
 load_dotenv()
 
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
-    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
+    app.config['MAX_CONTENT_LENGTH'] = Config.MAX_CONTENT_LENGTH
 
     # Initialize extensions
     CORS(app)
@@ -26,7 +26,7 @@ def create_app():
     init_db()
     try:
         print("Initializing vector model at startup...")
-        VectorService()  # This triggers model download/initialization
+        get_vector_service()  # This triggers model download/initialization and loads the index
         print("Vector model initialized successfully (or already available).")
     except Exception as e:
         print(f"Warning: Failed to initialize vector model at startup: {e}")
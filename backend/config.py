@@ -24,10 +24,80 @@ class Config:
 
     # Upload Configuration
     UPLOAD_FOLDER = 'uploads'
-    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
+    MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 512 * 1024 * 1024))  # 512MB max upload; text is ingested streaming
+    MAX_CSV_FILE_SIZE = int(os.environ.get('MAX_CSV_FILE_SIZE', 16 * 1024 * 1024))  # CSVs are loaded into memory by pandas
 
     # Vector Database Configuration
     VECTOR_DB_PATH = 'vector_db'
+    EMBEDDING_BATCH_SIZE = int(os.environ.get('EMBEDDING_BATCH_SIZE', 64))  # Chunks per encode/index.add call
+    EMBEDDING_MODEL_NAME = os.environ.get('EMBEDDING_MODEL_NAME', 'all-MiniLM-L6-v2')
+    EMBEDDING_BACKEND = os.environ.get('EMBEDDING_BACKEND', 'torch')  # torch | onnx
+    EMBEDDING_ONNX_DIR = os.environ.get('EMBEDDING_ONNX_DIR', 'onnx_models')  # Exported models are cached here
+    EMBEDDING_ONNX_QUANTIZE = os.environ.get('EMBEDDING_ONNX_QUANTIZE', 'true').lower() == 'true'  # Dynamic int8 weights
+    EMBEDDING_INTRA_OP_THREADS = int(os.environ.get('EMBEDDING_INTRA_OP_THREADS', 0))  # 0 = runtime default (physical cores)
+    EMBEDDING_POOL_WORKERS = int(os.environ.get('EMBEDDING_POOL_WORKERS', 0))  # >1 embeds bulk ingestion/reindexing in worker processes
+    EMBEDDING_STORE_ENABLED = os.environ.get('EMBEDDING_STORE_ENABLED', 'true').lower() == 'true'  # Keep chunk embeddings on disk for rebuilds
+    QUERY_EMBEDDING_CACHE_SIZE = int(os.environ.get('QUERY_EMBEDDING_CACHE_SIZE', 2048))  # 0 disables the cache
+    CHUNK_MAX_TOKENS = int(os.environ.get('CHUNK_MAX_TOKENS', 128))  # Capped at the embedding model's max_seq_length
+    CHUNK_OVERLAP_TOKENS = int(os.environ.get('CHUNK_OVERLAP_TOKENS', 16))  # Trailing sentences repeated in the next chunk
+    SEARCH_MODE = os.environ.get('SEARCH_MODE', 'hybrid')  # vector | keyword | hybrid (BM25 + vector, rank-fused)
+    HYBRID_CANDIDATES = int(os.environ.get('HYBRID_CANDIDATES', 50))  # Candidates per retriever before fusion
+    HYBRID_RRF_K = int(os.environ.get('HYBRID_RRF_K', 60))  # Reciprocal-rank fusion damping constant
+    RETRIEVAL_MIN_SCORE = float(os.environ.get('RETRIEVAL_MIN_SCORE', 0.4))  # Cosine similarity a chunk needs to be used as context
+    RETRIEVAL_MAX_RESULTS = int(os.environ.get('RETRIEVAL_MAX_RESULTS', 8))  # Upper bound on chunks passed to the LLM
+    RETRIEVAL_SCORE_GAP = float(os.environ.get('RETRIEVAL_SCORE_GAP', 0.15))  # Stop at a score drop larger than this
+    VECTOR_AGENT_REUSE_MIN_SCORE = float(os.environ.get('VECTOR_AGENT_REUSE_MIN_SCORE', 0.5))  # Answer from the prepared hits when the best scores this; otherwise reformulate and search again
+
+    # Context sources (database schema, vector search) are computed when first read, each given this long once running
+    CONTEXT_SOURCE_TIMEOUT = float(os.environ.get('CONTEXT_SOURCE_TIMEOUT', 5))
+    CONTEXT_MAX_WORKERS = int(os.environ.get('CONTEXT_MAX_WORKERS', 8))  # Shared by all requests; sources queue for a free worker
+    CONTEXT_QUEUE_TIMEOUT = float(os.environ.get('CONTEXT_QUEUE_TIMEOUT', 5))  # Go without a source that waits this long for a worker
+
+    # Local routing: the supervisor LLM is only asked when no agent's can_handle_query
+    # score reaches ROUTER_MIN_CONFIDENCE with a lead of ROUTER_MIN_MARGIN over the next
+    ROUTER_LOCAL_ENABLED = os.environ.get('ROUTER_LOCAL_ENABLED', 'true').lower() == 'true'
+    ROUTER_MIN_CONFIDENCE = float(os.environ.get('ROUTER_MIN_CONFIDENCE', 0.8))
+    ROUTER_MIN_MARGIN = float(os.environ.get('ROUTER_MIN_MARGIN', 0.25))
+    ROUTER_VECTOR_EVIDENCE_SCORE = float(os.environ.get('ROUTER_VECTOR_EVIDENCE_SCORE', 0.6))  # Top hit this similar counts as strong evidence
+
+    # Vector index type: flat (exact), ivf_flat, ivf_pq or hnsw. ANN types start
+    # out flat and are migrated once the index holds enough vectors.
+    VECTOR_INDEX_TYPE = os.environ.get('VECTOR_INDEX_TYPE', 'flat')
+    VECTOR_ANN_MIGRATION_THRESHOLD = int(os.environ.get('VECTOR_ANN_MIGRATION_THRESHOLD', 50000))
+    VECTOR_IVF_NLIST = int(os.environ.get('VECTOR_IVF_NLIST', 4096))
+    VECTOR_IVF_NPROBE = int(os.environ.get('VECTOR_IVF_NPROBE', 16))
+    VECTOR_PQ_M = int(os.environ.get('VECTOR_PQ_M', 48))  # Sub-quantizers, must divide the dimension
+    VECTOR_PQ_NBITS = int(os.environ.get('VECTOR_PQ_NBITS', 8))
+    VECTOR_HNSW_M = int(os.environ.get('VECTOR_HNSW_M', 32))
+    VECTOR_HNSW_EF_CONSTRUCTION = int(os.environ.get('VECTOR_HNSW_EF_CONSTRUCTION', 200))
+    VECTOR_HNSW_EF_SEARCH = int(os.environ.get('VECTOR_HNSW_EF_SEARCH', 64))
+    VECTOR_FILTER_EXACT_MAX = int(os.environ.get('VECTOR_FILTER_EXACT_MAX', 10000))  # Filters matching up to this many vectors are scored exactly on ANN indexes
+
+    # The vector store is split into this many shards (documents are assigned by
+    # filename hash); searches fan out over them on VECTOR_SEARCH_THREADS threads
+    VECTOR_SHARDS = int(os.environ.get('VECTOR_SHARDS', 1))
+    VECTOR_SEARCH_THREADS = int(os.environ.get('VECTOR_SEARCH_THREADS', 0))  # 0 = one per shard
+
+    # Index updates go to an append-only log that is folded into a snapshot once it reaches this size
+    VECTOR_LOG_COMPACT_BYTES = int(os.environ.get('VECTOR_LOG_COMPACT_BYTES', 64 * 1024 * 1024))
+    # Deleted chunks are tombstoned; the index is rebuilt without them once they reach
+    # this share of the index (and at least VECTOR_COMPACTION_MIN_TOMBSTONES)
+    VECTOR_COMPACTION_RATIO = float(os.environ.get('VECTOR_COMPACTION_RATIO', 0.2))
+    VECTOR_COMPACTION_MIN_TOMBSTONES = int(os.environ.get('VECTOR_COMPACTION_MIN_TOMBSTONES', 1000))
+    # Snapshot versions kept per shard (the current one included); older ones can be rolled back to
+    VECTOR_SNAPSHOT_VERSIONS = int(os.environ.get('VECTOR_SNAPSHOT_VERSIONS', 2))
+    # Snapshot after every upload, so read-only workers map new documents instead of
+    # holding them in private memory (they see them either way, from the log)
+    VECTOR_SNAPSHOT_ON_WRITE = os.environ.get('VECTOR_SNAPSHOT_ON_WRITE', 'false').lower() == 'true'
+
+    # Multi-worker deployments: chat workers set VECTOR_READ_ONLY=true and open the
+    # latest snapshot memory-mapped (shared through the OS page cache); a single
+    # writer process handles uploads. Readers pick up new snapshots, and the uploads
+    # logged since, every VECTOR_REFRESH_INTERVAL seconds.
+    VECTOR_READ_ONLY = os.environ.get('VECTOR_READ_ONLY', 'false').lower() == 'true'
+    VECTOR_INDEX_MMAP = os.environ.get('VECTOR_INDEX_MMAP', 'true').lower() == 'true'  # Flat/HNSW need faiss >= 1.10 (IO_FLAG_MMAP_IFC); older versions map IVF only
+    VECTOR_METADATA_MMAP_BYTES = int(os.environ.get('VECTOR_METADATA_MMAP_BYTES', 256 * 1024 * 1024))
+    VECTOR_REFRESH_INTERVAL = float(os.environ.get('VECTOR_REFRESH_INTERVAL', 5))  # Seconds between snapshot and log checks
 
     # Request timeout configuration
     REQUEST_TIMEOUT = 600  # 10 minutes for long-running operations
\ No newline at end of file
@@ -2,9 +2,11 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from werkzeug.utils import secure_filename
 import os
+from config import Config
 from services.file_processor import FileProcessor
 from services.llm_service import LLMService
-from services.vector_service import VectorService
+from services.vector_service import get_vector_service
+from agents.workflow import get_workflow
 from models.database import db
 
 admin_bp = Blueprint('admin', __name__)
@@ -45,6 +47,11 @@ def upload_file():
         os.makedirs('uploads', exist_ok=True)
         file.save(upload_path)
 
+        # Text is ingested streaming and may use the full MAX_CONTENT_LENGTH; CSVs are read whole
+        if file_extension == 'csv' and os.path.getsize(upload_path) > Config.MAX_CSV_FILE_SIZE:
+            os.remove(upload_path)
+            return jsonify({"message": f"CSV files are limited to {Config.MAX_CSV_FILE_SIZE // (1024 * 1024)}MB"}), 413
+
         # Process file based on type
         processor = FileProcessor()
 
@@ -116,7 +123,7 @@ def get_vector_info():
         if claims.get('user_type') != 'admin':
             return jsonify({"message": "Admin access required"}), 403
 
-        vector_service = VectorService()
+        vector_service = get_vector_service()
         info = vector_service.get_info()
 
         return jsonify(info), 200
@@ -135,7 +142,7 @@ def initialize_model():
             return jsonify({"message": "Admin access required"}), 403
 
         print("Initializing vector model...")
-        vector_service = VectorService()
+        vector_service = get_vector_service()
 
         if vector_service.model_available:
             return jsonify({
@@ -150,4 +157,145 @@ def initialize_model():
 
     except Exception as e:
         print(f"Model initialization error: {str(e)}")
-        return jsonify({"message": f"Error initializing model: {str(e)}"}), 500
\ No newline at end of file
+        return jsonify({"message": f"Error initializing model: {str(e)}"}), 500
+
+@admin_bp.route('/vectors/reload', methods=['POST'])
+@jwt_required()
+def reload_vectors():
+    """Reload the shared vector index from disk (e.g. after another process wrote to it)"""
+    try:
+        user_id = get_jwt_identity()
+        claims = get_jwt()
+        if claims.get('user_type') != 'admin':
+            return jsonify({"message": "Admin access required"}), 403
+
+        info = get_vector_service().reload()
+
+        return jsonify({"success": True, "info": info}), 200
+
+    except Exception as e:
+        print(f"Vector reload error: {str(e)}")
+        return jsonify({"message": f"Error reloading vectors: {str(e)}"}), 500
+
+@admin_bp.route('/vectors/rollback', methods=['POST'])
+@jwt_required()
+def rollback_vectors():
+    """Return the vector index to its previous snapshot version (every shard, or {"shard": n})"""
+    try:
+        user_id = get_jwt_identity()
+        claims = get_jwt()
+        if claims.get('user_type') != 'admin':
+            return jsonify({"message": "Admin access required"}), 403
+
+        data = request.get_json(silent=True) or {}
+        vector_service = get_vector_service()
+        rolled_back = vector_service.rollback(shard=data.get('shard'))
+
+        return jsonify({"success": rolled_back, "info": vector_service.get_info()}), 200
+
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    except PermissionError as e:
+        return jsonify({"message": str(e)}), 409
+    except Exception as e:
+        print(f"Vector rollback error: {str(e)}")
+        return jsonify({"message": f"Error rolling back vectors: {str(e)}"}), 500
+
+@admin_bp.route('/routing/stats', methods=['GET'])
+@jwt_required()
+def get_routing_stats():
+    """How chat queries were routed: locally from agent scores, or by the supervisor LLM"""
+    try:
+        user_id = get_jwt_identity()
+        claims = get_jwt()
+        if claims.get('user_type') != 'admin':
+            return jsonify({"message": "Admin access required"}), 403
+
+        return jsonify(get_workflow().get_routing_stats()), 200
+
+    except Exception as e:
+        print(f"Routing stats error: {str(e)}")
+        return jsonify({"message": f"Error getting routing stats: {str(e)}"}), 500
+
+@admin_bp.route('/documents', methods=['GET'])
+@jwt_required()
+def list_documents():
+    """List documents in the vector store with their live chunk counts"""
+    try:
+        user_id = get_jwt_identity()
+        claims = get_jwt()
+        if claims.get('user_type') != 'admin':
+            return jsonify({"message": "Admin access required"}), 403
+
+        documents = get_vector_service().list_documents()
+
+        return jsonify({"documents": documents}), 200
+
+    except Exception as e:
+        return jsonify({"message": f"Error: {str(e)}"}), 500
+
+@admin_bp.route('/documents/<path:filename>', methods=['DELETE'])
+@jwt_required()
+def delete_document(filename):
+    """Remove a document's chunks from the vector store (re-uploading a file replaces it instead)"""
+    try:
+        user_id = get_jwt_identity()
+        claims = get_jwt()
+        if claims.get('user_type') != 'admin':
+            return jsonify({"message": "Admin access required"}), 403
+
+        deleted = get_vector_service().delete_document(filename)
+        if not deleted:
+            return jsonify({"message": f"Document not found: {filename}"}), 404
+
+        return jsonify({"success": True, "filename": filename, "chunks_deleted": deleted}), 200
+
+    except PermissionError as e:
+        return jsonify({"message": str(e)}), 409
+    except Exception as e:
+        print(f"Document delete error: {str(e)}")
+        return jsonify({"message": f"Error deleting document: {str(e)}"}), 500
+
+@admin_bp.route('/vectors/compact', methods=['POST'])
+@jwt_required()
+def compact_vectors():
+    """Rebuild the vector index without deleted chunks (every shard, or {"shard": n})"""
+    try:
+        user_id = get_jwt_identity()
+        claims = get_jwt()
+        if claims.get('user_type') != 'admin':
+            return jsonify({"message": "Admin access required"}), 403
+
+        data = request.get_json(silent=True) or {}
+        vector_service = get_vector_service()
+        compacted = vector_service.compact(shard=data.get('shard'))
+
+        return jsonify({"success": compacted, "info": vector_service.get_info()}), 200
+
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    except Exception as e:
+        print(f"Vector compaction error: {str(e)}")
+        return jsonify({"message": f"Error compacting vectors: {str(e)}"}), 500
+
+@admin_bp.route('/vectors/reindex', methods=['POST'])
+@jwt_required()
+def reindex_vectors():
+    """Re-embed every stored chunk and rebuild the vector index (e.g. after changing the embedding model); {"shard": n} limits it to one shard"""
+    try:
+        user_id = get_jwt_identity()
+        claims = get_jwt()
+        if claims.get('user_type') != 'admin':
+            return jsonify({"message": "Admin access required"}), 403
+
+        data = request.get_json(silent=True) or {}
+        vector_service = get_vector_service()
+        reindexed = vector_service.reindex_all(index_type=data.get('index_type'), shard=data.get('shard'))
+
+        return jsonify({"success": reindexed, "info": vector_service.get_info()}), 200
+
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    except Exception as e:
+        print(f"Vector reindex error: {str(e)}")
+        return jsonify({"message": f"Error reindexing vectors: {str(e)}"}), 500
@@ -75,6 +75,7 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from agents.workflow import get_workflow
+import asyncio
 import json
 import os
 from datetime import datetime
@@ -114,66 +115,101 @@ def save_chat_history(user_id, chat_data):
         print(f"Error saving chat history: {e}")
         return False
 
+def record_chat_exchange(user_id, message, asked_at, result):
+    """Append the user's message and the workflow's answer to the user's chat history"""
+    chat_data = load_chat_history(user_id)
+
+    chat_data["history"].append({
+        "role": "user",
+        "content": message,
+        "timestamp": asked_at
+    })
+    chat_data["history"].append({
+        "role": "assistant",
+        "content": result.get("response"),
+        "timestamp": datetime.now().isoformat(),
+        "agent": result.get("agent"),
+        "confidence": result.get("confidence"),
+        "routed_to": result.get("routed_to")
+    })
+
+    return save_chat_history(user_id, chat_data)
+
+def chat_response(result):
+    """JSON body returned for a workflow result"""
+    return jsonify({
+        "success": result.get("success", True),
+        "response": result.get("response"),
+        "agent": result.get("agent"),
+        "confidence": result.get("confidence"),
+        "metadata": result.get("metadata", {}),
+        "routed_to": result.get("routed_to"),
+        "routing_path": result.get("routing_path"),
+        "context_sources": result.get("context_sources", {})
+    })
+
+def chat_error(e):
+    return jsonify({
+        "success": False,
+        "message": f"Error: {str(e)}",
+        "agent": "Error",
+        "confidence": 0.0
+    }), 500
+
 @user_bp.route('/chat', methods=['POST'])
 @jwt_required()
 def chat():
     try:
         user_id = get_jwt_identity()
-        claims = get_jwt()
         data = request.get_json()
         message = data.get('message')
 
         if not message:
             return jsonify({"message": "No message provided"}), 400
 
-        # Load existing chat history
-        chat_data = load_chat_history(user_id)
+        asked_at = datetime.now().isoformat()
 
-        # Add user message to history
-        user_message = {
-            "role": "user",
-            "content": message,
-            "timestamp": datetime.now().isoformat()
-        }
-        chat_data["history"].append(user_message)
+        # Process the query through the agentic workflow
+        result = get_workflow().process_query(message)
 
-        # Get the agentic workflow instance
-        workflow = get_workflow()
+        record_chat_exchange(user_id, message, asked_at, result)
+        return chat_response(result), 200
 
-        # Process the query through the agentic workflow
-        result = workflow.process_query(message)
-
-        # Add bot response to history
-        bot_message = {
-            "role": "assistant",
-            "content": result.get("response"),
-            "timestamp": datetime.now().isoformat(),
-            "agent": result.get("agent"),
-            "confidence": result.get("confidence"),
-            "routed_to": result.get("routed_to")
-        }
-        chat_data["history"].append(bot_message)
-
-        # Save updated chat history
-        save_chat_history(user_id, chat_data)
-
-        # Return the response
-        return jsonify({
-            "success": result.get("success", True),
-            "response": result.get("response"),
-            "agent": result.get("agent"),
-            "confidence": result.get("confidence"),
-            "metadata": result.get("metadata", {}),
-            "routed_to": result.get("routed_to")
-        }), 200
+    except Exception as e:
+        return chat_error(e)
+
+@user_bp.route('/chat/async', methods=['POST'])
+@jwt_required()
+async def chat_async():
+    """
+    Same as /chat, but the query runs as a coroutine on the workflow's shared
+    event loop (AgenticWorkflow.submit_query), where concurrent chats wait on
+    the LLM together instead of each blocking a workflow thread.
+
+    This is not an ASGI endpoint: Flask runs async views under WSGI, so each
+    request still holds a server thread until it is answered, and concurrency
+    stays bounded by the server's thread count. What it saves is the LLM and
+    context work, which no longer needs a thread per chat. Serving chats
+    without a thread each would take an ASGI app, which the JWT and request
+    handling here (Flask extensions) don't support.
+    """
+    try:
+        user_id = get_jwt_identity()
+        data = request.get_json()
+        message = data.get('message')
+
+        if not message:
+            return jsonify({"message": "No message provided"}), 400
+
+        asked_at = datetime.now().isoformat()
+
+        result = await asyncio.wrap_future(get_workflow().submit_query(message))
+
+        record_chat_exchange(user_id, message, asked_at, result)
+        return chat_response(result), 200
 
     except Exception as e:
-        return jsonify({
-            "success": False,
-            "message": f"Error: {str(e)}",
-            "agent": "Error",
-            "confidence": 0.0
-        }), 500
+        return chat_error(e)
 
 @user_bp.route('/chat/history', methods=['GET'])
 @jwt_required()
@@ -192,7 +228,7 @@ def chat_legacy():
     """Legacy chat endpoint for backwards compatibility."""
     try:
         from services.llm_service import LLMService
-        from services.vector_service import VectorService
+        from services.vector_service import get_vector_service
 
         user_id = get_jwt_identity()
         claims = get_jwt()
@@ -204,7 +240,7 @@ def chat_legacy():
 
         # Initialize services
         llm_service = LLMService()
-        vector_service = VectorService()
+        vector_service = get_vector_service()
 
         # Search for relevant context in vector database
         context = vector_service.search(message, top_k=3)
@@ -0,0 +1,207 @@
+"""
+Embedding model backends for the vector store.
+
+'torch' runs the SentenceTransformer model on PyTorch as before. 'onnx' runs
+the same model exported to ONNX (optionally with dynamic int8 weight
+quantization) on onnxruntime, which is considerably faster on CPU-only nodes.
+The export happens once and is cached in EMBEDDING_ONNX_DIR; after that the
+ONNX backend loads without PyTorch.
+
+Both backends expose the subset of the SentenceTransformer interface the
+vector service uses: encode(), tokenizer and max_seq_length.
+"""
+
+import inspect
+import json
+import os
+import numpy as np
+from config import Config
+
+EMBEDDING_BACKENDS = ('torch', 'onnx')
+
+
+class SentenceTransformerBackend:
+    """The SentenceTransformer model itself, on PyTorch."""
+
+    def __init__(self, model_name, intra_op_threads=0):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if intra_op_threads:
+            torch.set_num_threads(intra_op_threads)
+        self.model = SentenceTransformer(model_name)
+        self.model_key = f"{model_name}:torch"
+        self.tokenizer = self.model.tokenizer
+        self.max_seq_length = self.model.max_seq_length
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True, show_progress_bar=False):
+        return self.model.encode(
+            texts,
+            batch_size=batch_size,
+            convert_to_numpy=convert_to_numpy,
+            show_progress_bar=show_progress_bar
+        )
+
+
+class OnnxEmbeddingBackend:
+    """SentenceTransformer model exported to ONNX and run on onnxruntime's CPU provider."""
+
+    CONFIG_FILE = 'embedding_config.json'
+
+    def __init__(self, model_name, export_dir, quantize=True, intra_op_threads=0):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.model_dir = os.path.join(export_dir, model_name.replace('/', '__'))
+        model_file = 'model.int8.onnx' if quantize else 'model.onnx'
+        model_path = os.path.join(self.model_dir, model_file)
+        if not os.path.exists(model_path):
+            export_onnx_model(model_name, self.model_dir, quantize)
+
+        with open(os.path.join(self.model_dir, self.CONFIG_FILE), 'r') as f:
+            config = json.load(f)
+        self.pooling = config['pooling']
+        self.max_seq_length = config['max_seq_length']
+        self.model_key = f"{model_name}:onnx{'-int8' if quantize else ''}"
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = 1  # The graph is a single chain; parallelism is intra-op
+
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_dir)
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True, show_progress_bar=False):
+        if isinstance(texts, str):
+            return self.encode([texts], batch_size)[0]
+
+        # Batch texts of similar length together to minimise padding, as SentenceTransformer does
+        order = sorted(range(len(texts)), key=lambda i: -len(texts[i]))
+        embeddings = [None] * len(texts)
+
+        for start in range(0, len(texts), batch_size):
+            batch_positions = order[start:start + batch_size]
+            encoded = self.tokenizer(
+                [texts[i] for i in batch_positions],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors='np'
+            )
+            feeds = {name: encoded[name].astype('int64') for name in self.input_names}
+            token_embeddings = self.session.run(None, feeds)[0]
+            pooled = self._pool(token_embeddings, encoded['attention_mask'])
+            for position, embedding in zip(batch_positions, pooled):
+                embeddings[position] = embedding
+
+        if not embeddings:
+            return np.zeros((0, 0), dtype='float32')
+        return np.vstack(embeddings).astype('float32')
+
+    def _pool(self, token_embeddings, attention_mask):
+        if self.pooling == 'cls':
+            return token_embeddings[:, 0]
+        mask = attention_mask[..., None].astype('float32')
+        return (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+
+def export_onnx_model(model_name, model_dir, quantize=True):
+    """
+    Export a SentenceTransformer's transformer to ONNX (plus an int8 dynamically
+    quantized copy), together with its tokenizer and pooling settings.
+    """
+    fp32_path = os.path.join(model_dir, 'model.onnx')
+    if os.path.exists(fp32_path) and os.path.exists(os.path.join(model_dir, OnnxEmbeddingBackend.CONFIG_FILE)):
+        if quantize:
+            _quantize_onnx_model(model_dir)
+        return
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    print(f"Exporting {model_name} to ONNX in {model_dir} (one-off)...")
+    os.makedirs(model_dir, exist_ok=True)
+
+    model = SentenceTransformer(model_name, device='cpu')
+    transformer = model[0].auto_model.eval()
+    tokenizer = model.tokenizer
+    pooling = 'mean'
+    if len(model) > 1 and getattr(model[1], 'pooling_mode_cls_token', False):
+        pooling = 'cls'
+
+    sample = tokenizer(["An example sentence to trace the model with."], return_tensors='pt')
+    input_names = list(sample.keys())
+
+    class TokenEmbeddings(torch.nn.Module):
+        """Positional-input wrapper returning only the token embeddings, for tracing."""
+
+        def __init__(self):
+            super().__init__()
+            self.transformer = transformer
+
+        def forward(self, *inputs):
+            return self.transformer(**dict(zip(input_names, inputs)), return_dict=False)[0]
+
+    export_kwargs = {}
+    if 'dynamo' in inspect.signature(torch.onnx.export).parameters:
+        export_kwargs['dynamo'] = False  # Use the TorchScript exporter, which supports dynamic_axes
+
+    with torch.no_grad():
+        torch.onnx.export(
+            TokenEmbeddings(),
+            tuple(sample[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=['token_embeddings'],
+            dynamic_axes={name: {0: 'batch', 1: 'sequence'} for name in input_names + ['token_embeddings']},
+            opset_version=14,
+            **export_kwargs
+        )
+
+    tokenizer.save_pretrained(model_dir)
+    with open(os.path.join(model_dir, OnnxEmbeddingBackend.CONFIG_FILE), 'w') as f:
+        json.dump({
+            "model_name": model_name,
+            "pooling": pooling,
+            "max_seq_length": model.max_seq_length,
+            "dimension": model.get_sentence_embedding_dimension()
+        }, f)
+    if quantize:
+        _quantize_onnx_model(model_dir)
+    print(f"ONNX export of {model_name} complete")
+
+
+def _quantize_onnx_model(model_dir):
+    """Write an int8 copy of model.onnx with dynamically quantized weights."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    quantize_dynamic(
+        os.path.join(model_dir, 'model.onnx'),
+        os.path.join(model_dir, 'model.int8.onnx'),
+        weight_type=QuantType.QInt8
+    )
+
+
+def load_embedding_model(backend=None, intra_op_threads=None):
+    """Load the configured embedding backend, falling back to PyTorch if ONNX can't be used."""
+    backend = backend or Config.EMBEDDING_BACKEND
+    if intra_op_threads is None:
+        intra_op_threads = Config.EMBEDDING_INTRA_OP_THREADS
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}'. Expected one of: {', '.join(EMBEDDING_BACKENDS)}")
+
+    if backend == 'onnx':
+        try:
+            return OnnxEmbeddingBackend(
+                Config.EMBEDDING_MODEL_NAME,
+                Config.EMBEDDING_ONNX_DIR,
+                quantize=Config.EMBEDDING_ONNX_QUANTIZE,
+                intra_op_threads=intra_op_threads
+            )
+        except Exception as e:
+            print(f"Warning: Could not load ONNX embedding backend ({e}), falling back to PyTorch")
+
+    return SentenceTransformerBackend(Config.EMBEDDING_MODEL_NAME, intra_op_threads)
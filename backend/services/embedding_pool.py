@@ -0,0 +1,58 @@
+"""
+Multi-process embedding pool for bulk ingestion and reindexing.
+
+Like SentenceTransformer's multi-process pool, each worker process loads its
+own copy of the embedding backend and encodes whole batches; results come
+back in submission order so callers can insert them into the index in one
+pass. Workers are started with 'spawn' (PyTorch and onnxruntime are not
+fork-safe) and split the machine's cores between them.
+"""
+
+import multiprocessing
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from config import Config
+from services.embedding_backends import load_embedding_model
+
+# Backend loaded once per worker process by _init_worker
+_worker_model = None
+
+
+def _init_worker(backend, intra_op_threads):
+    global _worker_model
+    _worker_model = load_embedding_model(backend, intra_op_threads=intra_op_threads)
+
+
+def _encode_batch(texts, batch_size):
+    return _worker_model.encode(
+        texts,
+        batch_size=batch_size,
+        convert_to_numpy=True,
+        show_progress_bar=False
+    ).astype('float32')
+
+
+class EmbeddingPool:
+    """Encode batches of texts across worker processes, preserving input order."""
+
+    def __init__(self, workers, backend=None):
+        self.workers = workers
+        intra_op_threads = max(1, (os.cpu_count() or 1) // workers)
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(backend or Config.EMBEDDING_BACKEND, intra_op_threads)
+        )
+        print(f"Started embedding pool with {workers} worker processes ({intra_op_threads} threads each)")
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True, show_progress_bar=False):
+        batches = [texts[start:start + batch_size] for start in range(0, len(texts), batch_size)]
+        results = list(self._executor.map(_encode_batch, batches, [batch_size] * len(batches)))
+        if not results:
+            return np.zeros((0, 0), dtype='float32')
+        return np.vstack(results)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,90 @@
+"""
+Persistent on-disk store of chunk embeddings, keyed by chunk content hash.
+
+Embeddings are appended as raw float32 rows to one file per embedding model
+and read back through a memory map; the hash -> row mapping lives in the
+metadata database. Index rebuilds, index-type migrations and re-uploads of
+previously deleted content read vectors from here instead of running the
+model again (and get exact vectors even when the live index is IVF-PQ).
+
+Rows are written before their mapping is committed, so a crash can only
+leave unreferenced rows at the end of the file.
+"""
+
+import os
+import re
+import threading
+import numpy as np
+
+
+class EmbeddingStore:
+    """Append-only, memory-mapped float32 embedding file for one embedding model."""
+
+    def __init__(self, directory, model_key, dimension, metadata_store):
+        self.model_key = model_key
+        self.dimension = dimension
+        self.metadata_store = metadata_store
+        self.row_bytes = dimension * 4
+
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, re.sub(r'[^A-Za-z0-9._-]+', '_', model_key) + '.f32')
+
+        self._lock = threading.Lock()
+        self._map = None
+        self._rows = 0
+        if os.path.exists(self.path):
+            size = os.path.getsize(self.path)
+            if size % self.row_bytes and not metadata_store.read_only:
+                # Torn final row from a crash mid-append
+                with open(self.path, 'r+b') as f:
+                    f.truncate(size - size % self.row_bytes)
+            self._rows = os.path.getsize(self.path) // self.row_bytes
+
+    def _mapped(self, rows_needed):
+        """Memory map covering at least rows_needed rows, remapping after the file grew."""
+        if self._map is None or len(self._map) < rows_needed:
+            self._rows = max(self._rows, os.path.getsize(self.path) // self.row_bytes)
+            self._map = np.memmap(self.path, dtype='float32', mode='r', shape=(self._rows, self.dimension))
+        return self._map
+
+    def get_many(self, hashes):
+        """Return {content_hash: vector} for the hashes with a stored embedding."""
+        rows = self.metadata_store.embedding_rows(self.model_key, set(hashes))
+        if not rows:
+            return {}
+        with self._lock:
+            mapped = self._mapped(max(rows.values()) + 1)
+            return {chunk_hash: np.array(mapped[row]) for chunk_hash, row in rows.items()}
+
+    def put_many(self, hashes, vectors):
+        """Store embeddings for hashes that don't have one yet."""
+        if self.metadata_store.read_only:
+            return 0
+        existing = self.metadata_store.embedding_rows(self.model_key, set(hashes))
+
+        new_hashes, new_positions = [], []
+        for position, chunk_hash in enumerate(hashes):
+            if chunk_hash not in existing and chunk_hash not in new_hashes:
+                new_hashes.append(chunk_hash)
+                new_positions.append(position)
+        if not new_hashes:
+            return 0
+
+        vectors = np.ascontiguousarray(np.asarray(vectors, dtype='float32')[new_positions])
+        with self._lock:
+            first_row = self._rows
+            with open(self.path, 'ab') as f:
+                f.write(vectors.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            self._rows += len(new_hashes)
+
+        self.metadata_store.add_embedding_rows(
+            self.model_key,
+            zip(new_hashes, range(first_row, first_row + len(new_hashes)))
+        )
+        return len(new_hashes)
+
+    def stats(self):
+        with self._lock:
+            return {"rows": self._rows, "bytes": self._rows * self.row_bytes}
@@ -1,14 +1,19 @@
+import codecs
 import pandas as pd
 import os
 from services.llm_service import LLMService
-from services.vector_service import VectorService
+from services.vector_service import get_vector_service
 from models.database import db
 from services.groq_csv_sql import GroqCSVSQLService
 
 class FileProcessor:
+    # Text files are decoded and ingested in blocks of this many characters
+    TEXT_READ_BLOCK_CHARS = 1024 * 1024
+    ENCODING_SAMPLE_BYTES = 64 * 1024
+
     def __init__(self):
         self.llm_service = LLMService()
-        self.vector_service = VectorService()
+        self.vector_service = get_vector_service()
         self.groq_csv_sql = GroqCSVSQLService()
 
 
@@ -16,52 +21,99 @@ class FileProcessor:
         # Use Groq-based CSV/SQL logic
         return self.groq_csv_sql.process_csv_with_llm(file_path, filename)
 
+    def _detect_encodings(self, file_path):
+        """
+        Narrow the candidate text encodings down from a sample of the file instead
+        of decoding the whole file once per candidate. Returns (encodings that
+        decode the sample, most likely first, decoded sample). A later part of the
+        file can still rule out the first one; see process_txt.
+        """
+        with open(file_path, 'rb') as file:
+            sample = file.read(self.ENCODING_SAMPLE_BYTES)
+
+        if sample.startswith(codecs.BOM_UTF8):
+            candidates = ['utf-8-sig']
+        else:
+            candidates = ['utf-8', 'cp1252', 'latin-1']
+
+        encodings, decoded_sample = [], None
+        for encoding in candidates:
+            try:
+                # Incremental decode tolerates a multi-byte character cut off at the sample edge
+                decoded = codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+            except UnicodeDecodeError:
+                continue
+            encodings.append(encoding)
+            if decoded_sample is None:
+                decoded_sample = decoded
+        return encodings, decoded_sample
+
+    def _iter_text_blocks(self, file, stats=None):
+        """
+        Yield decoded blocks of a text file, counting characters as they stream
+        past. A decode error is recorded in stats before it propagates.
+        """
+        try:
+            for block in iter(lambda: file.read(self.TEXT_READ_BLOCK_CHARS), ''):
+                if stats is not None:
+                    stats["content_length"] += len(block)
+                yield block
+        except UnicodeDecodeError as e:
+            if stats is not None:
+                stats["decode_error"] = e
+            raise
+
     def process_txt(self, file_path, filename):
         try:
             print(f"Starting to process TXT file: {filename}")
 
-            # Read text file with multiple encoding attempts
-            content = None
-            encodings = ['utf-8', 'utf-8-sig', 'latin-1', 'cp1252']
-
-            print("Reading file content...")
-            for encoding in encodings:
-                try:
-                    with open(file_path, 'r', encoding=encoding) as file:
-                        content = file.read()
-                    print(f"Successfully read file with {encoding} encoding")
-                    break
-                except UnicodeDecodeError:
-                    continue
-
-            if content is None:
+            # Narrow the encodings down from a sample; the file itself is read once, in blocks
+            encodings, sample = self._detect_encodings(file_path)
+            if not encodings:
                 return {
                     "success": False,
                     "message": "Could not decode file. Please ensure it's a valid text file."
                 }
 
+            # Get file metadata
+            file_size = os.path.getsize(file_path)
+
             # Check if file is empty
-            if not content.strip():
+            if file_size <= self.ENCODING_SAMPLE_BYTES and not sample.strip():
                 return {
                     "success": False,
                     "message": "Text file is empty or contains only whitespace."
                 }
 
-            # Get file metadata
-            file_size = os.path.getsize(file_path)
-            print(f"File size: {file_size} bytes, content length: {len(content)} characters")
+            print(f"File size: {file_size} bytes")
 
             # Store in vector database
-            print("Storing content in vector database...")
+            print("Streaming content into vector database...")
             try:
-                success = self.vector_service.add_document(
-                    content=content,
-                    metadata={
-                        "filename": filename,
-                        "file_size": file_size,
-                        "upload_date": str(pd.Timestamp.now())
+                for encoding in encodings:
+                    print(f"Decoding as {encoding}")
+                    stats = {"content_length": 0}
+                    # Decoded strictly: a byte the encoding can't decode past the sample fails
+                    # the ingest, which add_document rolls back, and the next candidate is tried.
+                    # Unchanged chunks aren't re-embedded, so a re-upload needs no separate hashing pass.
+                    with open(file_path, 'r', encoding=encoding) as file:
+                        ingest_result = self.vector_service.add_document(
+                            content=self._iter_text_blocks(file, stats),
+                            metadata={
+                                "filename": filename,
+                                "file_size": file_size,
+                                "upload_date": str(pd.Timestamp.now())
+                            },
+                            replace=True  # Re-uploading a file replaces its previous chunks
+                        )
+                    if "decode_error" not in stats:
+                        break
+                    print(f"Not {encoding} after all: {stats['decode_error']}")
+                else:
+                    return {
+                        "success": False,
+                        "message": "Could not decode file. Please ensure it's a valid text file."
                     }
-                )
             except Exception as vector_error:
                 print(f"Vector service error: {vector_error}")
                 return {
@@ -69,19 +121,36 @@ class FileProcessor:
                     "message": f"Error with vector database: {str(vector_error)}. This may occur on first run while downloading the AI model. Please try again in a few minutes."
                 }
 
-            if not success:
+            if not ingest_result.get("success"):
                 return {
                     "success": False,
                     "message": "Failed to store content in vector database. The AI model may still be initializing. Please try again in a few minutes."
                 }
 
-            print("Text file processed successfully")
+            if ingest_result.get("chunks_indexed", 0) == 0:
+                return {
+                    "success": False,
+                    "message": "Text file is empty or contains only whitespace."
+                }
+
+            if ingest_result.get("skipped"):
+                message = "Text file is unchanged since it was last uploaded. Existing content kept."
+            else:
+                message = "Text file processed successfully. Content stored in vector database."
+
+            print(f"Text file processed successfully ({stats['content_length']} characters)")
             return {
                 "success": True,
-                "message": f"Text file processed successfully. Content stored in vector database.",
+                "message": message,
                 "filename": filename,
-                "content_length": len(content),
-                "file_size": file_size
+                "content_length": stats["content_length"],
+                "file_size": file_size,
+                "chunks_indexed": ingest_result.get("chunks_indexed", 0),
+                "chunks_new": ingest_result.get("chunks_new", 0),
+                "chunks_deduplicated": ingest_result.get("chunks_deduplicated", 0),
+                "chunks_replaced": ingest_result.get("chunks_replaced", 0),
+                "skipped": ingest_result.get("skipped", False),
+                "chunks_per_second": ingest_result.get("chunks_per_second", 0.0)
             }
 
         except FileNotFoundError:
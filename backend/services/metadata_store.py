@@ -0,0 +1,485 @@
+"""
+SQLite-backed chunk metadata store for the vector database.
+
+Each chunk row points at a FAISS vector id so a search only reads the
+metadata of its top-k hits instead of holding every chunk's text in memory.
+Chunks with identical content share one vector (looked up by content hash);
+a vector is tombstoned once no chunk references it. Chunk text is also kept
+in an FTS5 full-text index, maintained by triggers, for keyword (BM25)
+retrieval alongside FAISS. Connections memory-map
+the database file, so several worker processes reading the same store share
+its pages through the OS page cache.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import re
+import sqlite3
+import threading
+
+
+# Fields search results can be filtered on (see ChunkMetadataStore._filter_clause)
+SEARCH_FILTERS = ('filename', 'upload_date')
+
+
+def content_hash(text):
+    """Stable hash of chunk or document text used for deduplication."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class ChunkMetadataStore:
+    """Chunk text and metadata, stored on disk and read lazily by vector id."""
+
+    # Columns kept outside the JSON blob because they are queried directly
+    _COLUMN_FIELDS = ('filename', 'chunk_id', 'content', 'content_hash')
+    _MAX_PARAMS = 900
+
+    # Query terms: words, or codes/identifiers with inner punctuation like "INV-2023/17"
+    _QUERY_TERM = re.compile(r'\w(?:[\w\-./:#]*\w)?')
+    _MAX_QUERY_TERMS = 32
+    # Too common to help BM25; matching them would only make keyword queries slower
+    _STOPWORDS = frozenset((
+        'a', 'an', 'and', 'are', 'as', 'at', 'be', 'but', 'by', 'can', 'do', 'does', 'for', 'from',
+        'how', 'i', 'in', 'is', 'it', 'me', 'my', 'of', 'on', 'or', 'our', 'tell', 'that', 'the',
+        'their', 'there', 'this', 'to', 'was', 'we', 'were', 'what', 'when', 'where', 'which',
+        'who', 'why', 'with', 'you', 'your', 'about', 'any', 'show', 'find', 'give', 'please'
+    ))
+
+    def __init__(self, db_path, read_only=False, mmap_size=0):
+        self.db_path = db_path
+        self.read_only = read_only
+        self.mmap_size = mmap_size
+        # One connection per thread; SQLite connections can't be shared safely
+        self._local = threading.local()
+        self._count = None  # Cached row count, reset on writes
+
+        # Readers only create the (empty) schema if no writer has yet
+        if not read_only or not os.path.exists(db_path):
+            self._create_tables()
+        self.keyword_search_available = self._connection().execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'chunks_fts'"
+        ).fetchone() is not None
+
+    def _connection(self):
+        conn = getattr(self._local, 'connection', None)
+        if conn is None:
+            if self.read_only:
+                conn = sqlite3.connect(f'file:{self.db_path}?mode=ro', uri=True, timeout=30)
+            else:
+                conn = sqlite3.connect(self.db_path, timeout=30)
+                conn.execute('PRAGMA journal_mode=WAL')  # Readers don't block the writer
+                conn.execute('PRAGMA synchronous=NORMAL')
+            if self.mmap_size:
+                conn.execute(f'PRAGMA mmap_size={int(self.mmap_size)}')
+            self._local.connection = conn
+        return conn
+
+    def _create_tables(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS chunks (
+                    id INTEGER PRIMARY KEY,
+                    filename TEXT,
+                    chunk_id INTEGER,
+                    content TEXT NOT NULL,
+                    metadata TEXT NOT NULL,
+                    vector_id INTEGER,
+                    content_hash TEXT,
+                    upload_date TEXT
+                )
+            """)
+            self._migrate_chunk_columns(conn)
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_chunks_filename ON chunks(filename)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_chunks_vector_id ON chunks(vector_id)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_chunks_content_hash ON chunks(content_hash)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_chunks_upload_date ON chunks(upload_date)')
+            # Row of each chunk's embedding in the per-model embedding store file
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS embedding_rows (
+                    model_key TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    row INTEGER NOT NULL,
+                    PRIMARY KEY (model_key, content_hash)
+                )
+            """)
+            # Content hash of each document as last indexed, to skip unchanged re-uploads
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    filename TEXT PRIMARY KEY,
+                    content_hash TEXT NOT NULL,
+                    chunk_count INTEGER NOT NULL
+                )
+            """)
+            # Vector ids whose chunks were deleted but which are still in the FAISS index
+            conn.execute('CREATE TABLE IF NOT EXISTS tombstones (id INTEGER PRIMARY KEY)')
+            conn.execute('CREATE TABLE IF NOT EXISTS store_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+            self._create_keyword_index(conn)
+        conn.close()
+
+    def _create_keyword_index(self, conn):
+        """FTS5 index over chunk content, kept in sync with the chunks table by triggers."""
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'chunks_fts'").fetchone()
+        try:
+            conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+                    content, content='chunks', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+                )
+            """)
+        except sqlite3.OperationalError as e:
+            print(f"Warning: SQLite FTS5 unavailable ({e}), keyword search disabled")
+            return
+
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS chunks_fts_insert AFTER INSERT ON chunks BEGIN
+                INSERT INTO chunks_fts (rowid, content) VALUES (new.id, new.content);
+            END
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS chunks_fts_delete AFTER DELETE ON chunks BEGIN
+                INSERT INTO chunks_fts (chunks_fts, rowid, content) VALUES ('delete', old.id, old.content);
+            END
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS chunks_fts_update AFTER UPDATE OF content ON chunks BEGIN
+                INSERT INTO chunks_fts (chunks_fts, rowid, content) VALUES ('delete', old.id, old.content);
+                INSERT INTO chunks_fts (rowid, content) VALUES (new.id, new.content);
+            END
+        """)
+        if not exists:
+            # Index chunks stored before the keyword index existed
+            conn.execute("INSERT INTO chunks_fts (chunks_fts) VALUES ('rebuild')")
+
+    def _migrate_chunk_columns(self, conn):
+        """Add and backfill columns introduced after a store was created."""
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(chunks)')}
+
+        if 'upload_date' not in columns:
+            # Copied out of the JSON blob so date-range filters can use an index
+            conn.execute('ALTER TABLE chunks ADD COLUMN upload_date TEXT')
+            conn.execute("UPDATE chunks SET upload_date = json_extract(metadata, '$.upload_date')")
+
+        if 'vector_id' in columns:
+            return
+
+        # Stores created before deduplication keyed chunks by vector id
+        conn.execute('ALTER TABLE chunks ADD COLUMN vector_id INTEGER')
+        conn.execute('ALTER TABLE chunks ADD COLUMN content_hash TEXT')
+        conn.execute('UPDATE chunks SET vector_id = id')
+        rows = conn.execute('SELECT id, content FROM chunks').fetchall()
+        conn.executemany(
+            'UPDATE chunks SET content_hash = ? WHERE id = ?',
+            [(content_hash(content), row_id) for row_id, content in rows]
+        )
+        print(f"Backfilled content hashes for {len(rows)} chunks")
+
+    def add_chunks(self, rows):
+        """
+        Insert chunk metadata. rows is an iterable of (vector_id, metadata dict);
+        several chunks may share a vector id when their content is identical.
+        """
+        if self.read_only:
+            raise PermissionError("Chunk metadata store is opened read-only")
+
+        records = []
+        for vector_id, metadata in rows:
+            extra = {k: v for k, v in metadata.items() if k not in self._COLUMN_FIELDS}
+            content = metadata.get('content', '')
+            records.append((
+                int(vector_id),
+                metadata.get('filename'),
+                metadata.get('chunk_id'),
+                content,
+                json.dumps(extra, default=str),
+                metadata.get('content_hash') or content_hash(content),
+                str(metadata['upload_date']) if metadata.get('upload_date') is not None else None
+            ))
+
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                'INSERT INTO chunks (vector_id, filename, chunk_id, content, metadata, content_hash, upload_date) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                records
+            )
+        self._count = None
+        return len(records)
+
+    def get_many(self, vector_ids, filters=None):
+        """
+        Return {vector_id: metadata dict} for the ids that exist. A vector shared by
+        several chunks reports the chunk that was indexed first; with search filters
+        (see _filter_clause), the first chunk that matches them.
+        """
+        ids = [int(i) for i in vector_ids]
+        found = {}
+        condition, filter_params = self._filter_clause(filters)
+        condition = f' AND {condition}' if condition else ''
+
+        # Stay under SQLite's bound-parameter limit for large batched searches
+        for start in range(0, len(ids), self._MAX_PARAMS):
+            batch = ids[start:start + self._MAX_PARAMS]
+            placeholders = ','.join('?' * len(batch))
+            cursor = self._connection().execute(
+                f'SELECT vector_id, filename, chunk_id, content, metadata FROM chunks '
+                f'WHERE vector_id IN ({placeholders}){condition} ORDER BY id DESC',
+                batch + filter_params
+            )
+
+            # Descending row order, so the earliest chunk of a shared vector wins
+            for vector_id, filename, chunk_id, content, metadata_json in cursor:
+                metadata = json.loads(metadata_json)
+                metadata.update({
+                    'filename': filename,
+                    'chunk_id': chunk_id,
+                    'content': content
+                })
+                found[vector_id] = metadata
+        return found
+
+    def allocate_ids(self, count, floor=0):
+        """
+        Reserve count new vector ids and return the first one. Ids are never reused,
+        even after their chunks are deleted and compacted away.
+        """
+        conn = self._connection()
+        with conn:
+            row = conn.execute("SELECT value FROM store_meta WHERE key = 'next_vector_id'").fetchone()
+            first_id = max(row[0] if row else 0, floor)
+            conn.execute(
+                "INSERT OR REPLACE INTO store_meta (key, value) VALUES ('next_vector_id', ?)",
+                (first_id + count,)
+            )
+        return first_id
+
+    @staticmethod
+    def _filter_clause(filters):
+        """
+        SQL condition on the chunks table for search filters:
+            filename     a filename or a list of filenames
+            upload_date  (start, end) ISO date/time strings, either may be None; inclusive
+        Returns (sql, params), or ('', []) for no filters.
+        """
+        if not filters:
+            return '', []
+        unknown = set(filters) - set(SEARCH_FILTERS)
+        if unknown:
+            raise ValueError(f"Unknown search filter(s): {', '.join(sorted(unknown))}")
+
+        conditions, params = [], []
+        filenames = filters.get('filename')
+        if filenames is not None:
+            filenames = [filenames] if isinstance(filenames, str) else list(filenames)
+            conditions.append(f"chunks.filename IN ({','.join('?' * len(filenames)) or 'NULL'})")
+            params.extend(filenames)
+
+        date_range = filters.get('upload_date')
+        if date_range is not None:
+            start, end = date_range
+            if start is not None:
+                conditions.append('chunks.upload_date >= ?')
+                params.append(str(start))
+            if end is not None:
+                # A bare date includes the whole day, whose timestamps sort after it
+                end = str(end)
+                conditions.append('chunks.upload_date <= ?' if len(end) > 10 else 'chunks.upload_date < ?')
+                params.append(end if len(end) > 10 else end + '\uffff')
+        return ' AND '.join(conditions), params
+
+    def vector_ids_matching(self, filters):
+        """Distinct vector ids of the chunks matching search filters (see _filter_clause)."""
+        condition, params = self._filter_clause(filters)
+        cursor = self._connection().execute(
+            f'SELECT DISTINCT vector_id FROM chunks WHERE {condition or 1}',
+            params
+        )
+        return [row[0] for row in cursor]
+
+    def keyword_search(self, query, limit=50, filters=None):
+        """
+        BM25 keyword search over chunk text, optionally restricted by search filters.
+        Returns [(vector_id, score)] best first, one entry per vector; higher scores are better.
+        """
+        if not self.keyword_search_available:
+            return []
+
+        terms = []
+        for term in self._QUERY_TERM.findall(query.lower()):
+            if term not in self._STOPWORDS and term not in terms:
+                terms.append(term)
+        if not terms:
+            return []
+        # Each term is a quoted phrase so codes like "inv-2023" match their token sequence
+        match = ' OR '.join(f'"{term}"' for term in terms[:self._MAX_QUERY_TERMS])
+
+        condition, params = self._filter_clause(filters)
+        cursor = self._connection().execute(
+            'SELECT chunks.vector_id, bm25(chunks_fts) AS rank FROM chunks_fts '
+            'JOIN chunks ON chunks.id = chunks_fts.rowid '
+            f"WHERE chunks_fts MATCH ? {'AND ' + condition if condition else ''} ORDER BY rank LIMIT ?",
+            [match] + params + [limit * 2]  # Identical chunks share a vector; leave room for duplicates
+        )
+        results, seen = [], set()
+        for vector_id, rank in cursor:
+            if vector_id not in seen:
+                seen.add(vector_id)
+                results.append((vector_id, -rank))  # FTS5 bm25() is lower-is-better
+                if len(results) == limit:
+                    break
+        return results
+
+    def vector_ids_for_hashes(self, hashes):
+        """Return {content_hash: vector_id} for chunk contents that are already indexed."""
+        hashes = list(hashes)
+        found = {}
+        for start in range(0, len(hashes), self._MAX_PARAMS):
+            batch = hashes[start:start + self._MAX_PARAMS]
+            placeholders = ','.join('?' * len(batch))
+            cursor = self._connection().execute(
+                f'SELECT content_hash, vector_id FROM chunks WHERE content_hash IN ({placeholders})',
+                batch
+            )
+            for chunk_hash, vector_id in cursor:
+                found[chunk_hash] = vector_id
+        return found
+
+    def content_hashes_for_vectors(self, vector_ids):
+        """Return {vector_id: content_hash} for the given live vector ids."""
+        ids = [int(i) for i in vector_ids]
+        found = {}
+        for start in range(0, len(ids), self._MAX_PARAMS):
+            batch = ids[start:start + self._MAX_PARAMS]
+            placeholders = ','.join('?' * len(batch))
+            cursor = self._connection().execute(
+                f'SELECT vector_id, content_hash FROM chunks WHERE vector_id IN ({placeholders})',
+                batch
+            )
+            for vector_id, chunk_hash in cursor:
+                found[vector_id] = chunk_hash
+        return found
+
+    def embedding_rows(self, model_key, hashes):
+        """Return {content_hash: row} for embeddings stored for model_key."""
+        hashes = list(hashes)
+        found = {}
+        for start in range(0, len(hashes), self._MAX_PARAMS):
+            batch = hashes[start:start + self._MAX_PARAMS]
+            placeholders = ','.join('?' * len(batch))
+            cursor = self._connection().execute(
+                f'SELECT content_hash, row FROM embedding_rows WHERE model_key = ? AND content_hash IN ({placeholders})',
+                [model_key] + batch
+            )
+            for chunk_hash, row in cursor:
+                found[chunk_hash] = row
+        return found
+
+    def add_embedding_rows(self, model_key, rows):
+        """Record where embeddings were written. rows is an iterable of (content_hash, row)."""
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                'INSERT OR IGNORE INTO embedding_rows (model_key, content_hash, row) VALUES (?, ?, ?)',
+                [(model_key, chunk_hash, int(row)) for chunk_hash, row in rows]
+            )
+
+    def chunk_rows_for_filename(self, filename):
+        """Row ids (not vector ids) of a document's chunks."""
+        cursor = self._connection().execute('SELECT id FROM chunks WHERE filename = ?', (filename,))
+        return [row[0] for row in cursor]
+
+    def delete_chunks(self, row_ids):
+        """
+        Delete chunk rows and tombstone the vectors no remaining chunk references,
+        atomically. Returns the tombstoned vector ids.
+        """
+        if self.read_only:
+            raise PermissionError("Chunk metadata store is opened read-only")
+
+        row_ids = [int(i) for i in row_ids]
+        orphaned = []
+        conn = self._connection()
+        with conn:
+            candidates = set()
+            for start in range(0, len(row_ids), self._MAX_PARAMS):
+                batch = row_ids[start:start + self._MAX_PARAMS]
+                placeholders = ','.join('?' * len(batch))
+                cursor = conn.execute(f'SELECT vector_id FROM chunks WHERE id IN ({placeholders})', batch)
+                candidates.update(row[0] for row in cursor)
+            conn.executemany('DELETE FROM chunks WHERE id = ?', [(i,) for i in row_ids])
+
+            for vector_id in candidates:
+                if conn.execute('SELECT 1 FROM chunks WHERE vector_id = ? LIMIT 1', (vector_id,)).fetchone() is None:
+                    orphaned.append(vector_id)
+            conn.executemany('INSERT OR IGNORE INTO tombstones (id) VALUES (?)', [(i,) for i in orphaned])
+        self._count = None
+        return orphaned
+
+    def document_hash(self, filename):
+        row = self._connection().execute(
+            'SELECT content_hash FROM documents WHERE filename = ?', (filename,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def set_document_hash(self, filename, document_hash, chunk_count):
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO documents (filename, content_hash, chunk_count) VALUES (?, ?, ?)',
+                (filename, document_hash, chunk_count)
+            )
+
+    def forget_document(self, filename):
+        conn = self._connection()
+        with conn:
+            conn.execute('DELETE FROM documents WHERE filename = ?', (filename,))
+
+    def tombstone_ids(self):
+        return {row[0] for row in self._connection().execute('SELECT id FROM tombstones')}
+
+    def add_tombstones(self, vector_ids):
+        conn = self._connection()
+        with conn:
+            conn.executemany('INSERT OR IGNORE INTO tombstones (id) VALUES (?)', [(int(i),) for i in vector_ids])
+
+    def live_vector_ids(self):
+        """Every vector id referenced by a chunk row."""
+        cursor = self._connection().execute('SELECT DISTINCT vector_id FROM chunks')
+        return [row[0] for row in cursor]
+
+    def clear_tombstones(self, vector_ids):
+        """Forget tombstones whose vectors have been compacted out of the index."""
+        conn = self._connection()
+        with conn:
+            conn.executemany('DELETE FROM tombstones WHERE id = ?', [(int(i),) for i in vector_ids])
+
+    def list_documents(self):
+        """Return [{filename, chunks}] for every document with live chunks."""
+        cursor = self._connection().execute(
+            'SELECT filename, COUNT(*) FROM chunks GROUP BY filename ORDER BY filename'
+        )
+        return [{"filename": filename, "chunks": count} for filename, count in cursor]
+
+    def count(self):
+        """Number of chunk rows (several may share a vector)."""
+        if self._count is None:
+            self._count = self._connection().execute('SELECT COUNT(*) FROM chunks').fetchone()[0]
+        return self._count
+
+    def invalidate(self):
+        """Forget cached values; used by readers after another process wrote to the store."""
+        self._count = None
+
+    def import_pickle(self, pickle_path):
+        """
+        One-off migration from the legacy metadata.pkl list, whose positions are
+        the FAISS vector ids. The pickle is renamed afterwards so it is not re-imported.
+        """
+        with open(pickle_path, 'rb') as f:
+            legacy_metadata = pickle.load(f)
+
+        imported = self.add_chunks(enumerate(legacy_metadata))
+        os.replace(pickle_path, pickle_path + '.migrated')
+        print(f"Imported {imported} chunk metadata records from {pickle_path}")
+        return imported
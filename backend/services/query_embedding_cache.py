@@ -0,0 +1,66 @@
+"""
+Bounded LRU cache of query embeddings.
+
+The same question is typically embedded several times per chat (context
+preparation, then the Vector DB agent) and popular questions recur across
+users, so caching skips the SentenceTransformer forward pass for them.
+"""
+
+import re
+import threading
+from collections import OrderedDict
+
+
+class QueryEmbeddingCache:
+    """Thread-safe LRU map of normalized query text -> embedding vector."""
+
+    _WHITESPACE = re.compile(r'\s+')
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def normalize(cls, query):
+        """Case, surrounding whitespace/punctuation and repeated spaces don't change the key."""
+        return cls._WHITESPACE.sub(' ', query.strip().lower()).strip(' ?!.')
+
+    def get(self, query):
+        key = self.normalize(query)
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return embedding
+
+    def put(self, query, embedding):
+        if self.max_size <= 0:
+            return
+        embedding.setflags(write=False)  # Shared between callers
+        key = self.normalize(query)
+        with self._lock:
+            self._entries[key] = embedding
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
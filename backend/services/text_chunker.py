@@ -0,0 +1,143 @@
+"""
+Streaming, token-aware text chunker for the vector store.
+
+Chunks are built from whole sentences up to the embedding model's token
+budget, with a configurable token overlap between consecutive chunks.
+Input can be a string or any iterable of text segments (e.g. blocks read
+from a file); chunks are yielded as soon as they are complete, and every
+character of input is scanned a bounded number of times.
+"""
+
+import re
+from collections import deque
+
+
+# Words longer than this (URLs, base64, text without spaces such as CJK) are
+# estimated from their characters rather than as one word
+_LONG_WORD_CHARS = 12
+
+
+def approximate_token_count(text):
+    """
+    Rough WordPiece estimate for when no tokenizer is available: ~1.3 tokens per
+    word, and for a long word one token per 4 ASCII characters plus one per
+    other character (CJK characters are a token each).
+    """
+    words = text.split()
+    long_words = [word for word in words if len(word) > _LONG_WORD_CHARS]
+    if not long_words:
+        return (len(words) * 4 + 2) // 3
+
+    long_word_tokens = 0
+    for word in long_words:
+        ascii_chars = len(word.encode('ascii', 'ignore'))
+        long_word_tokens += ascii_chars // 4 + (len(word) - ascii_chars)
+    return ((len(words) - len(long_words)) * 4 + 2) // 3 + long_word_tokens
+
+
+class TextChunker:
+    """Splits text into sentence-aligned chunks of at most max_tokens tokens."""
+
+    # Sentence boundary: whitespace after terminal punctuation, or a blank line
+    _SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+|\n\s*\n')
+
+    def __init__(self, max_tokens=128, overlap_tokens=16, count_tokens=None):
+        if overlap_tokens >= max_tokens:
+            raise ValueError("overlap_tokens must be smaller than max_tokens")
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.count_tokens = count_tokens or approximate_token_count
+        # A run of text with no sentence boundary is force-split past this size so
+        # the pending buffer (and the rescans of it) stay bounded
+        self._max_pending_chars = max_tokens * 16
+
+    def iter_sentences(self, segments):
+        """Yield sentences from an iterable of text segments, joining sentences split across segments."""
+        pending = ''
+        for segment in segments:
+            buffer = pending + segment
+            last_end = 0
+            for match in self._SENTENCE_BOUNDARY.finditer(buffer):
+                sentence = buffer[last_end:match.start()].strip()
+                if sentence:
+                    yield sentence
+                last_end = match.end()
+            while len(buffer) - last_end > self._max_pending_chars:
+                limit = last_end + self._max_pending_chars
+                cut = buffer.rfind(' ', last_end, limit)
+                if cut <= last_end:
+                    cut = limit
+                sentence = buffer[last_end:cut].strip()
+                if sentence:
+                    yield sentence
+                last_end = cut
+            pending = buffer[last_end:]
+
+        if pending.strip():
+            yield pending.strip()
+
+    def _split_long_sentence(self, sentence, tokens):
+        """
+        Break a sentence longer than the token budget into word windows, and a
+        window that is still too long (a long word, or text without spaces) into
+        character windows.
+        """
+        words = sentence.split()
+        words_per_piece = max(1, int(len(words) * self.max_tokens / max(tokens, 1)))
+        for start in range(0, len(words), words_per_piece):
+            piece = ' '.join(words[start:start + words_per_piece])
+            piece_tokens = self.count_tokens(piece)
+            if piece_tokens > self.max_tokens:
+                yield from self._split_by_characters(piece, piece_tokens)
+            else:
+                yield piece, piece_tokens
+
+    def _split_by_characters(self, text, tokens):
+        """Break text into character windows of at most max_tokens tokens each."""
+        pending = [(text, tokens)]
+        while pending:
+            text, tokens = pending.pop()
+            if tokens <= self.max_tokens or len(text) == 1:
+                yield text, tokens
+                continue
+            # Windows sized from the average characters per token; any window the
+            # estimate got wrong is split again
+            chars_per_piece = max(1, min(len(text) // 2, int(len(text) * self.max_tokens / tokens)))
+            pieces = [text[start:start + chars_per_piece] for start in range(0, len(text), chars_per_piece)]
+            pending.extend((piece, self.count_tokens(piece)) for piece in reversed(pieces))
+
+    def iter_chunks(self, text):
+        """
+        Yield chunks from a string or an iterable of text segments.
+
+        Consecutive chunks share up to overlap_tokens tokens of whole trailing
+        sentences, so context isn't lost at chunk boundaries.
+        """
+        segments = (text,) if isinstance(text, str) else text
+
+        window = deque()  # (sentence, token count) of the chunk being built
+        window_tokens = 0
+        has_new_content = False
+
+        for sentence in self.iter_sentences(segments):
+            tokens = self.count_tokens(sentence)
+            if tokens > self.max_tokens:
+                pieces = self._split_long_sentence(sentence, tokens)
+            else:
+                pieces = ((sentence, tokens),)
+
+            for piece, piece_tokens in pieces:
+                if window and window_tokens + piece_tokens > self.max_tokens:
+                    yield ' '.join(part for part, _ in window)
+                    has_new_content = False
+                    # Keep trailing sentences as overlap, as long as the next piece still fits
+                    while window and (window_tokens > self.overlap_tokens
+                                      or window_tokens + piece_tokens > self.max_tokens):
+                        window_tokens -= window.popleft()[1]
+
+                window.append((piece, piece_tokens))
+                window_tokens += piece_tokens
+                has_new_content = True
+
+        if window and has_new_content:
+            yield ' '.join(part for part, _ in window)
@@ -0,0 +1,222 @@
+"""
+FAISS index construction helpers for the vector store.
+
+Supports exact (flat) search plus the approximate nearest-neighbour backends
+IVF-Flat, IVF-PQ and HNSW. All indexes use inner product on normalized
+vectors, i.e. cosine similarity, and are wrapped in an IndexIDMap2 so every
+chunk keeps a stable vector id across deletions and rebuilds.
+"""
+
+import math
+import faiss
+import numpy as np
+from config import Config
+
+INDEX_TYPES = ('flat', 'ivf_flat', 'ivf_pq', 'hnsw')
+
+# Upper bound on the k-means training sample for IVF indexes
+MAX_TRAINING_VECTORS = 200000
+
+# Most a filtered search widens nprobe / efSearch, see filtered_search_params
+FILTERED_SEARCH_MAX_BOOST = 16
+
+
+def base_index(index):
+    """Return the underlying index of an ID-mapped index (or the index itself)."""
+    if isinstance(index, faiss.IndexIDMap):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def index_type_of(index) -> str:
+    """Return the INDEX_TYPES name of an existing FAISS index."""
+    index = base_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return 'hnsw'
+    if isinstance(index, faiss.IndexIVFPQ):
+        return 'ivf_pq'
+    if isinstance(index, faiss.IndexIVFFlat):
+        return 'ivf_flat'
+    return 'flat'
+
+
+def needs_training(index_type: str) -> bool:
+    """IVF indexes need a k-means pass over sample vectors before use."""
+    return index_type in ('ivf_flat', 'ivf_pq')
+
+
+def min_training_vectors(index_type: str) -> int:
+    """
+    Fewest vectors an index type can be trained on: one IVF list needs ~39
+    points, and each PQ sub-quantizer learns 2**nbits centroids.
+    """
+    if index_type == 'ivf_pq':
+        return max(39, 2 ** Config.VECTOR_PQ_NBITS)
+    if index_type == 'ivf_flat':
+        return 39
+    return 0
+
+
+def trainable_type(index_type: str, num_vectors: int) -> str:
+    """index_type, or 'flat' when there are too few vectors to train it."""
+    if num_vectors < min_training_vectors(index_type):
+        return 'flat'
+    return index_type
+
+
+def _nlist_for(num_vectors: int) -> int:
+    """Pick the number of IVF lists: ~4*sqrt(n), capped by config and by the training set size."""
+    nlist = min(Config.VECTOR_IVF_NLIST, int(4 * math.sqrt(max(num_vectors, 1))))
+    # FAISS wants roughly 39 training points per centroid
+    nlist = min(nlist, max(1, num_vectors // 39))
+    return max(1, nlist)
+
+
+def create_index(index_type: str, dimension: int, training_vectors=None):
+    """
+    Create an empty, ID-mapped index of the given type.
+
+    IVF types are trained on training_vectors, which must then be provided.
+    """
+    return faiss.IndexIDMap2(_create_base_index(index_type, dimension, training_vectors))
+
+
+def _create_base_index(index_type: str, dimension: int, training_vectors=None):
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown vector index type '{index_type}'. Expected one of: {', '.join(INDEX_TYPES)}")
+
+    if index_type == 'flat':
+        return faiss.IndexFlatIP(dimension)  # Inner product for cosine similarity
+
+    if index_type == 'hnsw':
+        index = faiss.IndexHNSWFlat(dimension, Config.VECTOR_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = Config.VECTOR_HNSW_EF_CONSTRUCTION
+        configure_search(index)
+        return index
+
+    if training_vectors is None or len(training_vectors) < min_training_vectors(index_type):
+        raise ValueError(
+            f"Index type '{index_type}' requires at least {min_training_vectors(index_type)} training vectors"
+        )
+
+    training_vectors = np.ascontiguousarray(training_vectors, dtype='float32')
+    if len(training_vectors) > MAX_TRAINING_VECTORS:
+        sample = np.random.default_rng(0).choice(len(training_vectors), MAX_TRAINING_VECTORS, replace=False)
+        training_vectors = training_vectors[sample]
+    nlist = _nlist_for(len(training_vectors))
+    quantizer = faiss.IndexFlatIP(dimension)
+
+    if index_type == 'ivf_flat':
+        index = faiss.IndexIVFFlat(quantizer, dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+    else:
+        if dimension % Config.VECTOR_PQ_M != 0:
+            raise ValueError(f"VECTOR_PQ_M ({Config.VECTOR_PQ_M}) must divide the embedding dimension ({dimension})")
+        index = faiss.IndexIVFPQ(quantizer, dimension, nlist, Config.VECTOR_PQ_M,
+                                 Config.VECTOR_PQ_NBITS, faiss.METRIC_INNER_PRODUCT)
+
+    print(f"Training {index_type} index with {nlist} lists on {len(training_vectors)} vectors...")
+    index.train(training_vectors)
+    configure_search(index)
+    return index
+
+
+def with_ids(index):
+    """
+    Convert a legacy positional index into an IndexIDMap2 whose ids are the old
+    positions, which is what the metadata store was keyed by.
+    """
+    if isinstance(index, faiss.IndexIDMap):
+        return index
+    if isinstance(index, faiss.IndexIVF):
+        index.make_direct_map()
+    vectors = index.reconstruct_n(0, index.ntotal) if index.ntotal else None
+
+    # IndexIDMap2 only wraps an empty index; reuse the trained structure and re-add
+    empty = faiss.clone_index(index)
+    empty.reset()
+    id_map = faiss.IndexIDMap2(empty)
+    if vectors is not None:
+        id_map.add_with_ids(vectors, np.arange(len(vectors), dtype='int64'))
+    return id_map
+
+
+def configure_search(index):
+    """
+    Apply the query-time knobs (nprobe / efSearch) from Config to an index. IVF
+    indexes also get their id -> position map now, so reconstructing vectors
+    later (filtered searches, rebuilds) never changes an index being searched.
+    """
+    inner = base_index(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        inner.hnsw.efSearch = Config.VECTOR_HNSW_EF_SEARCH
+    elif isinstance(inner, faiss.IndexIVF):
+        inner.nprobe = min(Config.VECTOR_IVF_NPROBE, inner.nlist)
+        if inner.direct_map.type == faiss.DirectMap.NoMap:
+            inner.make_direct_map()
+    return index
+
+
+def extract_vectors(index, start: int = 0):
+    """
+    Reconstruct (ids, vectors) stored at positions [start, ntotal) of an ID-mapped
+    index. Lossy for IVF-PQ.
+    """
+    inner = base_index(index)
+    ids = faiss.vector_to_array(index.id_map)[start:]
+    count = inner.ntotal - start
+    if count <= 0:
+        return ids, np.zeros((0, inner.d), dtype='float32')
+    if isinstance(inner, faiss.IndexIVF):
+        inner.make_direct_map()
+    return ids, inner.reconstruct_n(start, count)
+
+
+def reconstruct_vectors(index, ids):
+    """Reconstruct the stored vectors for the given ids of an ID-mapped index."""
+    inner = base_index(index)
+    if isinstance(inner, faiss.IndexIVF) and inner.direct_map.type == faiss.DirectMap.NoMap:
+        inner.make_direct_map()
+    if len(ids) == 0:
+        return np.zeros((0, inner.d), dtype='float32')
+    return index.reconstruct_batch(np.ascontiguousarray(ids, dtype='int64'))
+
+
+def filtered_search_params(index, ids, exclude=False):
+    """
+    SearchParameters that restrict a search to the given vector ids, or with
+    exclude to every id but those. The selector is evaluated inside FAISS as
+    candidates are scanned; building it costs O(len(ids)) per search.
+
+    An approximate index only scans part of the collection, and most of what
+    it scans is filtered out when few ids are allowed, so a restricting search
+    scans proportionally more: nprobe / efSearch are scaled by the share of
+    the index that is filtered out (at most FILTERED_SEARCH_MAX_BOOST times).
+    Small id sets are better scored exactly, see VectorShard.search.
+    """
+    ids = np.ascontiguousarray(ids, dtype='int64')
+    batch = faiss.IDSelectorBatch(len(ids), faiss.swig_ptr(ids))
+    selector = faiss.IDSelectorNot(batch) if exclude else batch
+
+    boost = 1
+    if not exclude and len(ids):
+        boost = min(FILTERED_SEARCH_MAX_BOOST, max(1, math.ceil(index.ntotal / len(ids))))
+
+    inner = base_index(index)
+    if isinstance(inner, faiss.IndexIVF):
+        params = faiss.SearchParametersIVF(sel=selector, nprobe=min(inner.nlist, inner.nprobe * boost))
+    elif isinstance(inner, faiss.IndexHNSW):
+        params = faiss.SearchParametersHNSW(sel=selector, efSearch=inner.hnsw.efSearch * boost)
+    else:
+        params = faiss.SearchParameters(sel=selector)
+    params.referenced_objects = [ids, batch, selector]  # The SWIG objects don't own these
+    return params
+
+
+def should_migrate(index) -> bool:
+    """True when a flat index has grown past the threshold for the configured ANN type."""
+    target = Config.VECTOR_INDEX_TYPE
+    return (
+        target != 'flat'
+        and index_type_of(index) == 'flat'
+        and index.ntotal >= max(Config.VECTOR_ANN_MIGRATION_THRESHOLD, min_training_vectors(target))
+    )
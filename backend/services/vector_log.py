@@ -0,0 +1,193 @@
+"""
+Append-only write-ahead log for vector index updates.
+
+Each upload appends its new vectors here instead of rewriting the whole FAISS
+file; on startup the log is replayed on top of the latest index snapshot,
+and read-only processes tail it to see the writes made since that snapshot.
+The log is split into segments so a snapshot can drop the segments it covers
+while new writes go to a fresh one.
+
+Record layout (little endian):
+    header  magic(4s) op(B) seq(Q) count(I) dim(I)
+    payload ids int64[count], vectors float32[count * dim]
+    trailer crc32 of header + payload (I)
+
+Only one process should write to a log directory at a time.
+"""
+
+import glob
+import os
+import struct
+import zlib
+import numpy as np
+
+OP_ADD = 1
+
+
+class VectorWriteLog:
+    """Segmented, checksummed append-only log of index operations."""
+
+    MAGIC = b'VLOG'
+    HEADER = struct.Struct('<4sBQII')
+    TRAILER = struct.Struct('<I')
+
+    def __init__(self, log_dir):
+        self.log_dir = log_dir
+        os.makedirs(log_dir, exist_ok=True)
+
+        self.last_seq = 0
+        self._segments = {}  # segment path -> last sequence number written to it
+        self._file = None
+        self._current_path = None
+
+    def _segment_paths(self):
+        return sorted(glob.glob(os.path.join(self.log_dir, 'segment-*.log')))
+
+    def replay(self, after_seq=0):
+        """
+        Yield (op, seq, ids, vectors) for every record with seq > after_seq.
+
+        A torn or corrupt record (e.g. from a crash mid-write) ends the log: the
+        segment is truncated there and nothing after it is replayed. The generator
+        must be consumed fully so the log knows its last sequence number.
+        """
+        self.close()
+        self._segments = {}
+        # Sequence numbers continue from the snapshot even once its segments are purged
+        self.last_seq = after_seq
+
+        for path in self._segment_paths():
+            segment_last_seq, good_offset, corrupt = 0, 0, False
+
+            with open(path, 'rb') as f:
+                while True:
+                    record = self._read_record(f)
+                    if record is None:
+                        break
+                    if record is False:
+                        corrupt = True
+                        break
+
+                    op, seq, ids, vectors = record
+                    good_offset = f.tell()
+                    segment_last_seq = seq
+                    self.last_seq = max(self.last_seq, seq)
+
+                    if seq > after_seq:
+                        yield record
+
+            self._segments[path] = segment_last_seq
+
+            if corrupt:
+                print(f"Vector log: truncating corrupt tail of {os.path.basename(path)} at byte {good_offset}")
+                with open(path, 'r+b') as f:
+                    f.truncate(good_offset)
+                # Anything after a torn record can't be trusted to be in order
+                for later_path in self._segment_paths():
+                    if later_path > path:
+                        os.remove(later_path)
+                break
+
+    def tail(self, after_seq, offsets):
+        """
+        Reader side of replay(): yield (op, seq, ids, vectors) for the records with
+        seq > after_seq that were appended since the last call, and never modify the log.
+
+        offsets maps segment path -> byte offset read up to, and is advanced as
+        records are yielded; pass the same dict on each call. An incomplete
+        record is left for the next call (the writer may still be writing it).
+        A segment purged by a snapshot is skipped; the caller reloads that snapshot.
+        """
+        for path in self._segment_paths():
+            try:
+                f = open(path, 'rb')
+            except FileNotFoundError:
+                continue
+            with f:
+                f.seek(offsets.get(path, 0))
+                while True:
+                    record = self._read_record(f)
+                    if not record:
+                        break
+                    offsets[path] = f.tell()
+                    if record[1] > after_seq:
+                        yield record
+            if record is False:
+                # Nothing after a torn record is in order until the writer truncates it
+                return
+
+    def _read_record(self, f):
+        """Read the record at f's position: (op, seq, ids, vectors), None at the end of the file, False if torn or corrupt."""
+        header = f.read(self.HEADER.size)
+        if not header:
+            return None
+        if len(header) < self.HEADER.size:
+            return False
+
+        magic, op, seq, count, dim = self.HEADER.unpack(header)
+        payload = f.read(count * 8 + count * dim * 4)
+        trailer = f.read(self.TRAILER.size)
+        if (magic != self.MAGIC
+                or len(payload) < count * 8 + count * dim * 4
+                or len(trailer) < self.TRAILER.size
+                or self.TRAILER.unpack(trailer)[0] != zlib.crc32(header + payload)):
+            return False
+
+        ids = np.frombuffer(payload, dtype='int64', count=count)
+        vectors = np.frombuffer(payload, dtype='float32', offset=count * 8).reshape(count, dim)
+        return op, seq, ids, vectors
+
+    def append(self, op, ids, vectors=None):
+        """Durably append one record and return its sequence number."""
+        ids = np.ascontiguousarray(ids, dtype='int64')
+        if vectors is None:
+            vectors = np.zeros((len(ids), 0), dtype='float32')
+        vectors = np.ascontiguousarray(vectors, dtype='float32')
+
+        seq = self.last_seq + 1
+        if self._file is None:
+            self._current_path = os.path.join(self.log_dir, f'segment-{seq:016d}.log')
+            self._file = open(self._current_path, 'ab')
+
+        header = self.HEADER.pack(self.MAGIC, op, seq, len(ids), vectors.shape[1])
+        payload = ids.tobytes() + vectors.tobytes()
+        self._file.write(header + payload + self.TRAILER.pack(zlib.crc32(header + payload)))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+        self.last_seq = seq
+        self._segments[self._current_path] = seq
+        return seq
+
+    def rotate(self):
+        """Close the current segment so later writes start a new one; returns the last seq."""
+        self.close()
+        return self.last_seq
+
+    def purge(self, upto_seq):
+        """Delete closed segments whose records are all covered by a snapshot at upto_seq."""
+        for path, segment_last_seq in list(self._segments.items()):
+            if path != self._current_path and segment_last_seq <= upto_seq:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                del self._segments[path]
+
+    def size_bytes(self, after_seq=0):
+        """Size of the segments holding records after after_seq (all of them by default)."""
+        total = 0
+        for path, segment_last_seq in self._segments.items():
+            if segment_last_seq <= after_seq:
+                continue
+            try:
+                total += os.path.getsize(path)
+            except FileNotFoundError:
+                pass
+        return total
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._current_path = None
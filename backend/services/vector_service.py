@@ -1,27 +1,78 @@
-import faiss
+import hashlib
+import heapq
+import itertools
 import numpy as np
-import pickle
 import os
-from sentence_transformers import SentenceTransformer
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 from config import Config
+from services.embedding_backends import load_embedding_model
+from services.embedding_pool import EmbeddingPool
+from services.embedding_store import EmbeddingStore
+from services.metadata_store import SEARCH_FILTERS, ChunkMetadataStore, content_hash as chunk_content_hash
+from services.query_embedding_cache import QueryEmbeddingCache
+from services.text_chunker import TextChunker
+from services.vector_index import index_type_of, should_migrate
+from services.vector_shard import VectorShard
+
+SEARCH_MODES = ('vector', 'keyword', 'hybrid')
 
 class VectorService:
     # Class-level model instance to avoid re-downloading
     _shared_model = None
     _model_initialized = False
     _model_available = False
+    # Worker processes for bulk embedding (Config.EMBEDDING_POOL_WORKERS), started on first use
+    _embedding_pool = None
+    _embedding_pool_failed = False
+    _embedding_pool_lock = threading.Lock()
 
     def __init__(self):
         self.dimension = 384  # Dimension of all-MiniLM-L6-v2
-        self.index_path = os.path.join(Config.VECTOR_DB_PATH, 'faiss_index')
-        self.metadata_path = os.path.join(Config.VECTOR_DB_PATH, 'metadata.pkl')
+        self.shards_path = os.path.join(Config.VECTOR_DB_PATH, 'shards')
+        self.metadata_db_path = os.path.join(Config.VECTOR_DB_PATH, 'metadata.db')
+        self.legacy_metadata_path = os.path.join(Config.VECTOR_DB_PATH, 'metadata.pkl')
+
+        # Guards the tombstone set and id allocation; each shard has its own index lock.
+        # The instance is shared across request threads (see get_vector_service)
+        self._lock = threading.RLock()
+        self._compaction_lock = threading.Lock()
+
+        # Read-only workers serve memory-mapped snapshots written by a single writer process
+        self.read_only = Config.VECTOR_READ_ONLY
+        self._last_refresh_check = time.monotonic()
 
         # Create directory if it doesn't exist
         os.makedirs(Config.VECTOR_DB_PATH, exist_ok=True)
 
-        # Initialize or load index
-        self.index = self._load_or_create_index()
-        self.metadata = self._load_metadata()
+        # Chunk metadata stays on disk and is read per hit
+        self.metadata_store = self._open_metadata_store()
+
+        # Vectors are partitioned into shards by document, each with its own index,
+        # write-ahead log and snapshots. Deleted chunks stay in the indexes as
+        # tombstones (filtered out of results) until their shard is compacted.
+        self.shards = self._open_shards()
+        self._id_floor = max(shard.next_id for shard in self.shards)
+        self._tombstones = self.metadata_store.tombstone_ids()
+        self._tombstone_ids = None  # Array form of _tombstones for search, rebuilt when it changes
+        if not self.read_only:
+            self._tombstone_log_orphans()
+
+        # Searches fan out over the shards on this pool
+        self._search_executor = None
+        if len(self.shards) > 1:
+            self._search_executor = ThreadPoolExecutor(
+                max_workers=Config.VECTOR_SEARCH_THREADS or len(self.shards),
+                thread_name_prefix='vector-search'
+            )
+
+        # Legacy single-file indexes are converted to ID-mapped ones on load; persist that once
+        if not self.read_only:
+            for shard in self.shards:
+                if shard.ntotal and not os.path.exists(shard.manifest_path):
+                    shard.snapshot()
 
         # Use shared model instance
         if not VectorService._model_initialized:
@@ -29,138 +80,897 @@ class VectorService:
 
         self.model = VectorService._shared_model
         self.model_available = VectorService._model_available
+        self.query_cache = QueryEmbeddingCache(Config.QUERY_EMBEDDING_CACHE_SIZE)
+        self.chunker = self._create_chunker()
+
+        # Every chunk embedding is kept on disk so rebuilds never need the model
+        self.embedding_store = None
+        if Config.EMBEDDING_STORE_ENABLED and self.model_available:
+            self.embedding_store = EmbeddingStore(
+                os.path.join(Config.VECTOR_DB_PATH, 'embeddings'),
+                getattr(self.model, 'model_key', Config.EMBEDDING_MODEL_NAME),
+                self.dimension,
+                self.metadata_store
+            )
+
+        # An existing flat index may already be past the ANN threshold
+        if not self.read_only:
+            self._maybe_migrate_index()
 
     def _init_model(self):
         try:
-            print("Initializing SentenceTransformer model (this may take a few minutes on first run)...")
+            print(f"Initializing {Config.EMBEDDING_MODEL_NAME} embedding model ({Config.EMBEDDING_BACKEND} backend, this may take a few minutes on first run)...")
             # Set a longer timeout for model download
             import socket
             original_timeout = socket.getdefaulttimeout()
             socket.setdefaulttimeout(300)  # 5 minutes timeout for model download
 
-            VectorService._shared_model = SentenceTransformer('all-MiniLM-L6-v2')
+            VectorService._shared_model = load_embedding_model()
             VectorService._model_available = True
             VectorService._model_initialized = True
 
             # Restore original timeout
             socket.setdefaulttimeout(original_timeout)
 
-            print("SentenceTransformer model initialized successfully")
+            print(f"Embedding model initialized successfully ({VectorService._shared_model.model_key})")
         except Exception as e:
-            print(f"Warning: Could not initialize SentenceTransformer model: {e}")
+            print(f"Warning: Could not initialize embedding model: {e}")
             print("Vector search will not be available")
             VectorService._model_available = False
             VectorService._model_initialized = True  # Mark as initialized even if failed
 
-    def _load_or_create_index(self):
-        if os.path.exists(self.index_path):
-            return faiss.read_index(self.index_path)
-        else:
-            # Create new FAISS index
-            index = faiss.IndexFlatIP(self.dimension)  # Inner product for cosine similarity
-            return index
-
-    def _load_metadata(self):
-        if os.path.exists(self.metadata_path):
-            with open(self.metadata_path, 'rb') as f:
-                return pickle.load(f)
-        else:
-            return []
+    def _create_chunker(self):
+        """Chunk by the model's own token counts so no chunk is truncated at encode time."""
+        max_tokens = Config.CHUNK_MAX_TOKENS
+        count_tokens = None
+        if self.model_available:
+            # Leave room for the [CLS]/[SEP] tokens the model adds
+            max_seq_length = getattr(self.model, 'max_seq_length', None)
+            if max_seq_length:
+                max_tokens = min(max_tokens, max_seq_length - 2)
+            tokenizer = getattr(self.model, 'tokenizer', None)
+            if tokenizer is not None:
+                count_tokens = lambda text: len(tokenizer.tokenize(text))
+        overlap_tokens = min(Config.CHUNK_OVERLAP_TOKENS, max_tokens // 2)
+        return TextChunker(max_tokens, overlap_tokens, count_tokens)
+
+    def _open_shards(self):
+        """
+        Open every shard. Shard 0 lives in VECTOR_DB_PATH itself, so a store from
+        before sharding opens as shard 0; the others live in VECTOR_DB_PATH/shards/<n>.
+        Shards left over from a larger VECTOR_SHARDS setting are still opened and
+        searched, but only the first VECTOR_SHARDS receive new documents.
+        """
+        existing = []
+        if os.path.isdir(self.shards_path):
+            existing = [int(name) for name in os.listdir(self.shards_path) if name.isdigit()]
+        shard_count = max([1, Config.VECTOR_SHARDS] + [shard_id + 1 for shard_id in existing])
+
+        return [
+            VectorShard(
+                shard_id,
+                Config.VECTOR_DB_PATH if shard_id == 0 else os.path.join(self.shards_path, str(shard_id)),
+                self.dimension,
+                read_only=self.read_only
+            )
+            for shard_id in range(shard_count)
+        ]
+
+    def _get_shard(self, shard_id):
+        if not isinstance(shard_id, int) or not 0 <= shard_id < len(self.shards):
+            raise ValueError(f"Unknown vector shard {shard_id!r}. Expected 0 to {len(self.shards) - 1}")
+        return self.shards[shard_id]
+
+    def _shard_for(self, filename):
+        """The shard a document's new vectors go to: a stable hash of its filename."""
+        writable = max(1, min(Config.VECTOR_SHARDS, len(self.shards)))
+        return self.shards[zlib.crc32((filename or '').encode('utf-8')) % writable]
+
+    def _allocate_ids(self, count):
+        """Reserve count stable vector ids (call with the lock held)."""
+        first_id = self.metadata_store.allocate_ids(count, floor=self._id_floor)
+        self._id_floor = first_id + count
+        return np.arange(first_id, first_id + count, dtype='int64')
+
+    def snapshot(self, force=False):
+        """Snapshot every shard (see VectorShard.snapshot). Returns True if any was written."""
+        written = [shard.snapshot(force) for shard in self.shards]
+        return any(written)
+
+    def _refresh_if_stale(self):
+        """
+        Readers: reload when the writer has published a new snapshot, and otherwise
+        pick up what it has logged since (checked every few seconds).
+        """
+        if not self.read_only:
+            return False
 
-    def _save_index(self):
-        faiss.write_index(self.index, self.index_path)
+        now = time.monotonic()
+        if now - self._last_refresh_check < Config.VECTOR_REFRESH_INTERVAL:
+            return False
+        self._last_refresh_check = now
+
+        # Only the shards with a new version are reloaded; each swaps in when ready
+        changed = False
+        for shard in self.shards:
+            if shard.is_stale():
+                shard.reload()
+                changed = True
+            elif shard.refresh_tail():
+                changed = True
+        if not changed:
+            return False
 
-    def _save_metadata(self):
-        with open(self.metadata_path, 'wb') as f:
-            pickle.dump(self.metadata, f)
+        with self._lock:
+            self._tombstones = self.metadata_store.tombstone_ids()
+            self._tombstone_ids = None
+        self.metadata_store.invalidate()
+        return True
+
+    def _maybe_migrate_index(self, shards=None):
+        """
+        Migrate flat shards to the configured ANN type once they pass
+        Config.VECTOR_ANN_MIGRATION_THRESHOLD.
+        """
+        migrated = False
+        for shard in shards or self.shards:
+            if should_migrate(shard.index):
+                migrated = self._rebuild_shard(shard, Config.VECTOR_INDEX_TYPE) or migrated
+        return migrated
+
+    def _target_type(self, shard):
+        return Config.VECTOR_INDEX_TYPE if should_migrate(shard.index) else index_type_of(shard.index)
+
+    def compact(self, shard=None):
+        """Rebuild every shard (or only the given shard number) without tombstoned vectors."""
+        shards = self.shards if shard is None else [self._get_shard(shard)]
+        results = [self._rebuild_shard(target, self._target_type(target)) for target in shards]
+        return all(results)
+
+    def _shard_needs_compaction(self, shard):
+        with self._lock:
+            tombstones = set(self._tombstones)
+        if not tombstones:
+            return False
+        held = shard.count_ids(tombstones)
+        return held >= max(Config.VECTOR_COMPACTION_MIN_TOMBSTONES, Config.VECTOR_COMPACTION_RATIO * shard.ntotal)
+
+    def _maybe_schedule_compaction(self):
+        """Compact, in the background, the shards where tombstones make up enough of the index."""
+        with self._lock:
+            tombstones = len(self._tombstones)
+        if tombstones < Config.VECTOR_COMPACTION_MIN_TOMBSTONES:
+            return False
+        if self._compaction_lock.locked():
+            return False
+
+        def compact():
+            with self._compaction_lock:
+                try:
+                    for shard in self.shards:
+                        if not shard.rebuilding and self._shard_needs_compaction(shard):
+                            self._rebuild_shard(shard, self._target_type(shard))
+                except Exception as e:
+                    print(f"Error compacting vector index: {e}")
+
+        threading.Thread(target=compact, name='vector-index-compaction', daemon=True).start()
+        return True
+
+    def reindex_all(self, index_type=None, shard=None):
+        """
+        Re-embed every live chunk from its stored text and rebuild the index, e.g.
+        after switching embedding models. Uses the embedding pool when enabled.
+        shard limits this to one shard number.
+        """
+        if not self.model_available:
+            return False
+        shards = self.shards if shard is None else [self._get_shard(shard)]
+        results = [
+            self._rebuild_shard(target, index_type or self._target_type(target), reembed=True)
+            for target in shards
+        ]
+        return all(results)
+
+    def _reembed_vectors(self, ids, vectors):
+        """
+        Replace vectors with the current model's embeddings of their chunks' stored
+        text, taken from the embedding store where it already has them.
+        """
+        window = Config.EMBEDDING_BATCH_SIZE * max(1, Config.EMBEDDING_POOL_WORKERS)
+        vectors = vectors.copy()
+        encoded = 0
+        for start in range(0, len(ids), window):
+            window_ids = ids[start:start + window]
+            metadata_by_id = self.metadata_store.get_many(window_ids)
+            # Chunks deleted since the extraction keep their old vector; they are tombstoned anyway
+            positions = [start + i for i, vector_id in enumerate(window_ids) if int(vector_id) in metadata_by_id]
+            if positions:
+                texts = [metadata_by_id[int(ids[p])]['content'] for p in positions]
+                hashes = [chunk_content_hash(text) for text in texts]
+                vectors[positions], window_encoded = self._embed_chunks(texts, hashes, use_pool=True)
+                encoded += window_encoded
+        print(f"Re-embedding ran the model on {encoded} of {len(ids)} chunks")
+        return vectors
+
+    def _stored_vectors(self, ids, vectors, lossless):
+        """
+        Replace extracted vectors with their exact copies from the embedding store.
+        Vectors it doesn't have yet are added to it when the source index is lossless.
+        """
+        vectors = vectors.copy()
+        window = 10000
+        for start in range(0, len(ids), window):
+            window_ids = ids[start:start + window]
+            hashes = self.metadata_store.content_hashes_for_vectors(window_ids)
+            stored = self.embedding_store.get_many(hashes.values())
+
+            missing_hashes, missing_positions = [], []
+            for offset, vector_id in enumerate(window_ids):
+                chunk_hash = hashes.get(int(vector_id))
+                if chunk_hash in stored:
+                    vectors[start + offset] = stored[chunk_hash]
+                elif chunk_hash is not None:
+                    missing_hashes.append(chunk_hash)
+                    missing_positions.append(start + offset)
+
+            if lossless and missing_hashes:
+                self.embedding_store.put_many(missing_hashes, vectors[missing_positions])
+        return vectors
+
+    def rollback(self, shard=None):
+        """
+        Return shards (all, or the given shard number) to their previous snapshot
+        version, e.g. after a bad rebuild or reindex. Documents added since that
+        version stay indexed. Returns True if every shard had a version to go back to.
+        """
+        if self.read_only:
+            raise PermissionError("Vector store is read-only in this process (VECTOR_READ_ONLY)")
+
+        shards = self.shards if shard is None else [self._get_shard(shard)]
+        results = []
+        for target in shards:
+            rolled_back = target.rollback()
+            if rolled_back:
+                # Vectors compacted out after that version are back; tombstone them again
+                ids = target.vector_ids()
+                live = np.asarray(self.metadata_store.live_vector_ids(), dtype='int64')
+                orphaned = ids[~np.isin(ids, live)].tolist()
+                self.metadata_store.add_tombstones(orphaned)
+                with self._lock:
+                    self._tombstones.update(orphaned)
+                    self._tombstone_ids = None
+                    self._id_floor = max(self._id_floor, target.next_id)
+            results.append(rolled_back)
+        return all(results)
+
+    def _rebuild_shard(self, shard, target_type, reembed=False):
+        """
+        Rebuild one shard as target_type from its live (non-tombstoned) vectors and
+        swap it in. Used for ANN migration, tombstone compaction and, with
+        reembed=True, re-embedding the whole store. Searches, and writes to the
+        other shards, continue during the rebuild.
+        """
+        if self.read_only:
+            return False
 
-    def add_document(self, content, metadata):
         try:
-            if not self.model_available:
-                print("Model not available, cannot add document")
+            with self._lock:
+                tombstones = set(self._tombstones)
+
+            transform = None
+            if reembed:
+                transform = lambda ids, vectors, source: self._reembed_vectors(ids, vectors)
+            elif self.embedding_store is not None:
+                # Exact vectors from disk; IVF-PQ reconstructions are lossy
+                transform = lambda ids, vectors, source: self._stored_vectors(
+                    ids, vectors, lossless=index_type_of(source) != 'ivf_pq'
+                )
+
+            start_time = time.perf_counter()
+            dropped = shard.rebuild(target_type, tombstones, transform)
+            if dropped is None:
                 return False
 
-            # Split content into chunks (simple sentence splitting)
-            chunks = self._chunk_text(content)
-
-            for i, chunk in enumerate(chunks):
-                # Generate embedding
-                embedding = self.model.encode([chunk])
-                embedding = embedding / np.linalg.norm(embedding)  # Normalize for cosine similarity
-
-                # Add to index
-                self.index.add(embedding.astype('float32'))
-
-                # Store metadata
-                chunk_metadata = metadata.copy()
-                chunk_metadata.update({
-                    'content': chunk,
-                    'chunk_id': i
-                })
-                self.metadata.append(chunk_metadata)
-
-            # Save index and metadata
-            self._save_index()
-            self._save_metadata()
+            with self._lock:
+                # Tombstones added during the rebuild still point into the new index
+                self._tombstones -= dropped
+                self._tombstone_ids = None
+            # The shard's new snapshot no longer holds them
+            self.metadata_store.clear_tombstones(dropped)
 
+            print(f"Shard {shard.shard_id} rebuilt as {index_type_of(shard.index)} in {time.perf_counter() - start_time:.1f}s")
             return True
 
         except Exception as e:
-            print(f"Error adding document: {e}")
+            print(f"Error rebuilding vector shard {shard.shard_id}: {e}")
             return False
 
-    def search(self, query, top_k=5):
+    def _open_metadata_store(self):
+        store = ChunkMetadataStore(
+            self.metadata_db_path,
+            read_only=self.read_only,
+            mmap_size=Config.VECTOR_METADATA_MMAP_BYTES
+        )
+        if not self.read_only and os.path.exists(self.legacy_metadata_path) and store.count() == 0:
+            store.import_pickle(self.legacy_metadata_path)
+        return store
+
+    @classmethod
+    def _get_embedding_pool(cls):
+        """The shared embedding worker pool, or None if disabled or it can't be started."""
+        if Config.EMBEDDING_POOL_WORKERS <= 1 or cls._embedding_pool_failed:
+            return None
+        if cls._embedding_pool is None:
+            with cls._embedding_pool_lock:
+                if cls._embedding_pool is None:
+                    try:
+                        cls._embedding_pool = EmbeddingPool(Config.EMBEDDING_POOL_WORKERS)
+                    except Exception as e:
+                        print(f"Warning: Could not start embedding pool ({e}), embedding in-process")
+                        cls._embedding_pool_failed = True
+                        return None
+        return cls._embedding_pool
+
+    def _encode(self, texts, batch_size=None, use_pool=False):
+        """
+        Encode texts into L2-normalized float32 embeddings. With use_pool, inputs of
+        more than one batch are spread over the embedding worker processes.
+        """
+        batch_size = batch_size or Config.EMBEDDING_BATCH_SIZE
+        model = self.model
+        if use_pool and len(texts) > batch_size:
+            model = self._get_embedding_pool() or self.model
+
+        try:
+            embeddings = model.encode(texts, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False)
+        except Exception as e:
+            if model is self.model:
+                raise
+            print(f"Embedding pool failed ({e}), embedding in-process")
+            embeddings = self.model.encode(texts, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False)
+
+        embeddings = embeddings.astype('float32')
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return embeddings / norms  # Normalize for cosine similarity
+
+    def _embed_chunks(self, texts, hashes, batch_size=None, use_pool=False):
+        """
+        Embed chunk texts, reading embeddings from the embedding store where possible;
+        the rest go through the model and are stored. Returns (embeddings, encoded count).
+        """
+        stored = self.embedding_store.get_many(hashes) if self.embedding_store is not None else {}
+        embeddings = np.empty((len(texts), self.dimension), dtype='float32')
+        missing = []
+        for position, chunk_hash in enumerate(hashes):
+            if chunk_hash in stored:
+                embeddings[position] = stored[chunk_hash]
+            else:
+                missing.append(position)
+
+        if missing:
+            encoded = self._encode([texts[p] for p in missing], batch_size, use_pool)
+            embeddings[missing] = encoded
+            if self.embedding_store is not None:
+                self.embedding_store.put_many([hashes[p] for p in missing], encoded)
+        return embeddings, len(missing)
+
+    def _embed_queries(self, queries):
+        """Embed search queries, encoding only the ones not already in the query cache."""
+        embeddings = [self.query_cache.get(query) for query in queries]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            encoded = self._encode([queries[i] for i in missing])
+            for i, embedding in zip(missing, encoded):
+                embeddings[i] = embedding.copy()
+                self.query_cache.put(queries[i], embeddings[i])
+        return np.vstack(embeddings)
+
+    def add_document(self, content, metadata, batch_size=None, replace=False, content_hash=None, use_pool=None):
+        """
+        Chunk, embed and index a document.
+
+        content is a string or an iterable of text blocks (e.g. read from a file);
+        blocks are chunked, embedded and committed batch by batch, so memory use
+        doesn't grow with the document size.
+
+        Chunks whose text is already indexed reuse the existing vector instead of
+        being embedded again. With replace=True any existing chunks with the same
+        filename are deleted once the new ones are indexed, and a document whose
+        content hash matches the indexed version is skipped entirely. For
+        streamed content pass content_hash (see hash_text) to enable that skip.
+
+        New vectors go to the document's shard (see _shard_for); reused ones stay
+        in whichever shard already holds them.
+
+        With the embedding pool enabled (Config.EMBEDDING_POOL_WORKERS > 1, or
+        use_pool=True) one batch per worker is read and embedded in parallel,
+        then inserted in a single pass.
+
+        If indexing fails part-way (e.g. streamed content that can't be decoded),
+        the chunks this call already stored under the filename are removed again
+        and any previous version is kept.
+
+        Returns a dict with "success" and, on success, ingestion stats
+        (new vs. deduplicated chunk counts and chunks/sec throughput).
+        """
+        rows_before = None
         try:
             if not self.model_available:
-                return []
+                print("Model not available, cannot add document")
+                return {"success": False, "message": "Embedding model not available"}
+
+            if self.read_only:
+                print("Vector store is read-only in this process, cannot add document")
+                return {"success": False, "message": "Vector store is read-only in this process (VECTOR_READ_ONLY)"}
+
+            batch_size = batch_size or Config.EMBEDDING_BATCH_SIZE
+            if use_pool is None:
+                use_pool = Config.EMBEDDING_POOL_WORKERS > 1
+            window_size = batch_size * max(1, Config.EMBEDDING_POOL_WORKERS) if use_pool else batch_size
+            start_time = time.perf_counter()
+            filename = metadata.get('filename')
+            shard = self._shard_for(filename)
+
+            document_hasher = None
+            if isinstance(content, str):
+                content_hash = content_hash or chunk_content_hash(content)
+            elif content_hash is None:
+                # Hash streamed content on the way through so the next upload can be skipped
+                document_hasher = hashlib.sha256()
+                content = self._hash_blocks(content, document_hasher)
+
+            previous_rows = []
+            if replace and filename:
+                if content_hash and self.metadata_store.document_hash(filename) == content_hash:
+                    chunk_count = len(self.metadata_store.chunk_rows_for_filename(filename))
+                    if chunk_count:
+                        print(f"{filename} is unchanged since it was last indexed, skipping")
+                        return {
+                            "success": True,
+                            "skipped": True,
+                            "chunks_indexed": chunk_count,
+                            "chunks_new": 0,
+                            "chunks_deduplicated": chunk_count,
+                            "chunks_embedded": 0,
+                            "chunks_replaced": 0,
+                            "elapsed_seconds": round(time.perf_counter() - start_time, 3),
+                            "chunks_per_second": 0.0
+                        }
+                previous_rows = self.metadata_store.chunk_rows_for_filename(filename)
+            if filename:
+                rows_before = set(previous_rows if replace else self.metadata_store.chunk_rows_for_filename(filename))
+
+            # Chunks are produced lazily and embedded one batch at a time
+            chunks = self.chunker.iter_chunks(content)
+            chunk_count = 0
+            new_count = 0
+            embedded_count = 0  # Chunks that needed the model rather than the embedding store
+
+            while True:
+                batch = list(itertools.islice(chunks, window_size))
+                if not batch:
+                    break
+                start = chunk_count
+                chunk_count += len(batch)
+
+                # Only chunk texts not already in the store (or earlier in this batch) are embedded
+                hashes = [chunk_content_hash(chunk) for chunk in batch]
+                vector_ids = self.metadata_store.vector_ids_for_hashes(set(hashes))
+                new_positions = {}
+                for position, chunk_hash in enumerate(hashes):
+                    if chunk_hash not in vector_ids and chunk_hash not in new_positions:
+                        new_positions[chunk_hash] = position
+
+                # Generate embeddings for the new chunks (outside the lock)
+                embeddings = None
+                if new_positions:
+                    embeddings, encoded = self._embed_chunks(
+                        [batch[p] for p in new_positions.values()], list(new_positions), batch_size, use_pool
+                    )
+                    embedded_count += encoded
+
+                with self._lock:
+                    # A concurrent delete may have tombstoned a vector since the lookup; embed those too
+                    stale = {}
+                    for position, chunk_hash in enumerate(hashes):
+                        if (chunk_hash not in new_positions and chunk_hash not in stale
+                                and vector_ids[chunk_hash] in self._tombstones):
+                            stale[chunk_hash] = position
+                    if stale:
+                        stale_embeddings, encoded = self._embed_chunks(
+                            [batch[p] for p in stale.values()], list(stale), batch_size
+                        )
+                        embedded_count += encoded
+                        embeddings = stale_embeddings if embeddings is None else np.vstack([embeddings, stale_embeddings])
+                        new_positions.update(stale)
+
+                    logged_ids = None
+                    if new_positions:
+                        ids = self._allocate_ids(len(new_positions))
+
+                        # Logged first so the batch survives a crash, then added to the shard's index
+                        shard.add(ids, embeddings)
+                        logged_ids = ids
+                        vector_ids.update(zip(new_positions, ids))
+                        new_count += len(new_positions)
+
+                    # Store metadata
+                    rows = []
+                    for offset, chunk in enumerate(batch):
+                        chunk_metadata = metadata.copy()
+                        chunk_metadata.update({
+                            'content': chunk,
+                            'content_hash': hashes[offset],
+                            'chunk_id': start + offset
+                        })
+                        rows.append((vector_ids[hashes[offset]], chunk_metadata))
+                    try:
+                        self.metadata_store.add_chunks(rows)
+                    except Exception:
+                        if logged_ids is not None:
+                            # Indexed, but no chunk row will ever point at them
+                            self._tombstone_orphans(logged_ids)
+                        raise
+
+            if not chunk_count:
+                previous_rows = []  # Nothing to replace them with; keep the old version
+            if previous_rows:
+                # Vectors the new version still uses stay live
+                self._delete_chunks(previous_rows)
+                print(f"Replaced {len(previous_rows)} existing chunks of {filename}")
+
+            if filename and chunk_count:
+                if document_hasher is not None:
+                    content_hash = document_hasher.hexdigest()
+                self.metadata_store.set_document_hash(filename, content_hash, chunk_count)
+
+            elapsed = time.perf_counter() - start_time
+            chunks_per_second = chunk_count / elapsed if elapsed > 0 else 0.0
+            print(f"Indexed {chunk_count} chunks ({new_count} new, {chunk_count - new_count} deduplicated) "
+                  f"in {elapsed:.2f}s ({chunks_per_second:.1f} chunks/sec)")
+
+            self._maybe_migrate_index([shard])
+            shard.maybe_snapshot()
+
+            return {
+                "success": True,
+                "skipped": False,
+                "chunks_indexed": chunk_count,
+                "chunks_new": new_count,
+                "chunks_deduplicated": chunk_count - new_count,
+                "chunks_embedded": embedded_count,
+                "chunks_replaced": len(previous_rows),
+                "shard": shard.shard_id,
+                "elapsed_seconds": round(elapsed, 3),
+                "chunks_per_second": round(chunks_per_second, 1)
+            }
 
-            if self.index.ntotal == 0:
-                return []
+        except Exception as e:
+            print(f"Error adding document: {e}")
+            if rows_before is not None:
+                self._discard_partial_document(filename, rows_before)
+            return {"success": False, "message": str(e)}
 
-            # Generate query embedding
-            query_embedding = self.model.encode([query])
-            query_embedding = query_embedding / np.linalg.norm(query_embedding)
+    def _discard_partial_document(self, filename, rows_before):
+        """Remove the chunks a failed add_document stored; vectors only they used are tombstoned."""
+        try:
+            added = [row for row in self.metadata_store.chunk_rows_for_filename(filename) if row not in rows_before]
+            if added:
+                self._delete_chunks(added)
+                print(f"Removed {len(added)} chunks of {filename} stored before the failure")
+        except Exception as e:
+            print(f"Error removing partial chunks of {filename}: {e}")
+
+    @staticmethod
+    def _hash_blocks(blocks, hasher):
+        for block in blocks:
+            hasher.update(block.encode('utf-8'))
+            yield block
+
+    @staticmethod
+    def hash_text(blocks):
+        """Content hash of text given as a string or blocks; matches what add_document records."""
+        if isinstance(blocks, str):
+            return chunk_content_hash(blocks)
+        hasher = hashlib.sha256()
+        for _ in VectorService._hash_blocks(blocks, hasher):
+            pass
+        return hasher.hexdigest()
+
+    def _delete_chunks(self, row_ids):
+        """Drop chunk metadata now; vectors left unreferenced are tombstoned until compaction."""
+        with self._lock:
+            orphaned = self.metadata_store.delete_chunks(row_ids)
+            self._tombstones.update(int(i) for i in orphaned)
+            self._tombstone_ids = None
+        if orphaned:
+            self._maybe_schedule_compaction()
+
+    def _tombstone_orphans(self, vector_ids):
+        """Tombstone the given vectors that no chunk row references. Returns the ids tombstoned."""
+        referenced = self.metadata_store.content_hashes_for_vectors(vector_ids)
+        with self._lock:
+            orphaned = [int(i) for i in vector_ids if int(i) not in referenced and int(i) not in self._tombstones]
+            if orphaned:
+                self.metadata_store.add_tombstones(orphaned)
+                self._tombstones.update(orphaned)
+                self._tombstone_ids = None
+        return orphaned
+
+    def _tombstone_log_orphans(self):
+        """
+        Writer: tombstone vectors replayed from the log that have no chunk rows,
+        left by a crash between an add's log append and its metadata commit.
+        Without a tombstone they would be searched, and kept by compaction, forever.
+        """
+        for shard in self.shards:
+            if len(shard.replayed_ids):
+                orphaned = self._tombstone_orphans(shard.replayed_ids)
+                if orphaned:
+                    print(f"Shard {shard.shard_id}: tombstoned {len(orphaned)} logged vectors with no chunk metadata")
+
+    def delete_document(self, filename):
+        """Delete every chunk of a document. Returns the number of chunks removed."""
+        if self.read_only:
+            raise PermissionError("Vector store is read-only in this process (VECTOR_READ_ONLY)")
+
+        row_ids = self.metadata_store.chunk_rows_for_filename(filename)
+        if row_ids:
+            self._delete_chunks(row_ids)
+            print(f"Deleted {len(row_ids)} chunks of {filename}")
+        self.metadata_store.forget_document(filename)
+        return len(row_ids)
+
+    def list_documents(self):
+        return self.metadata_store.list_documents()
+
+    def search(self, query, top_k=5, mode=None, filters=None, min_score=None, score_gap=None):
+        return self.search_many(
+            [query], top_k=top_k, mode=mode, filters=filters, min_score=min_score, score_gap=score_gap
+        )[0]
+
+    def search_relevant(self, query, mode=None, filters=None):
+        """
+        Retrieval for answering a question: every chunk scoring at least
+        Config.RETRIEVAL_MIN_SCORE, up to Config.RETRIEVAL_MAX_RESULTS, cut short
+        at the first score drop larger than Config.RETRIEVAL_SCORE_GAP.
+        """
+        return self.search(
+            query,
+            top_k=Config.RETRIEVAL_MAX_RESULTS,
+            mode=mode,
+            filters=filters,
+            min_score=Config.RETRIEVAL_MIN_SCORE,
+            score_gap=Config.RETRIEVAL_SCORE_GAP
+        )
+
+    def search_many(self, queries, top_k=5, mode=None, filters=None, min_score=None, score_gap=None):
+        """
+        Search several queries at once: one batched encode (cache misses only),
+        one matrix search per shard (the shards in parallel) and one metadata
+        lookup for all hits.
+
+        mode is 'vector' (dense only), 'keyword' (BM25 over the chunk text) or
+        'hybrid' (both, merged by reciprocal-rank fusion); Config.SEARCH_MODE by
+        default. Every result's 'score' is its cosine similarity to the query
+        whatever the mode, so score thresholds keep their meaning; keyword and
+        hybrid results also carry 'keyword_score' / 'rrf_score'.
+
+        filters restricts results to matching chunks, e.g.
+            {"filename": ["a.txt", "b.txt"], "upload_date": ("2024-01-01", None)}
+        The matching vector ids are resolved in SQLite on every search. A small
+        set is scored exactly; otherwise it is applied inside the FAISS search
+        with an ID selector, so nothing is over-fetched and dropped (see
+        VectorShard.search).
+
+        With min_score the dense search is a FAISS range search: it returns every
+        hit at or above the threshold (top_k at most) instead of a fixed k, and
+        keyword hits below it are dropped too. With score_gap a query's results
+        end before the first drop in score larger than the gap.
+
+        Returns a list of result lists, one per query, in input order.
+        """
+        mode = mode or Config.SEARCH_MODE
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{mode}'. Expected one of: {', '.join(SEARCH_MODES)}")
+        unknown_filters = set(filters or ()) - set(SEARCH_FILTERS)
+        if unknown_filters:
+            raise ValueError(f"Unknown search filter(s): {', '.join(sorted(unknown_filters))}")
+
+        empty = [[] for _ in queries]
+        try:
+            if not queries or not self.model_available:
+                return empty
+
+            self._refresh_if_stale()
+
+            if not any(shard.ntotal for shard in self.shards):
+                return empty
+
+            # Generate query embeddings (outside the lock, it doesn't touch the index)
+            query_embeddings = self._embed_queries(queries)
+
+            allowed_ids = None
+            if filters:
+                allowed_ids = self.metadata_store.vector_ids_matching(filters)
+                if not allowed_ids:
+                    return empty
+
+            # Keyword candidates come from SQLite and don't need the index lock
+            keyword_hits = [[] for _ in queries]
+            if mode != 'vector':
+                limit = max(top_k, Config.HYBRID_CANDIDATES) if mode == 'hybrid' else top_k
+                keyword_hits = [self.metadata_store.keyword_search(query, limit, filters) for query in queries]
+
+            dense_hits = [[] for _ in queries]
+            if mode != 'keyword':
+                depth = top_k if mode == 'vector' else max(top_k, Config.HYBRID_CANDIDATES)
+                dense_hits = self._dense_search(query_embeddings, depth, allowed_ids, min_score)
+
+            # Cosine scores for keyword hits the dense search didn't return
+            cosine = [dict(hits) for hits in dense_hits]
+            missing = {vector_id for position, hits in enumerate(keyword_hits)
+                       for vector_id, _ in hits if vector_id not in cosine[position]}
+            if missing:
+                vectors = self._reconstruct(missing)
+                for position, hits in enumerate(keyword_hits):
+                    for vector_id, _ in hits:
+                        if vector_id not in cosine[position] and vector_id in vectors:
+                            cosine[position][vector_id] = float(vectors[vector_id] @ query_embeddings[position])
+
+            keyword_hits = [
+                [(vector_id, score) for vector_id, score in hits
+                 if vector_id in cosine[position] and (min_score is None or cosine[position][vector_id] >= min_score)]
+                for position, hits in enumerate(keyword_hits)
+            ]
+
+            if mode == 'vector':
+                ranked = dense_hits
+            elif mode == 'keyword':
+                ranked = keyword_hits
+            else:
+                ranked = [self._fuse_rankings(dense, keyword) for dense, keyword in zip(dense_hits, keyword_hits)]
 
-            # Search
-            scores, indices = self.index.search(query_embedding.astype('float32'), top_k)
+            # Retrieve metadata for the hits only (a few spare in case of concurrent deletes).
+            # A vector shared by several chunks must report one that matches the filters
+            metadata_by_id = self.metadata_store.get_many(
+                {vector_id for hits in ranked for vector_id, _ in hits[:top_k * 2]},
+                filters
+            )
 
-            # Retrieve results
             results = []
-            for score, idx in zip(scores[0], indices[0]):
-                if idx < len(self.metadata):
-                    result = self.metadata[idx].copy()
-                    result['score'] = float(score)
-                    results.append(result)
+            for position, hits in enumerate(ranked):
+                keyword_scores = dict(keyword_hits[position])
+                query_results = []
+                for vector_id, rank_score in hits:
+                    if vector_id in metadata_by_id:
+                        result = dict(metadata_by_id[vector_id])
+                        result['score'] = float(cosine[position][vector_id])
+                        if mode != 'vector':
+                            result['keyword_score'] = float(keyword_scores.get(vector_id, 0.0))
+                        if mode == 'hybrid':
+                            result['rrf_score'] = rank_score
+                        query_results.append(result)
+                        if len(query_results) == top_k:
+                            break
+                if score_gap is not None:
+                    query_results = self._cut_at_score_gap(query_results, score_gap)
+                results.append(query_results)
 
             return results
 
         except Exception as e:
             print(f"Error searching: {e}")
-            return []
-
-    def _chunk_text(self, text, chunk_size=500):
-        """Simple text chunking by sentences"""
-        sentences = text.split('. ')
-        chunks = []
-        current_chunk = ""
-
-        for sentence in sentences:
-            if len(current_chunk + sentence) < chunk_size:
-                current_chunk += sentence + ". "
-            else:
-                if current_chunk:
-                    chunks.append(current_chunk.strip())
-                current_chunk = sentence + ". "
-
-        if current_chunk:
-            chunks.append(current_chunk.strip())
-
-        return chunks
+            return empty
+
+    def _dense_search(self, query_embeddings, depth, allowed_ids=None, min_score=None):
+        """
+        Search every shard (in parallel on the search pool) and merge their hits into
+        per-query [(vector_id, score)] lists, best first, at most depth long.
+        """
+        with self._lock:
+            if self._tombstone_ids is None:
+                self._tombstone_ids = np.fromiter(self._tombstones, dtype='int64', count=len(self._tombstones))
+            tombstone_ids = self._tombstone_ids
+
+        def search_shard(shard):
+            return shard.search(query_embeddings, depth, tombstone_ids, allowed_ids, min_score)
+
+        if self._search_executor is None:
+            shard_hits = [search_shard(shard) for shard in self.shards]
+        else:
+            shard_hits = list(self._search_executor.map(search_shard, self.shards))
+
+        if len(shard_hits) == 1:
+            return shard_hits[0]
+        return [
+            heapq.nlargest(depth, itertools.chain.from_iterable(hits), key=lambda hit: hit[1])
+            for hits in zip(*shard_hits)
+        ]
+
+    def _reconstruct(self, vector_ids):
+        """Return {vector_id: vector} for the given ids, from whichever shard holds each."""
+        vectors = {}
+        for shard in self.shards:
+            remaining = [vector_id for vector_id in vector_ids if vector_id not in vectors]
+            if not remaining:
+                break
+            vectors.update(shard.reconstruct(remaining))
+        return vectors
+
+    @staticmethod
+    def _cut_at_score_gap(results, score_gap):
+        """Keep the results scoring above the first gap between consecutive scores larger than score_gap."""
+        scores = sorted((result['score'] for result in results), reverse=True)
+        for higher, lower in zip(scores, scores[1:]):
+            if higher - lower > score_gap:
+                return [result for result in results if result['score'] >= higher]
+        return results
+
+    @staticmethod
+    def _fuse_rankings(*rankings):
+        """
+        Reciprocal-rank fusion of [(vector_id, score)] lists: each list contributes
+        1 / (HYBRID_RRF_K + rank). Returns [(vector_id, fused score)] best first.
+        """
+        fused = {}
+        for ranking in rankings:
+            for rank, (vector_id, _) in enumerate(ranking, start=1):
+                fused[vector_id] = fused.get(vector_id, 0.0) + 1.0 / (Config.HYBRID_RRF_K + rank)
+        return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+    def reload(self):
+        """Re-read the snapshots and logs from disk, replacing the in-memory indexes.
+
+        Only needed when another process has written to VECTOR_DB_PATH; writes made
+        through this instance are visible immediately.
+        """
+        with self._lock:
+            total = sum(shard.reload() for shard in self.shards)
+            self._id_floor = max(shard.next_id for shard in self.shards)
+            self._tombstones = self.metadata_store.tombstone_ids()
+            self._tombstone_ids = None
+            if not self.read_only:
+                self._tombstone_log_orphans()
+        self.metadata_store.invalidate()
+        print(f"Vector store reloaded: {total} vectors in {len(self.shards)} shard(s)")
+        if not self.read_only:
+            self._maybe_migrate_index()
+        return self.get_info()
 
     def get_info(self):
+        with self._lock:
+            tombstones = len(self._tombstones)
+        shards = [shard.info() for shard in self.shards]
+        index_types = {shard['index_type'] for shard in shards}
         return {
-            "total_documents": self.index.ntotal,
+            "total_documents": sum(shard['vectors'] for shard in shards) - tombstones,
+            "tombstones": tombstones,
             "dimension": self.dimension,
-            "metadata_count": len(self.metadata),
+            "index_type": index_types.pop() if len(index_types) == 1 else 'mixed',
+            "configured_index_type": Config.VECTOR_INDEX_TYPE,
+            "metadata_count": self.metadata_store.count(),
+            "log_bytes": sum(shard['log_bytes'] for shard in shards),
+            "shards": shards,
+            "read_only": self.read_only,
+            "query_cache": self.query_cache.stats(),
+            "embedding_model": getattr(self.model, 'model_key', None),
+            "embedding_store": self.embedding_store.stats() if self.embedding_store is not None else None,
             "model_available": self.model_available
         }
+
+
+# Global vector service instance, shared by every request thread
+_vector_service_instance = None
+_vector_service_lock = threading.Lock()
+
+
+def get_vector_service() -> VectorService:
+    """Get the process-wide vector service, loading the index on first use."""
+    global _vector_service_instance
+    if _vector_service_instance is None:
+        with _vector_service_lock:
+            if _vector_service_instance is None:
+                _vector_service_instance = VectorService()
+    return _vector_service_instance
@@ -0,0 +1,601 @@
+"""
+One shard of the vector store.
+
+Each shard is an ID-mapped FAISS index with its own write-ahead log and
+snapshots in its own directory, and its own lock, so shards are searched in
+parallel and one shard can be rebuilt or compacted while the others keep
+taking writes. Vector ids are global (allocated by the metadata store), so
+results from different shards merge without translation.
+
+Snapshots are versioned: every snapshot is a new file, and snapshot.json (the
+pointer, swapped atomically) lists the current version plus the previous
+VECTOR_SNAPSHOT_VERSIONS - 1, whose files and log segments are kept so the
+shard can be rolled back to them. New versions are built and loaded off to
+the side; the in-memory index is swapped by reference, so in-flight searches
+finish on the version they started on. Read-only processes serve the
+snapshot and tail the log for the writes made since it.
+"""
+
+import heapq
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+import faiss
+import numpy as np
+from config import Config
+from services.vector_index import (
+    create_index, configure_search, extract_vectors, filtered_search_params, index_type_of, needs_training,
+    reconstruct_vectors, trainable_type, with_ids
+)
+from services.vector_log import VectorWriteLog, OP_ADD
+
+
+class _SharedLock:
+    """Held by any number of readers at once, or by one writer; a waiting writer holds off new readers."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writing = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def shared(self):
+        with self._condition:
+            while self._writing or self._writers_waiting:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        with self._condition:
+            self._writers_waiting += 1
+            while self._writing or self._readers:
+                self._condition.wait()
+            self._writers_waiting -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+
+
+class VectorShard:
+    """A FAISS index plus its write-ahead log and snapshots, stored in one directory."""
+
+    def __init__(self, shard_id, directory, dimension, read_only=False):
+        self.shard_id = shard_id
+        self.directory = directory
+        self.dimension = dimension
+        self.read_only = read_only
+        self.index_path = os.path.join(directory, 'faiss_index')  # Legacy single-file index
+        self.manifest_path = os.path.join(directory, 'snapshot.json')
+
+        # _lock guards the in-memory index reference; rebuilds and snapshots of
+        # this shard are serialized by their own locks. FAISS searches run outside
+        # it, concurrently, holding _search_lock shared; an add, the only in-place
+        # change to a live index, holds it exclusively.
+        self._lock = threading.RLock()
+        self._search_lock = _SharedLock()
+        self._rebuild_lock = threading.Lock()
+        self._snapshot_lock = threading.Lock()
+        self._tail_lock = threading.Lock()
+        self._manifest_mtime = None
+        self._exclusion = (None, None, None)  # (index, tombstone ids, SearchParameters excluding them)
+
+        os.makedirs(directory, exist_ok=True)
+
+        # Index updates are appended to the log and folded into snapshots periodically
+        self.log = VectorWriteLog(os.path.join(directory, 'wal'))
+        self.snapshot_seq = 0
+        self.versions = 0  # Snapshot versions on disk, including the current one
+        self.next_id = 0  # One past the highest vector id in the index
+        self.replayed_ids = np.empty(0, dtype='int64')  # Writer: ids re-added from the log at the last load
+
+        # Readers: (ids, vectors) the writer has logged since the loaded snapshot,
+        # scored exactly next to the index, and how far into each log segment they go
+        self._tail = (np.empty(0, dtype='int64'), np.empty((0, dimension), dtype='float32'))
+        self._tail_offsets = {}
+
+        self.index = self._load_or_create_index()
+        if read_only:
+            self.refresh_tail()
+
+    @property
+    def ntotal(self):
+        return self.index.ntotal + len(self._tail[0])
+
+    def _read_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return None
+        with open(self.manifest_path, 'r') as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest):
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+
+    def _read_index_file(self, path, index_type=None):
+        """
+        Read a snapshot, memory-mapped and read-only when running as a reader.
+
+        IO_FLAG_MMAP only maps IVF inverted lists; any other index read with it is
+        silently copied into private memory. Flat and HNSW vectors (and IVF lists)
+        are mapped by IO_FLAG_MMAP_IFC, which needs faiss >= 1.10; on older
+        versions only IVF indexes share pages between workers.
+        """
+        if self.read_only and Config.VECTOR_INDEX_MMAP:
+            if index_type in ('ivf_flat', 'ivf_pq'):
+                mmap_flag = faiss.IO_FLAG_MMAP
+            else:
+                mmap_flag = getattr(faiss, 'IO_FLAG_MMAP_IFC', None)
+            if mmap_flag is None:
+                print(f"faiss {faiss.__version__} can't memory-map {index_type or 'this'} index, reading it into memory")
+            else:
+                try:
+                    return faiss.read_index(path, mmap_flag | faiss.IO_FLAG_READ_ONLY)
+                except RuntimeError as e:
+                    print(f"Could not memory-map {os.path.basename(path)} ({e}), reading it into memory")
+        return faiss.read_index(path)
+
+    def _load_or_create_index(self):
+        """Load the latest snapshot and replay the write-ahead log on top of it."""
+        index, snapshot_seq = self._read_snapshot()
+        self.snapshot_seq = snapshot_seq
+        if self.read_only:
+            # The log belongs to the writer process; readers only tail it (see
+            # refresh_tail) and pick up the next snapshot via is_stale
+            return configure_search(index)
+        return self._replay_log(index, snapshot_seq)
+
+    def _read_snapshot(self):
+        """Read the index file the manifest points to. Returns (index, log seq it covers)."""
+        if os.path.exists(self.manifest_path):
+            self._manifest_mtime = os.path.getmtime(self.manifest_path)
+
+        manifest = self._read_manifest()
+        if manifest:
+            self.versions = 1 + len(manifest.get('history', []))
+            index_file = os.path.join(self.directory, manifest['index_file'])
+            return self._read_index_file(index_file, manifest.get('index_type')), manifest['log_seq']
+
+        self.versions = 0
+        if os.path.exists(self.index_path):
+            return self._read_index_file(self.index_path), 0
+        # Start with an exact index; ANN types are trained once there is enough data
+        return create_index('flat', self.dimension), 0
+
+    def _replay_log(self, index, snapshot_seq):
+        """Apply the log records after snapshot_seq to a freshly read snapshot (writer only)."""
+        index = with_ids(index)
+
+        replayed = []
+        for op, seq, ids, vectors in self.log.replay(after_seq=snapshot_seq):
+            if op == OP_ADD:
+                index.add_with_ids(np.ascontiguousarray(vectors), np.ascontiguousarray(ids))
+                replayed.append(ids)
+
+        # Kept so the caller can find vectors whose chunk rows never made it to the
+        # metadata store (a crash between the log append and the metadata commit)
+        self.replayed_ids = np.concatenate(replayed) if replayed else np.empty(0, dtype='int64')
+        if replayed:
+            print(f"Shard {self.shard_id}: replayed {len(self.replayed_ids)} vectors from the write-ahead log")
+
+        # New ids must stay above anything already in the index
+        self.next_id = int(faiss.vector_to_array(index.id_map).max()) + 1 if index.ntotal else 0
+
+        return configure_search(index)
+
+    def reload(self):
+        """
+        Re-read the snapshot (and, for the writer, the log) from disk and swap it in.
+        Readers load the new version before taking the lock, so searches keep
+        running on the old one until the swap.
+        """
+        if self.read_only:
+            with self._tail_lock:
+                index, snapshot_seq = self._read_snapshot()
+                index = configure_search(index)
+                with self._lock:
+                    self.index = index
+                    self.snapshot_seq = snapshot_seq
+                    # The tail is re-read from the new snapshot's log position
+                    self._tail = (np.empty(0, dtype='int64'), np.empty((0, self.dimension), dtype='float32'))
+                    self._tail_offsets = {}
+            self.refresh_tail()
+            return self.ntotal
+
+        # The writer replays under the lock so no append lands between replay and swap
+        with self._lock:
+            self.index = self._load_or_create_index()
+            return self.index.ntotal
+
+    def refresh_tail(self):
+        """
+        Readers: pick up the vectors the writer has logged since the loaded
+        snapshot, so uploads are searchable before the next snapshot is published.
+        Only the log appended since the last call is read. Returns how many vectors were new.
+        """
+        with self._tail_lock:
+            ids, vectors = [], []
+            for op, seq, batch_ids, batch_vectors in self.log.tail(self.snapshot_seq, self._tail_offsets):
+                if op == OP_ADD:
+                    ids.append(batch_ids)
+                    vectors.append(batch_vectors)
+            if not ids:
+                return 0
+
+            with self._lock:
+                tail_ids, tail_vectors = self._tail
+                # Swapped by reference, like the index, so searches never see a half-built tail
+                self._tail = (np.concatenate([tail_ids] + ids), np.concatenate([tail_vectors] + vectors))
+            return sum(len(batch_ids) for batch_ids in ids)
+
+    def is_stale(self):
+        """Readers: True when the writer has published a snapshot newer than the loaded one."""
+        try:
+            return os.path.getmtime(self.manifest_path) != self._manifest_mtime
+        except FileNotFoundError:
+            return False
+
+    def add(self, ids, vectors):
+        """Log a batch of vectors, then add it to the index."""
+        with self._lock:
+            self.log.append(OP_ADD, ids, vectors)
+            with self._search_lock.exclusive():
+                self.index.add_with_ids(vectors, ids)
+
+    def snapshot(self, force=False):
+        """
+        Write the in-memory index as a new snapshot and drop the log segments it covers.
+        Skipped when nothing was logged since the last one, unless force is set (e.g.
+        after a rebuild, which changes the index without logging).
+
+        The index is serialized under the lock (a memory copy) and written to disk
+        outside it. The manifest swap is atomic, so a crash at any point leaves either
+        the old snapshot plus its log or the new one.
+        """
+        if self.read_only:
+            return False
+
+        with self._snapshot_lock:
+            with self._lock:
+                seq = self.log.rotate()
+                if not force and seq == self.snapshot_seq and self._read_manifest():
+                    return False  # Nothing new since the last snapshot
+                data = faiss.serialize_index(self.index)
+                index_type = index_type_of(self.index)
+                vectors = self.index.ntotal
+
+            previous = self._read_manifest()
+            version = previous.get('version', 0) + 1 if previous else 1
+
+            # Every version gets its own file, so a forced snapshot at an unchanged
+            # log seq (after a rebuild) doesn't overwrite the version it replaces
+            index_file = f'faiss_index.{seq:016d}.v{version}'
+            index_path = os.path.join(self.directory, index_file)
+            tmp_path = index_path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(memoryview(data))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, index_path)
+
+            history = []
+            if previous:
+                history = [{key: value for key, value in previous.items() if key != 'history'}]
+                history += previous.get('history', [])
+            keep = max(1, Config.VECTOR_SNAPSHOT_VERSIONS) - 1
+            retained, expired = history[:keep], history[keep:]
+
+            self._write_manifest({
+                'version': version,
+                'index_file': index_file,
+                'log_seq': seq,
+                'index_type': index_type,
+                'vectors': vectors,
+                'created_at': time.time(),
+                'history': retained
+            })
+
+            with self._lock:
+                self.snapshot_seq = max(self.snapshot_seq, seq)
+                self.versions = 1 + len(retained)
+                # Keep the log back to the oldest retained version, so rolling back loses no writes
+                self.log.purge(min([seq] + [entry['log_seq'] for entry in retained]))
+
+            # Versions past the retention limit are no longer referenced
+            stale_files = [self.index_path] + [os.path.join(self.directory, entry['index_file']) for entry in expired]
+            for path in stale_files:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    # e.g. still mapped by a reader on Windows; it is unreferenced either way
+                    print(f"Could not remove old snapshot {os.path.basename(path)}: {e}")
+
+            print(f"Shard {self.shard_id}: vector index snapshot v{version} written at log seq {seq}")
+            return True
+
+    def rollback(self):
+        """
+        Make the previous snapshot version current again and reload from it. The log
+        since that version is replayed on top, so documents added after it stay
+        indexed; vectors it still holds that were compacted out since come back and
+        must be tombstoned again by the caller. Returns False when there is no
+        earlier version to go back to.
+        """
+        if self.read_only:
+            return False
+
+        with self._snapshot_lock:
+            manifest = self._read_manifest()
+            if not manifest or not manifest.get('history'):
+                return False
+            previous, older = manifest['history'][0], manifest['history'][1:]
+
+            with self._lock:
+                self._write_manifest(dict(previous, history=older))
+                self.index = self._load_or_create_index()
+
+            try:
+                os.remove(os.path.join(self.directory, manifest['index_file']))
+            except OSError as e:
+                print(f"Could not remove rolled back snapshot {manifest['index_file']}: {e}")
+
+            print(f"Shard {self.shard_id}: rolled back from snapshot v{manifest.get('version', '?')} "
+                  f"to v{previous.get('version', '?')}")
+            return True
+
+    def vector_ids(self):
+        """Every vector id in this shard's index."""
+        with self._lock:
+            return faiss.vector_to_array(self.index.id_map).copy()
+
+    def maybe_snapshot(self):
+        """Fold the log into a new snapshot in the background once it is large enough."""
+        unsnapshotted = self.log.size_bytes(after_seq=self.snapshot_seq)
+        if not Config.VECTOR_SNAPSHOT_ON_WRITE and unsnapshotted < Config.VECTOR_LOG_COMPACT_BYTES:
+            return False
+        if self._snapshot_lock.locked():
+            return False
+
+        def compact():
+            try:
+                self.snapshot()
+            except Exception as e:
+                print(f"Error compacting vector log of shard {self.shard_id}: {e}")
+
+        threading.Thread(target=compact, name=f'vector-log-compaction-{self.shard_id}', daemon=True).start()
+        return True
+
+    @property
+    def rebuilding(self):
+        return self._rebuild_lock.locked()
+
+    def rebuild(self, target_type, tombstones, transform=None):
+        """
+        Build a fresh index of target_type from this shard's vectors, leaving out the
+        ids in tombstones, and swap it in. transform(ids, vectors, source_index) may
+        replace the extracted vectors first (re-embedding, exact stored copies).
+
+        The new index is trained and filled outside the lock so searches keep
+        running against the old one; vectors added meanwhile are copied over before
+        the swap. Returns the set of tombstoned ids dropped, or None if the shard
+        was not rebuilt (read-only, or a rebuild is already running).
+        """
+        if self.read_only:
+            return None
+        if not self._rebuild_lock.acquire(blocking=False):
+            return None  # Another thread is already rebuilding this shard
+
+        try:
+            with self._lock:
+                source = self.index
+                ids, vectors = extract_vectors(source)
+                extracted = source.ntotal
+
+            dead = np.isin(ids, np.fromiter(tombstones, dtype='int64', count=len(tombstones)))
+            dropped = set(ids[dead].tolist())
+            ids, vectors = ids[~dead], vectors[~dead]
+
+            print(f"Rebuilding shard {self.shard_id} as {target_type} ({len(ids)} live vectors, {len(dropped)} tombstones)...")
+            if transform is not None:
+                vectors = transform(ids, vectors, source)
+
+            if trainable_type(target_type, len(ids)) != target_type:
+                # e.g. compaction left fewer live vectors than IVF-PQ's codebooks need
+                print(f"Shard {self.shard_id}: too few vectors to train {target_type}, rebuilding as flat")
+                target_type = 'flat'
+
+            new_index = create_index(
+                target_type,
+                self.dimension,
+                training_vectors=vectors if needs_training(target_type) else None
+            )
+            if len(ids):
+                new_index.add_with_ids(vectors, ids)
+
+            with self._lock:
+                if self.index is not source:
+                    print(f"Shard {self.shard_id} changed during rebuild (reload?), discarding rebuilt index")
+                    return None
+                if source.ntotal > extracted:
+                    new_ids, new_vectors = extract_vectors(source, extracted)
+                    new_index.add_with_ids(new_vectors, new_ids)
+                self.index = configure_search(new_index)
+
+            # The log replays onto whatever the snapshot holds, so persist the rebuilt index
+            # before the caller forgets the tombstones it no longer contains
+            self.snapshot(force=True)
+            return dropped
+        finally:
+            self._rebuild_lock.release()
+
+    def count_ids(self, ids):
+        """How many of the given vector ids this shard holds."""
+        held = self.vector_ids()
+        return int(np.isin(held, np.fromiter(ids, dtype='int64', count=len(ids))).sum())
+
+    def _exclusion_params(self, index, tombstone_ids):
+        """SearchParameters skipping the tombstoned ids, reused until the index or the tombstones change."""
+        with self._lock:
+            cached_index, excluded_ids, params = self._exclusion
+            if cached_index is not index or excluded_ids is not tombstone_ids:
+                params = filtered_search_params(index, tombstone_ids, exclude=True) if len(tombstone_ids) else None
+                self._exclusion = (index, tombstone_ids, params)
+            return params
+
+    def search(self, query_embeddings, depth, tombstone_ids, allowed_ids=None, min_score=None):
+        """
+        Search this shard. Returns per-query [(vector_id, score)] lists, best first,
+        at most depth long, without tombstoned ids.
+
+        Tombstoned ids (an int64 array) are skipped inside FAISS by an ID selector,
+        so the search never has to over-fetch past them; allowed_ids instead
+        restricts the search to those ids. On an approximate index, up to
+        Config.VECTOR_FILTER_EXACT_MAX allowed ids are scored exactly, since
+        the approximate scan would miss most of a small set; larger sets widen
+        the scan instead (see filtered_search_params).
+
+        With min_score it is a range search returning every hit at or above the
+        threshold, falling back to k-NN plus the threshold for index types that
+        don't implement range search.
+
+        The search runs on the index current when it starts, outside _lock, so
+        concurrent searches of the shard don't queue behind each other; only an
+        add to that index waits for them (and they for it). On readers, the
+        vectors logged since the snapshot are scored exactly and merged in.
+        """
+        with self._lock:
+            index, (tail_ids, tail_vectors) = self.index, self._tail
+
+        hits = self._search_index(index, query_embeddings, depth, tombstone_ids, allowed_ids, min_score)
+        if not len(tail_ids):
+            return hits
+
+        keep = ~np.isin(tail_ids, tombstone_ids)
+        if allowed_ids is not None:
+            keep &= np.isin(tail_ids, np.asarray(allowed_ids, dtype='int64'))
+        tail_hits = _top_hits(query_embeddings, tail_ids[keep], tail_vectors[keep], depth, min_score)
+        return [
+            heapq.nlargest(depth, index_hits + logged_hits, key=lambda hit: hit[1])
+            for index_hits, logged_hits in zip(hits, tail_hits)
+        ]
+
+    def _search_index(self, index, query_embeddings, depth, tombstone_ids, allowed_ids=None, min_score=None):
+        """search() over the given index alone."""
+        if index.ntotal == 0:
+            return [[] for _ in query_embeddings]
+
+        if (allowed_ids is not None and len(allowed_ids) <= Config.VECTOR_FILTER_EXACT_MAX
+                and index_type_of(index) != 'flat'):
+            return self._exact_search(index, query_embeddings, depth, allowed_ids, min_score)
+
+        if allowed_ids is None:
+            params = self._exclusion_params(index, tombstone_ids)
+        else:
+            # Filtered ids come from live chunk rows, so none are tombstoned
+            params = filtered_search_params(index, allowed_ids)
+
+        with self._search_lock.shared():
+            if min_score is not None:
+                try:
+                    if params is None:
+                        lims, scores, indices = index.range_search(query_embeddings, min_score)
+                    else:
+                        lims, scores, indices = index.range_search(query_embeddings, min_score, params=params)
+                    hits = []
+                    for position in range(len(query_embeddings)):
+                        row_scores = scores[lims[position]:lims[position + 1]]
+                        row_indices = indices[lims[position]:lims[position + 1]]
+                        order = np.argsort(-row_scores, kind='stable')
+                        hits.append([(int(row_indices[i]), float(row_scores[i])) for i in order[:depth]])
+                    return hits
+                except RuntimeError as e:
+                    print(f"Range search unavailable ({e}), using k-NN with a score threshold")
+
+            k = min(depth, index.ntotal)
+            if allowed_ids is not None:
+                k = min(k, len(allowed_ids))
+            if params is None:
+                scores, indices = index.search(query_embeddings, k)
+            else:
+                scores, indices = index.search(query_embeddings, k, params=params)
+
+        floor = -np.inf if min_score is None else min_score
+        return [
+            [(int(idx), float(score)) for score, idx in zip(row_scores, row_indices)
+             if idx >= 0 and score >= floor]
+            for row_scores, row_indices in zip(scores, indices)
+        ]
+
+    def _exact_search(self, index, query_embeddings, depth, allowed_ids, min_score=None):
+        """search() restricted to allowed_ids, by scoring every one of them this shard holds."""
+        ids = np.asarray(allowed_ids, dtype='int64')
+        with self._search_lock.shared():
+            try:
+                vectors = reconstruct_vectors(index, ids)
+            except RuntimeError:
+                # Some of the ids are held by other shards
+                ids = ids[np.isin(ids, faiss.vector_to_array(index.id_map))]
+                vectors = reconstruct_vectors(index, ids)
+        return _top_hits(query_embeddings, ids, vectors, depth, min_score)
+
+    def reconstruct(self, ids):
+        """Return {vector_id: vector} for the given ids that this shard holds."""
+        found = {}
+        with self._lock:
+            tail_positions = {int(vector_id): position for position, vector_id in enumerate(self._tail[0])}
+            for vector_id in ids:
+                if vector_id in tail_positions:
+                    found[vector_id] = self._tail[1][tail_positions[vector_id]]
+                    continue
+                try:
+                    found[vector_id] = reconstruct_vectors(self.index, [vector_id])[0]
+                except RuntimeError:
+                    pass  # Held by another shard
+        return found
+
+    def info(self):
+        with self._lock:
+            index = self.index
+        return {
+            "shard": self.shard_id,
+            "vectors": self.ntotal,
+            "index_type": index_type_of(index),
+            "snapshot_seq": self.snapshot_seq,
+            "snapshot_versions": self.versions,
+            "log_seq": self.log.last_seq,
+            "log_bytes": self.log.size_bytes()
+        }
+
+
+def _top_hits(query_embeddings, ids, vectors, depth, min_score=None):
+    """Score vectors (rows matching ids) exactly against each query: per-query [(vector_id, score)], best first."""
+    hits = []
+    for row_scores in np.asarray(query_embeddings, dtype='float32') @ vectors.T:
+        candidates = np.arange(len(ids))
+        if min_score is not None:
+            candidates = candidates[row_scores >= min_score]
+        if len(candidates) > depth:
+            candidates = candidates[np.argpartition(-row_scores[candidates], depth - 1)[:depth]]
+        order = candidates[np.argsort(-row_scores[candidates], kind='stable')]
+        hits.append([(int(ids[i]), float(row_scores[i])) for i in order])
+    return hits
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Parity and speed check for the ONNX embedding backend.
+Compares ONNX (fp32 and int8-quantized) embeddings against the PyTorch
+SentenceTransformer ones and reports query latency and ingest throughput.
+"""
+
+import os
+import sys
+import time
+import numpy as np
+from dotenv import load_dotenv
+
+# Add the backend directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Load environment variables
+load_dotenv()
+
+from config import Config
+from services.embedding_backends import OnnxEmbeddingBackend, SentenceTransformerBackend
+
+# Minimum cosine similarity between a backend's embedding and the PyTorch one
+MIN_COSINE = {"onnx": 0.999, "onnx-int8": 0.98}
+
+SAMPLE_TEXTS = [
+    "Hello",
+    "What does the uploaded document say about sales?",
+    "Find information about TCS in the documents",
+    "Quarterly revenue grew 12% year over year, driven by strong demand in the retail segment.",
+    "The employee handbook describes the leave policy, remote work guidelines and the code of conduct.",
+    "Customers can return products within 30 days of purchase provided the original receipt is kept.",
+    "How many files were uploaded recently?",
+    "Server maintenance is scheduled for Saturday night; expect brief interruptions to the chat service.",
+    "The onboarding checklist covers laptop setup, access requests and an introduction to the team.",
+    "Net profit for the year declined slightly because of higher logistics and raw material costs.",
+] * 4
+
+
+def normalize(embeddings):
+    embeddings = np.asarray(embeddings, dtype='float32')
+    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+
+def measure(backend, texts):
+    """Return (embeddings, median single-query latency in ms, batch throughput in texts/sec)."""
+    backend.encode(texts[:8], batch_size=8)  # Warm up
+
+    latencies = []
+    for text in texts[:20]:
+        start = time.perf_counter()
+        backend.encode([text], batch_size=1)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    embeddings = backend.encode(texts, batch_size=Config.EMBEDDING_BATCH_SIZE)
+    throughput = len(texts) / (time.perf_counter() - start)
+    return normalize(embeddings), float(np.median(latencies)), throughput
+
+
+def main():
+    """Check ONNX embedding parity against PyTorch and report speed."""
+
+    print("🚀 Starting Embedding Backend Parity Test")
+    print("=" * 60)
+    print(f"Model: {Config.EMBEDDING_MODEL_NAME}, intra-op threads: {Config.EMBEDDING_INTRA_OP_THREADS or 'default'}")
+
+    reference_backend = SentenceTransformerBackend(Config.EMBEDDING_MODEL_NAME, Config.EMBEDDING_INTRA_OP_THREADS)
+    reference, latency, throughput = measure(reference_backend, SAMPLE_TEXTS)
+    print(f"\ntorch:      query latency {latency:7.2f} ms | ingest {throughput:8.1f} texts/sec")
+
+    # Nearest neighbour of every text among the others, to check retrieval order is preserved
+    reference_scores = reference @ reference.T
+    np.fill_diagonal(reference_scores, -1)
+    reference_neighbours = reference_scores.argmax(axis=1)
+
+    failures = 0
+    for quantize in (False, True):
+        backend = OnnxEmbeddingBackend(
+            Config.EMBEDDING_MODEL_NAME,
+            Config.EMBEDDING_ONNX_DIR,
+            quantize=quantize,
+            intra_op_threads=Config.EMBEDDING_INTRA_OP_THREADS
+        )
+        name = backend.model_key.split(':', 1)[1]
+        embeddings, backend_latency, backend_throughput = measure(backend, SAMPLE_TEXTS)
+
+        cosine = (embeddings * reference).sum(axis=1)
+        scores = embeddings @ embeddings.T
+        np.fill_diagonal(scores, -1)
+        neighbour_agreement = float((scores.argmax(axis=1) == reference_neighbours).mean())
+
+        print(f"{name + ':':11} query latency {backend_latency:7.2f} ms ({latency / backend_latency:.1f}x) | "
+              f"ingest {backend_throughput:8.1f} texts/sec ({backend_throughput / throughput:.1f}x)")
+        print(f"            cosine vs torch min {cosine.min():.4f} mean {cosine.mean():.4f} | "
+              f"nearest-neighbour agreement {neighbour_agreement:.0%}")
+
+        if cosine.min() < MIN_COSINE[name]:
+            print(f"❌ {name} embeddings diverge from PyTorch (min cosine {cosine.min():.4f} < {MIN_COSINE[name]})")
+            failures += 1
+        else:
+            print(f"✅ {name} embeddings match PyTorch")
+
+    print(f"\n{'='*60}")
+    print("🎯 TEST SUMMARY")
+    print(f"{'='*60}")
+    print("All backends within tolerance." if not failures else f"{failures} backend(s) out of tolerance.")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Regression checks for query routing: the keyword scores each agent gives a
+query, and the workflow's local routing over a fixed schema and an empty
+vector search. No LLM calls are made, so it runs offline.
+"""
+
+import asyncio
+import os
+import sys
+
+# Add the backend directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from agents.database_agent import DatabaseAgent
+from agents.general_agent import GeneralAgent
+from agents.workflow import get_workflow
+
+
+# Data questions whose wording contains small-talk words ('time', 'date'),
+# or words with one inside them ('this', 'which', 'highest', 'history', ...)
+DATA_QUERIES = [
+    "How many orders were placed this month?",
+    "Which customers have the highest total order amount?",
+    "What is the total amount of orders by date?",
+    "List all orders with their update time",
+    "Show the order history for customer 42",
+]
+
+# Data questions where small-talk words only appear inside other words
+EMBEDDED_SMALL_TALK = [
+    "How many orders were placed this month?",
+    "Which customers have the highest total order amount?",
+    "Show the order history for customer 42",
+    "When was each order last updated?",
+]
+
+# Small-talk wording around a table name: only the schema shows it is about data
+TABLE_SMALL_TALK = ["Tell me a story about each status"]
+
+SMALL_TALK = ["hi", "hello there", "what time is it", "tell me a story", "goodbye", "thanks!"]
+
+DB_TABLES = {
+    "orders": [{"column_name": "id"}, {"column_name": "amount"}, {"column_name": "created_at"}],
+    "customers": [{"column_name": "id"}, {"column_name": "name"}],
+    "status": [{"column_name": "id"}, {"column_name": "label"}],
+}
+
+
+def test_small_talk_words_match_whole_words_only():
+    """Data questions are not small talk just because a word contains 'hi' or 'story'."""
+    agent = GeneralAgent()
+    for query in EMBEDDED_SMALL_TALK:
+        score = agent.can_handle_query(query)
+        assert score < 0.5, f"general scored {score} for {query!r}"
+    for query in SMALL_TALK:
+        score = agent.can_handle_query(query)
+        assert score >= 0.8, f"general scored only {score} for {query!r}"
+
+
+def test_table_names_match_singular_and_plural():
+    """'order' matches the orders table; only one trailing 's' is dropped from a table name."""
+    agent = DatabaseAgent()
+    context = {"db_tables": DB_TABLES}
+    assert agent.can_handle_query("Show the order history for customer 42", context) >= 0.75
+    assert agent.can_handle_query("What does each status mean?", context) >= 0.75
+    assert agent.can_handle_query("Who has access?", {"db_tables": {"access": []}}) >= 0.75
+    assert agent.can_handle_query("What does acce mean?", {"db_tables": {"access": []}}) < 0.75
+
+
+def routing_workflow():
+    """The workflow, with the schema above and a vector search that finds nothing."""
+    workflow = get_workflow()
+    workflow.context_sources = [
+        ("database schema", ("db_tables",), lambda query: {"db_tables": DB_TABLES}, workflow._database_fallback),
+        ("vector search", ("vector_db_status", "vector_search_results"),
+         lambda query: workflow._vector_fallback("no relevant documents"), workflow._vector_fallback),
+    ]
+    return workflow
+
+
+def test_data_queries_never_route_to_general():
+    """The wording alone can't send a data query to the general agent; the schema is always consulted."""
+    workflow = routing_workflow()
+    for query in DATA_QUERIES + TABLE_SMALL_TALK:
+        for route in (workflow._route_locally, lambda query, context: asyncio.run(workflow._aroute_locally(query, context))):
+            context = workflow._prepare_context(query)
+            routed_agent, scores = route(query, context)
+            assert routed_agent in ("database", None), f"{query!r} routed to {routed_agent} with {scores}"
+            assert "database schema" in context.resolved_sources(), f"{query!r} routed without the schema"
+
+
+def test_small_talk_routes_to_general_without_vector_search():
+    workflow = routing_workflow()
+    for query in SMALL_TALK:
+        context = workflow._prepare_context(query)
+        routed_agent, scores = workflow._route_locally(query, context)
+        assert routed_agent == "general", f"{query!r} routed to {routed_agent} with {scores}"
+        assert "vector search" not in context.resolved_sources(), f"{query!r} ran the vector search"
+
+
+def test_predefined_greetings_compute_no_context():
+    """'hi' and the other canned greetings route to the general agent without reading the schema."""
+    workflow = routing_workflow()
+    for query in ("hi", "Hello", "help", "what can you do"):
+        for route in (workflow._route_locally, lambda query, context: asyncio.run(workflow._aroute_locally(query, context))):
+            context = workflow._prepare_context(query)
+            routed_agent, scores = route(query, context)
+            assert routed_agent == "general", f"{query!r} routed to {routed_agent} with {scores}"
+            assert not context.resolved_sources(), f"{query!r} computed {context.resolved_sources()}"
+
+
+TESTS = [
+    test_small_talk_words_match_whole_words_only,
+    test_table_names_match_singular_and_plural,
+    test_data_queries_never_route_to_general,
+    test_small_talk_routes_to_general_without_vector_search,
+    test_predefined_greetings_compute_no_context,
+]
+
+
+def main():
+    """Run every check and report the failures."""
+
+    print("🚀 Starting Routing Tests")
+    print("=" * 60)
+
+    failures = 0
+    for test in TESTS:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            print(f"❌ {test.__name__}: {type(e).__name__}: {e}")
+            failures += 1
+
+    print(f"\n{'='*60}")
+    print("All routing tests passed." if not failures else f"{failures} test(s) failed.")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
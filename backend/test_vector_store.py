@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Regression checks for the vector store: index-type migration, tombstones and
+metadata filters. Uses a deterministic hashing embedder instead of the real
+model, so it runs offline and in a few seconds.
+"""
+
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import numpy as np
+
+# Add the backend directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import Config
+from services.vector_service import VectorService
+
+
+class HashingEmbedder:
+    """Bag-of-words embedder: each word hashes to one of 384 dimensions."""
+
+    model_key = 'test:hashing'
+    max_seq_length = 256
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True, show_progress_bar=False):
+        embeddings = np.full((len(texts), 384), 0.01, dtype='float32')
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                embeddings[row, int(hashlib.md5(word.encode()).hexdigest(), 16) % 384] += 1
+        return embeddings
+
+
+def fresh_service(**settings):
+    """A VectorService over an empty temporary directory, with Config overrides applied."""
+    for name, value in settings.items():
+        setattr(Config, name, value)
+    Config.VECTOR_DB_PATH = tempfile.mkdtemp(prefix='vector-store-test-')
+    VectorService._shared_model = HashingEmbedder()
+    VectorService._model_available = True
+    VectorService._model_initialized = True
+    return VectorService()
+
+
+def document(number):
+    return f"record {number} topic{number % 7} item{number} code{number * 31 % 101}"
+
+
+def test_ivf_pq_needs_enough_training_vectors():
+    """A migration threshold below the PQ codebook size must not leave a shard stuck."""
+    service = fresh_service(VECTOR_INDEX_TYPE='ivf_pq', VECTOR_ANN_MIGRATION_THRESHOLD=60, VECTOR_SHARDS=1)
+
+    for number in range(100):
+        service.add_document(document(number), {"filename": f"doc{number}.txt"})
+    assert service.get_info()["index_type"] == 'flat', "migrated with too few vectors to train IVF-PQ"
+    assert service.compact(), "compact failed below the IVF-PQ training minimum"
+
+    for number in range(100, 400):
+        service.add_document(document(number), {"filename": f"doc{number}.txt"})
+    service.compact()
+    assert service.get_info()["index_type"] == 'ivf_pq', "did not migrate once there were enough vectors"
+
+    for number in range(300):
+        service.delete_document(f"doc{number}.txt")
+    assert service.compact(), "compact failed after deletions left too few vectors for IVF-PQ"
+    assert service.get_info()["index_type"] == 'flat'
+    assert service.search(document(350), top_k=1)[0]["filename"] == "doc350.txt"
+
+
+def test_tombstones_excluded_without_over_fetching():
+    """Deleted chunks never come back, and the k best live chunks still do (flat and HNSW, k-NN and range search)."""
+    for index_type in ('flat', 'hnsw'):
+        service = fresh_service(
+            VECTOR_INDEX_TYPE=index_type, VECTOR_ANN_MIGRATION_THRESHOLD=0, VECTOR_SHARDS=1,
+            VECTOR_COMPACTION_MIN_TOMBSTONES=10 ** 9
+        )
+        for number in range(300):
+            service.add_document(f"shared words here {document(number)}", {"filename": f"doc{number}.txt"})
+        service.compact()
+        assert service.get_info()["index_type"] == index_type
+
+        # Half of every top-k is now tombstoned
+        for number in range(0, 300, 2):
+            service.delete_document(f"doc{number}.txt")
+
+        for min_score in (None, 0.1):
+            results = service.search("shared words here", top_k=5, mode='vector', min_score=min_score)
+            filenames = [result["filename"] for result in results]
+            assert len(filenames) == 5, f"{index_type}: expected 5 live hits, got {filenames}"
+            assert all(int(name[3:-4]) % 2 for name in filenames), f"{index_type}: tombstoned hit in {filenames}"
+
+
+def test_filtered_hit_on_shared_vector_reports_matching_chunk():
+    """Identical chunks in two documents share a vector; a filtered hit must name the chunk that matched."""
+    service = fresh_service(VECTOR_SHARDS=1)
+    text = "quarterly revenue grew twelve percent in the retail segment"
+    service.add_document(text, {"filename": "a.txt", "upload_date": "2024-01-01"})
+    service.add_document(text, {"filename": "b.txt", "upload_date": "2024-06-01"})
+
+    for mode in ('vector', 'hybrid'):
+        for filters in ({"filename": ["b.txt"]}, {"upload_date": ("2024-05-01", None)}):
+            results = service.search("quarterly revenue", top_k=3, mode=mode, filters=filters)
+            labels = [(result["filename"], result["upload_date"]) for result in results]
+            assert labels == [("b.txt", "2024-06-01")], f"{mode} {filters}: got {labels}"
+
+        results = service.search("quarterly revenue", top_k=3, mode=mode, filters={"filename": "a.txt"})
+        assert [result["filename"] for result in results] == ["a.txt"], f"{mode}: got {results}"
+
+
+def test_txt_encoding_ruled_out_past_the_sample():
+    """A cp1252 file that is plain ASCII for the whole encoding sample is not decoded as lossy UTF-8."""
+    from services.file_processor import FileProcessor
+
+    service = fresh_service(VECTOR_SHARDS=1)
+    processor = FileProcessor.__new__(FileProcessor)
+    processor.vector_service = service
+    processor.TEXT_READ_BLOCK_CHARS = 4096  # Several batches are committed before the bad byte
+
+    ascii_prefix = ' '.join(document(number) for number in range(FileProcessor.ENCODING_SAMPLE_BYTES // 20))
+    text = ascii_prefix + '. He said \u201chello\u201d \u2013 caf\u00e9.'
+    path = os.path.join(Config.VECTOR_DB_PATH, 'cp1252.txt')
+    with open(path, 'wb') as file:
+        file.write(text.encode('cp1252'))
+    assert len(ascii_prefix) > FileProcessor.ENCODING_SAMPLE_BYTES
+
+    result = processor.process_txt(path, 'cp1252.txt')
+    assert result["success"], result
+    assert result["content_length"] == len(text)
+
+    contents = ' '.join(row[0] for row in service.metadata_store._connection().execute(
+        'SELECT content FROM chunks WHERE filename = ?', ('cp1252.txt',)))
+    assert '\ufffd' not in contents, "undecodable bytes were replaced"
+    assert '\u201chello\u201d \u2013 caf\u00e9' in contents, "the cp1252 text didn't survive"
+
+    # The failed UTF-8 attempt left no chunks behind
+    stored = len(service.metadata_store.chunk_rows_for_filename('cp1252.txt'))
+    assert stored == result["chunks_indexed"], f"{stored} chunks stored for {result['chunks_indexed']} indexed"
+
+
+def test_chunker_splits_text_without_whitespace():
+    """Runs with no spaces (CJK, base64, long URLs) are split to the token budget instead of one huge chunk."""
+    from services.text_chunker import TextChunker
+
+    blobs = ["x" * 100000, "\u4e2d\u6587" * 20000, "see https://example.com/" + "a1b2" * 5000 + " for details."]
+    for count_tokens in (None, len):  # The approximate counter, and a tokenizer with a token per character
+        chunker = TextChunker(max_tokens=128, overlap_tokens=16, count_tokens=count_tokens)
+        for blob in blobs:
+            chunks = list(chunker.iter_chunks(blob))
+            assert len(chunks) > 1, f"{len(blob)} characters came back as one chunk"
+            longest = max(chunker.count_tokens(chunk) for chunk in chunks)
+            assert longest <= 128, f"a chunk of {longest} tokens from a {len(blob)}-character run"
+            assert ''.join(chunks).replace(' ', '').count('a1b2') >= blob.count('a1b2'), "text was dropped"
+
+
+def test_filtered_search_recall_on_ann_indexes():
+    """A filter matching a small share of an IVF or HNSW index still returns every matching chunk."""
+    paragraphs = [' '.join(f"target{part} word{part * 60 + number}" for number in range(30)) for part in range(40)]
+    for index_type in ('ivf_flat', 'hnsw'):
+        for exact_max in (Config.VECTOR_FILTER_EXACT_MAX, 0):  # Exact scoring, and the widened ANN scan
+            service = fresh_service(VECTOR_INDEX_TYPE=index_type, VECTOR_ANN_MIGRATION_THRESHOLD=0, VECTOR_SHARDS=1)
+            Config.VECTOR_FILTER_EXACT_MAX = exact_max
+            for number in range(1500):
+                service.add_document(document(number), {"filename": f"doc{number}.txt"})
+            service.add_document('\n\n'.join(paragraphs), {"filename": "target.txt"})
+            service.compact()
+            assert service.get_info()["index_type"] == index_type
+
+            results = service.search(document(3), top_k=40, mode='vector', filters={"filename": "target.txt"})
+            assert {result["filename"] for result in results} <= {"target.txt"}
+            minimum = 40 if exact_max else 36
+            assert len(results) >= minimum, f"{index_type} (exact up to {exact_max}): {len(results)} of 40 chunks"
+
+
+def test_logged_vectors_without_metadata_are_tombstoned():
+    """A vector logged by an add whose chunk rows were never committed is tombstoned, after a crash or an error."""
+    service = fresh_service(VECTOR_SHARDS=1)
+    service.add_document(document(1), {"filename": "doc1.txt"})
+
+    # Crash between the log append and the metadata commit
+    crashed_ids = service._allocate_ids(1)
+    service.shards[0].add(crashed_ids, service.model.encode([document(2)]))
+    restarted = VectorService()
+    assert int(crashed_ids[0]) in restarted._tombstones, "orphaned vector not tombstoned on restart"
+    assert int(crashed_ids[0]) in restarted.metadata_store.tombstone_ids()
+    assert restarted.search(document(1), top_k=1)[0]["filename"] == "doc1.txt"
+
+    def fail(rows):
+        raise RuntimeError("disk full")
+    restarted.metadata_store.add_chunks = fail
+    before = restarted._id_floor
+    assert not restarted.add_document(document(3), {"filename": "doc3.txt"})["success"]
+    assert set(range(before, restarted._id_floor)) <= restarted._tombstones, "failed add left untombstoned vectors"
+
+
+def test_readers_search_uploads_logged_since_the_snapshot():
+    """A read-only worker finds new uploads before the writer snapshots, and once it has, without duplicates."""
+    writer = fresh_service(VECTOR_SHARDS=1, VECTOR_REFRESH_INTERVAL=0)
+    writer.add_document(document(1), {"filename": "doc1.txt"})
+    writer.shards[0].snapshot()
+    writer.add_document(document(2), {"filename": "doc2.txt"})
+
+    Config.VECTOR_READ_ONLY = True
+    reader = VectorService()
+    assert reader.search(document(2), top_k=1)[0]["filename"] == "doc2.txt", "reader missed a logged upload"
+
+    writer.add_document(document(3), {"filename": "doc3.txt"})
+    assert reader.search(document(3), top_k=1)[0]["filename"] == "doc3.txt", "reader missed an upload made after it started"
+
+    writer.shards[0].snapshot()
+    results = reader.search("record", top_k=10, mode='vector')
+    filenames = [result["filename"] for result in results]
+    assert sorted(filenames) == ["doc1.txt", "doc2.txt", "doc3.txt"], f"after the snapshot: {filenames}"
+    assert reader.get_info()["total_documents"] == 3
+
+
+TESTS = [
+    test_ivf_pq_needs_enough_training_vectors,
+    test_tombstones_excluded_without_over_fetching,
+    test_filtered_hit_on_shared_vector_reports_matching_chunk,
+    test_txt_encoding_ruled_out_past_the_sample,
+    test_chunker_splits_text_without_whitespace,
+    test_filtered_search_recall_on_ann_indexes,
+    test_logged_vectors_without_metadata_are_tombstoned,
+    test_readers_search_uploads_logged_since_the_snapshot,
+]
+
+
+def main():
+    """Run every check with the default settings restored in between."""
+
+    print("🚀 Starting Vector Store Tests")
+    print("=" * 60)
+
+    defaults = {name: getattr(Config, name) for name in dir(Config) if name.isupper()}
+    failures = 0
+    for test in TESTS:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            print(f"❌ {test.__name__}: {type(e).__name__}: {e}")
+            failures += 1
+        finally:
+            shutil.rmtree(Config.VECTOR_DB_PATH, ignore_errors=True)
+            for name, value in defaults.items():
+                setattr(Config, name, value)
+
+    print(f"\n{'='*60}")
+    print("All vector store tests passed." if not failures else f"{failures} test(s) failed.")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())